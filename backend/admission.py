@@ -0,0 +1,281 @@
+import asyncio
+import json
+import math
+import os
+import re
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Cota global por cliente (tokens/s e rajada); cada rota também tem a sua
+ADMISSION_CLIENT_RATE = float(os.getenv('ADMISSION_CLIENT_RATE', '10'))
+ADMISSION_CLIENT_BURST = float(os.getenv('ADMISSION_CLIENT_BURST', '40'))
+# Espera máxima na fila de uma rota antes de descartar com 503 (segundos)
+ADMISSION_MAX_QUEUE_DELAY = float(os.getenv('ADMISSION_MAX_QUEUE_DELAY', '2'))
+# Atrás de proxy: identificar o cliente pelo primeiro IP de X-Forwarded-For
+ADMISSION_TRUST_PROXY = os.getenv('ADMISSION_TRUST_PROXY', 'false').lower() in ('1', 'true', 'yes')
+# Chaves (X-API-Key) sem cota por cliente, ex.: o servidor do Streamlit que atende vários usuários
+ADMISSION_TRUSTED_KEYS = {k for k in os.getenv('ADMISSION_TRUSTED_KEYS', '').split(',') if k}
+# Buckets sem uso por mais tempo que isso são descartados
+BUCKET_IDLE_TTL = 600
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, cost: float) -> float:
+        """Segundos até haver tokens para o custo (0 se já há)"""
+        return max(cost - self.tokens, 0.0) / self.rate
+
+
+class RoutePolicy:
+    """Cota, custo (quente/frio) e concorrência de um grupo de rotas"""
+
+    def __init__(self, name: str, pattern: str, rate: float, burst: float, concurrency: int,
+                 warm_cost: float = 1.0, cold_cost: Optional[float] = None, streaming: bool = False,
+                 symbols_param: Optional[str] = None):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.warm_cost = warm_cost
+        self.cold_cost = cold_cost if cold_cost is not None else warm_cost
+        # Respostas longas (SSE, exportação) não entram na média de latência
+        self.streaming = streaming
+        # Parâmetro de query com vários símbolos (?symbols=A,B): o custo é a soma por símbolo
+        self.symbols_param = symbols_param
+
+
+# Primeira que casa vence; cold_cost vale para símbolos sem dados em memória (busca no Yahoo)
+DEFAULT_POLICIES = [
+    RoutePolicy('company-insights', r'^/api/company-insights/(?P<symbol>[^/]+)$',
+                rate=2, burst=20, concurrency=8, warm_cost=1, cold_cost=5),
+    RoutePolicy('tech-analysis', r'^/api/tech-analysis/(?P<symbol>[^/]+)$',
+                rate=5, burst=20, concurrency=16, warm_cost=1, cold_cost=5),
+    RoutePolicy('predictions', r'^/api/predictions(/(?P<symbol>[^/]+))?$',
+                rate=5, burst=20, concurrency=16, warm_cost=1, cold_cost=5, symbols_param='symbols'),
+    RoutePolicy('export', r'^/api/export/', rate=0.2, burst=2, concurrency=2, warm_cost=1, streaming=True),
+    RoutePolicy('stream', r'^/api/stream/', rate=1, burst=5, concurrency=500, warm_cost=1, streaming=True),
+    RoutePolicy('default', r'^/api/', rate=10, burst=40, concurrency=64, warm_cost=1),
+]
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, message: str, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _RouteState:
+    """Limite de concorrência com fila; estima a espera pela latência média"""
+
+    def __init__(self, policy: RoutePolicy):
+        self.policy = policy
+        self.inflight = 0
+        self.waiters: deque = deque()
+        self.latency = 0.05
+        self.queue_wait = 0.0
+        self.counters = {'admitted': 0, 'rejected_429': 0, 'shed_503': 0}
+
+    def estimated_wait(self) -> float:
+        if self.inflight < self.policy.concurrency and not self.waiters:
+            return 0.0
+        return (len(self.waiters) + 1) * self.latency / self.policy.concurrency
+
+    async def acquire(self, max_delay: float):
+        if self.inflight < self.policy.concurrency and not self.waiters:
+            self.inflight += 1
+            return
+        estimate = self.estimated_wait()
+        if estimate > max_delay:
+            raise Rejected(503, 'Servidor sobrecarregado, tente novamente em instantes', estimate)
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, max_delay)
+        except asyncio.TimeoutError:
+            raise Rejected(503, 'Servidor sobrecarregado, tente novamente em instantes', self.estimated_wait())
+        finally:
+            if future in self.waiters:
+                self.waiters.remove(future)
+        self.queue_wait = 0.8 * self.queue_wait + 0.2 * (time.monotonic() - started)
+
+    def release(self, elapsed: Optional[float]):
+        if elapsed is not None:
+            self.latency = 0.8 * self.latency + 0.2 * elapsed
+        # Passa a vaga direto para o próximo da fila
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.inflight -= 1
+
+    def metrics(self) -> Dict:
+        return dict(self.counters, inflight=self.inflight, queued=len(self.waiters),
+                    concurrency=self.policy.concurrency,
+                    avg_latency_ms=round(self.latency * 1000, 1),
+                    avg_queue_wait_ms=round(self.queue_wait * 1000, 1))
+
+
+class AdmissionController:
+    """Cotas por cliente e por rota (token bucket ponderado por custo) e descarte de carga"""
+
+    def __init__(self, policies: Optional[List[RoutePolicy]] = None,
+                 is_warm: Optional[Callable[[str], bool]] = None,
+                 client_rate: float = ADMISSION_CLIENT_RATE, client_burst: float = ADMISSION_CLIENT_BURST,
+                 max_queue_delay: float = ADMISSION_MAX_QUEUE_DELAY, trust_proxy: bool = ADMISSION_TRUST_PROXY):
+        self.policies = policies or DEFAULT_POLICIES
+        self.is_warm = is_warm
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_queue_delay = max_queue_delay
+        self.trust_proxy = trust_proxy
+        self.routes = {policy.name: _RouteState(policy) for policy in self.policies}
+        # (cliente, rota ou None) -> bucket
+        self.buckets: Dict[Tuple[str, Optional[str]], TokenBucket] = {}
+        self._last_prune = time.monotonic()
+
+    def client_id(self, scope) -> str:
+        headers = dict(scope.get('headers') or [])
+        # Só chaves conhecidas identificam o cliente; chaves arbitrárias não criam cotas novas
+        api_key = headers.get(b'x-api-key', b'').decode('latin-1')
+        if api_key in ADMISSION_TRUSTED_KEYS:
+            return 'key:' + api_key
+        if self.trust_proxy and b'x-forwarded-for' in headers:
+            return 'ip:' + headers[b'x-forwarded-for'].decode('latin-1').split(',')[0].strip()
+        client = scope.get('client')
+        return 'ip:' + (client[0] if client else 'unknown')
+
+    def match(self, path: str) -> Tuple[Optional[RoutePolicy], Optional[str]]:
+        for policy in self.policies:
+            found = policy.pattern.match(path)
+            if found:
+                return policy, found.groupdict().get('symbol')
+        return None, None
+
+    def cost(self, policy: RoutePolicy, symbol: Optional[str]) -> float:
+        if symbol and self.is_warm is not None and not self.is_warm(symbol.upper()):
+            return policy.cold_cost
+        return policy.warm_cost
+
+    def request_cost(self, policy: RoutePolicy, symbol: Optional[str], query_string: bytes = b'') -> float:
+        """Custo da requisição: por símbolo do caminho ou somado sobre os símbolos da query"""
+        if symbol is None and policy.symbols_param:
+            values = parse_qs(query_string.decode('latin-1')).get(policy.symbols_param, [])
+            names = {name.strip() for value in values for name in value.split(',') if name.strip()}
+            if names:
+                return sum(self.cost(policy, name) for name in names)
+        return self.cost(policy, symbol)
+
+    def _bucket(self, key: Tuple[str, Optional[str]], rate: float, burst: float, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def _prune(self, now: float):
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for key in [k for k, b in self.buckets.items() if now - b.updated_at > BUCKET_IDLE_TTL]:
+            del self.buckets[key]
+
+    def charge(self, client: str, policy: RoutePolicy, cost: float, now: Optional[float] = None):
+        """Debita o custo das cotas do cliente (global e da rota) ou levanta Rejected(429)"""
+        if client.startswith('key:'):
+            return
+        now = now or time.monotonic()
+        self._prune(now)
+        buckets = [
+            self._bucket((client, None), self.client_rate, self.client_burst, now),
+            self._bucket((client, policy.name), policy.rate, policy.burst, now),
+        ]
+        # Custo maior que a rajada nunca caberia: limita ao tamanho do bucket
+        wait = max(b.wait_time(min(cost, b.burst)) for b in buckets)
+        if wait > 0:
+            raise Rejected(429, 'Limite de requisições excedido', wait)
+        for bucket in buckets:
+            bucket.tokens -= min(cost, bucket.burst)
+
+    def refund(self, client: str, policy: RoutePolicy, cost: float):
+        for key in ((client, None), (client, policy.name)):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.tokens = min(bucket.burst, bucket.tokens + min(cost, bucket.burst))
+
+    def metrics(self) -> Dict:
+        return {
+            'enabled': ADMISSION_ENABLED,
+            'clients': len({client for client, _ in self.buckets}),
+            'routes': {name: state.metrics() for name, state in self.routes.items()}
+        }
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI: aplica o AdmissionController antes de chegar ao FastAPI"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if not ADMISSION_ENABLED or scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        policy, symbol = self.controller.match(scope['path'])
+        if policy is None:
+            return await self.app(scope, receive, send)
+
+        route = self.controller.routes[policy.name]
+        client = self.controller.client_id(scope)
+        cost = self.controller.request_cost(policy, symbol, scope.get('query_string', b''))
+        try:
+            self.controller.charge(client, policy, cost)
+            try:
+                await route.acquire(self.controller.max_queue_delay)
+            except Rejected:
+                self.controller.refund(client, policy, cost)
+                raise
+        except Rejected as rejected:
+            route.counters['rejected_429' if rejected.status == 429 else 'shed_503'] += 1
+            return await self._reject(send, rejected)
+
+        route.counters['admitted'] += 1
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route.release(None if policy.streaming else time.monotonic() - started)
+
+    async def _reject(self, send, rejected: Rejected):
+        body = json.dumps({'error': rejected.message, 'success': False,
+                           'retry_after': rejected.retry_after}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': rejected.status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode()),
+                        (b'retry-after', str(rejected.retry_after).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
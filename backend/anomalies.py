@@ -0,0 +1,293 @@
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from market_calendar import MarketCalendar
+
+logger = logging.getLogger(__name__)
+
+# Intervalo das barras acompanhadas (1d pelos snapshots; 1m quando a ingestão de ticks está ligada)
+ANOMALY_INTERVAL = os.getenv('ANOMALY_INTERVAL', '1d')
+# Janela equivalente da média exponencial (alpha = 2 / (N + 1))
+ANOMALY_SPAN = int(os.getenv('ANOMALY_SPAN', '20'))
+# z-score do log-volume a partir do qual a barra vira alerta
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', '3'))
+# Barras fechadas necessárias antes de classificar (aquecimento das estatísticas)
+ANOMALY_MIN_BARS = int(os.getenv('ANOMALY_MIN_BARS', '20'))
+# Histórico usado para semear um símbolo novo (o resto do histórico pouco pesa na EWMA)
+ANOMALY_SEED_BARS = int(os.getenv('ANOMALY_SEED_BARS', '120'))
+# Mediana/MAD sobre as últimas N barras (0 desliga); quando ligado, decide o alerta
+ANOMALY_ROBUST_WINDOW = int(os.getenv('ANOMALY_ROBUST_WINDOW', '0'))
+ANOMALY_MAX_ALERTS = int(os.getenv('ANOMALY_MAX_ALERTS', '200'))
+# Fração mínima do pregão decorrida para projetar o volume da barra diária em formação
+# (no começo do pregão a projeção é ruído; até lá a barra fica sem classificação)
+ANOMALY_MIN_SESSION_FRACTION = float(os.getenv('ANOMALY_MIN_SESSION_FRACTION', '0.1'))
+
+# MAD -> desvio padrão para dados normais
+MAD_SCALE = 1.4826
+
+
+class VolumeAnomalyDetector:
+    """Estatísticas de volume por símbolo em arrays, atualizadas em O(1) por barra
+
+    Trabalha sobre log(1 + volume): EWMA da média e da variância das barras fechadas
+    e z-score da barra corrente (ainda em formação) contra elas. A barra corrente só
+    entra nas estatísticas quando chega a seguinte. Em barras diárias com calendário, o
+    volume parcial é projetado para o dia inteiro pela fração do pregão já decorrida.
+    """
+
+    # Arrays por slot e o valor de um slot vazio
+    FILLS = {'mean': 0.0, 'var': 0.0, 'count': 0, 'current_ts': -1, 'current_volume': 0.0,
+             'session_fraction': 1.0, 'z': np.nan, 'robust_z': np.nan, 'alerted_ts': -1}
+
+    def __init__(self, interval: str = ANOMALY_INTERVAL, span: int = ANOMALY_SPAN,
+                 threshold: float = ANOMALY_Z_THRESHOLD, min_bars: int = ANOMALY_MIN_BARS,
+                 robust_window: int = ANOMALY_ROBUST_WINDOW, max_alerts: int = ANOMALY_MAX_ALERTS,
+                 calendar: Optional[MarketCalendar] = None,
+                 min_session_fraction: float = ANOMALY_MIN_SESSION_FRACTION,
+                 clock: Callable[[], float] = time.time, capacity: int = 1024):
+        self.interval = interval
+        self.calendar = calendar if interval == '1d' else None
+        self.min_session_fraction = min_session_fraction
+        self.clock = clock
+        self.alpha = 2.0 / (span + 1)
+        self.threshold = threshold
+        self.min_bars = min_bars
+        self.robust_window = robust_window
+        self.slots: Dict[str, int] = {}
+        self.symbols: List[str] = []
+        self.mean = np.zeros(capacity)
+        self.var = np.zeros(capacity)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        # Barra corrente de cada símbolo: timestamp (ns), volume e z-scores
+        self.current_ts = np.full(capacity, -1, dtype=np.int64)
+        self.current_volume = np.zeros(capacity)
+        self.session_fraction = np.ones(capacity)
+        self.z = np.full(capacity, np.nan)
+        self.robust_z = np.full(capacity, np.nan)
+        self.alerted_ts = np.full(capacity, -1, dtype=np.int64)
+        self.window = np.full((capacity, max(robust_window, 1)), np.nan)
+        self.alerts = deque(maxlen=max_alerts)
+        self._listeners: List[Callable] = []
+        self.updates = 0
+        self.total_alerts = 0
+
+    def subscribe(self, callback: Callable):
+        """callback(alert) a cada pico detectado"""
+        self._listeners.append(callback)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    # ----- slots -----
+    def _grow(self):
+        capacity = len(self.mean) * 2
+        for name, fill in self.FILLS.items():
+            array = getattr(self, name)
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+        window = np.full((capacity, self.window.shape[1]), np.nan)
+        window[:len(self.window)] = self.window
+        self.window = window
+
+    def _slot(self, symbol: str) -> int:
+        slot = self.slots.get(symbol)
+        if slot is None:
+            slot = len(self.symbols)
+            if slot == len(self.mean):
+                self._grow()
+            self.slots[symbol] = slot
+            self.symbols.append(symbol)
+        return slot
+
+    # ----- atualização -----
+    def _fold(self, slot: int, volume: float):
+        """Incorpora uma barra fechada (EWMA incremental de média e variância)"""
+        x = np.log1p(volume)
+        if self.count[slot] == 0:
+            self.mean[slot] = x
+            self.var[slot] = 0.0
+        else:
+            diff = x - self.mean[slot]
+            increment = self.alpha * diff
+            self.mean[slot] += increment
+            self.var[slot] = (1 - self.alpha) * (self.var[slot] + diff * increment)
+        self.count[slot] += 1
+        if self.robust_window:
+            self.window[slot, self.count[slot] % self.robust_window] = x
+
+    def _session_fraction(self, slot: int, timestamp: int) -> float:
+        """Fração do pregão decorrida na barra diária (1.0 se fechada, sem calendário ou intradiária)"""
+        if self.calendar is None:
+            return 1.0
+        exchange = self.calendar.exchange_for(self.symbols[slot])
+        session = exchange.session(pd.Timestamp(timestamp).date())
+        if session is None:
+            return 1.0
+        opens, closes = (moment.timestamp() for moment in session)
+        return float(np.clip((self.clock() - opens) / (closes - opens), 0.0, 1.0))
+
+    def _projected(self, slot: int) -> float:
+        """Volume projetado para o pregão inteiro; NaN antes da abertura (fração zero)"""
+        fraction = self.session_fraction[slot]
+        return self.current_volume[slot] / fraction if fraction > 0 else np.nan
+
+    def _score(self, slot: int, timestamp: int, volume: float) -> Optional[Dict]:
+        """z-score da barra corrente contra as barras fechadas; devolve o alerta se for pico"""
+        self.current_ts[slot] = timestamp
+        self.current_volume[slot] = volume
+        self.session_fraction[slot] = fraction = self._session_fraction(slot, timestamp)
+        if self.count[slot] < self.min_bars or fraction <= 0 or fraction < self.min_session_fraction:
+            self.z[slot] = self.robust_z[slot] = np.nan
+            return None
+        # Volume parcial comparado como se o ritmo atual seguisse até o fechamento
+        x = np.log1p(volume / fraction)
+        std = np.sqrt(self.var[slot])
+        self.z[slot] = (x - self.mean[slot]) / std if std > 0 else 0.0
+        score = self.z[slot]
+        if self.robust_window:
+            window = self.window[slot]
+            median = np.nanmedian(window)
+            mad = np.nanmedian(np.abs(window - median)) * MAD_SCALE
+            self.robust_z[slot] = (x - median) / mad if mad > 0 else 0.0
+            score = self.robust_z[slot]
+        if score < self.threshold or self.alerted_ts[slot] == timestamp:
+            return None
+        self.alerted_ts[slot] = timestamp
+        return self._alert(slot, float(score))
+
+    def update(self, symbol: str, timestamp: int, volume: float) -> Optional[Dict]:
+        """Barra nova ou revisão da barra corrente (mesmo timestamp); O(1)"""
+        slot = self._slot(symbol.upper())
+        self.updates += 1
+        if self.current_ts[slot] >= 0 and timestamp > self.current_ts[slot]:
+            # A barra anterior fechou: entra nas estatísticas
+            self._fold(slot, self.current_volume[slot])
+        elif timestamp < self.current_ts[slot]:
+            return None
+        alert = self._score(slot, timestamp, volume)
+        if alert is not None:
+            self._emit(alert)
+        return alert
+
+    def seed(self, symbol: str, timestamps: np.ndarray, volumes: np.ndarray):
+        """Aquece um símbolo novo com o histórico recente, sem gerar alertas"""
+        slot = self._slot(symbol.upper())
+        timestamps = timestamps[-ANOMALY_SEED_BARS:]
+        volumes = volumes[-ANOMALY_SEED_BARS:].astype(np.float64)
+        for volume in volumes[:-1]:
+            self._fold(slot, volume)
+        self._score(slot, int(timestamps[-1]), float(volumes[-1]))
+        # Pico já em curso na carga inicial não é notícia
+        self.alerted_ts[slot] = timestamps[-1]
+
+    def on_bars(self, symbol: str, interval: str, series, new_bars: int):
+        """Assinante do PriceStore: processa só as barras que chegaram"""
+        if interval != self.interval or len(series) == 0:
+            return
+        slot = self.slots.get(symbol)
+        if slot is None or self.current_ts[slot] < 0:
+            self.seed(symbol, series.timestamps, series.volume)
+            return
+        # Barras após a corrente (new_bars delas) mais a própria corrente, que pode ter sido revisada
+        start = max(len(series) - new_bars - 1, 0)
+        timestamps = series.timestamps[start:]
+        fresh = timestamps >= self.current_ts[slot]
+        for timestamp, volume in zip(timestamps[fresh].tolist(), series.volume[start:][fresh].tolist()):
+            self.update(symbol, timestamp, volume)
+
+    def _alert(self, slot: int, score: float) -> Dict:
+        symbol = self.symbols[slot]
+        ratio = self._projected(slot) / max(np.expm1(self.mean[slot]), 1.0)
+        return {
+            'type': 'VOLUME_SPIKE',
+            'symbol': symbol,
+            'timestamp': pd.Timestamp(int(self.current_ts[slot])).isoformat(),
+            'volume': int(self.current_volume[slot]),
+            'z_score': round(score, 2),
+            'volume_ratio': round(float(ratio), 2),
+            'priority': 'HIGH' if score >= 2 * self.threshold else 'MEDIUM',
+            'message': f"Volume de {symbol} {ratio:.1f}x acima do normal (z={score:.1f})"
+        }
+
+    def _emit(self, alert: Dict):
+        self.alerts.append(alert)
+        self.total_alerts += 1
+        for callback in self._listeners:
+            try:
+                callback(alert)
+            except Exception as e:
+                logger.error(f"Erro em assinante de anomalias: {e}")
+
+    # ----- leitura (estado já calculado) -----
+    def classify(self, z: float) -> str:
+        if np.isnan(z):
+            return 'UNKNOWN'
+        if z >= self.threshold:
+            return 'SPIKE'
+        if z >= 1:
+            return 'HIGH'
+        if z <= -1:
+            return 'LOW'
+        return 'NORMAL'
+
+    def _score_of(self, slot: int) -> float:
+        return self.robust_z[slot] if self.robust_window else self.z[slot]
+
+    def state(self, symbol: str) -> Optional[Dict]:
+        slot = self.slots.get(symbol.upper())
+        if slot is None:
+            return None
+        z = float(self._score_of(slot))
+        result = {
+            'symbol': self.symbols[slot],
+            'timestamp': pd.Timestamp(int(self.current_ts[slot])).isoformat(),
+            'volume': int(self.current_volume[slot]),
+            'typical_volume': int(np.expm1(self.mean[slot])),
+            'z_score': None if np.isnan(z) else round(z, 2),
+            'bars': int(self.count[slot]),
+            'classification': self.classify(z)
+        }
+        # Projeção só com pregão suficiente decorrido (antes disso é ruído ou divisão por zero)
+        fraction = float(self.session_fraction[slot])
+        if 0 < fraction < 1 and fraction >= self.min_session_fraction:
+            result['session_fraction'] = round(fraction, 3)
+            result['projected_volume'] = int(self._projected(slot))
+        if self.robust_window:
+            ewma_z = float(self.z[slot])
+            result['ewma_z_score'] = None if np.isnan(ewma_z) else round(ewma_z, 2)
+        return result
+
+    def top(self, limit: int = 20) -> List[Dict]:
+        """Símbolos com maior z-score corrente (ordenação vetorizada sobre os arrays)"""
+        n = len(self.symbols)
+        scores = (self.robust_z if self.robust_window else self.z)[:n]
+        ranked = np.argsort(np.where(np.isnan(scores), -np.inf, -scores), kind='stable')
+        return [self.state(self.symbols[slot]) for slot in ranked[:limit] if not np.isnan(scores[slot])]
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        return list(self.alerts)[-limit:][::-1]
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.FILLS) + self.window.nbytes
+
+    def metrics(self) -> Dict:
+        n = len(self.symbols)
+        scores = (self.robust_z if self.robust_window else self.z)[:n]
+        return {
+            'interval': self.interval,
+            'symbols': n,
+            'warm_symbols': int((self.count[:n] >= self.min_bars).sum()),
+            'spiking': int((scores >= self.threshold).sum()),
+            'updates': self.updates,
+            'total_alerts': self.total_alerts,
+            'threshold': self.threshold,
+            'robust_window': self.robust_window,
+            'nbytes': self.nbytes()
+        }
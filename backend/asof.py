@@ -0,0 +1,295 @@
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candlestick_patterns import LOOKBACK, detect_latest
+from data_provider import CHUNK_DAYS, provider
+from indicator_pipeline import canonical_spec
+from price_store import DAILY_INTERVALS, normalize_index
+from series import CompactSeries
+from streaming_indicators import StreamingIndicators
+
+logger = logging.getLogger(__name__)
+
+# Barras entre checkpoints do estado dos indicadores (teto do recálculo de uma consulta)
+ASOF_CHECKPOINT_BARS = int(os.getenv('ASOF_CHECKPOINT_BARS', '1024'))
+# Índices (símbolo, intervalo, spec) mantidos em memória (LRU)
+ASOF_MAX_INDEXES = int(os.getenv('ASOF_MAX_INDEXES', '256'))
+# Instantes aceitos numa consulta em lote
+ASOF_MAX_TIMESTAMPS = int(os.getenv('ASOF_MAX_TIMESTAMPS', '1000'))
+# Barras buscadas antes do instante mais antigo pedido (aquecimento das médias exponenciais)
+ASOF_WARMUP_BARS = int(os.getenv('ASOF_WARMUP_BARS', '300'))
+# Históricos buscados no provedor além do PriceStore (LRU por símbolo e intervalo)
+ASOF_MAX_ARCHIVES = int(os.getenv('ASOF_MAX_ARCHIVES', '32'))
+
+INTERVAL_PATTERN = re.compile(r'^(\d+)(m|h|d|wk|mo)$')
+UNIT_SECONDS = {'m': 60, 'h': 3600, 'd': 86400, 'wk': 7 * 86400, 'mo': 31 * 86400}
+
+
+def validate_interval(interval: str) -> Optional[str]:
+    """Mensagem de erro para intervalos que o provedor não atende"""
+    if interval not in CHUNK_DAYS:
+        return f"Intervalo inválido: {interval} (disponíveis: {', '.join(CHUNK_DAYS)})"
+    return None
+
+
+def warmup_span(interval: str, bars: int = ASOF_WARMUP_BARS) -> pd.Timedelta:
+    """Tempo de calendário que cobre `bars` barras (folga para fins de semana e noites)"""
+    amount, unit = INTERVAL_PATTERN.match(interval).groups()
+    factor = 1.5 if interval in DAILY_INTERVALS else 4
+    return pd.Timedelta(seconds=int(amount) * UNIT_SECONDS[unit] * bars * factor)
+
+
+def to_timestamps(values: Sequence[str], interval: str = '1d') -> np.ndarray:
+    """Instantes pedidos -> int64 (ns) no referencial do PriceStore (ver normalize_index)
+
+    Com fuso: data local para barras diárias, UTC para intraday; sem fuso, como vieram.
+    """
+    result = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None:
+            timestamp = (timestamp.tz_localize(None) if interval in DAILY_INTERVALS
+                         else timestamp.tz_convert('UTC').tz_localize(None))
+        result[i] = timestamp.value
+    return result
+
+
+def _round(column: str, value) -> Optional[float]:
+    """Mesmo arredondamento de IndicatorPlan.latest"""
+    return None if pd.isna(value) else round(float(value), 4 if column.startswith('macd') else 2)
+
+
+class AsOfIndex:
+    """Checkpoints do estado dos indicadores de uma série a cada `every` barras
+
+    O checkpoint na posição p é o estado depois das barras [0, p): o valor na barra i
+    sai do checkpoint anterior mais até `every` barras processadas, nunca do histórico todo.
+    """
+
+    # Distância (barras) até o próximo checkpoint a partir da qual vale abrir outro update
+    MERGE_GAP = 2048
+
+    def __init__(self, spec: str, every: int = ASOF_CHECKPOINT_BARS):
+        self.spec = spec
+        self.every = every
+        self.positions: List[int] = [0]
+        # (timestamp e fechamento da barra p-1, estado) de cada checkpoint
+        self.checkpoints: List[Tuple[Optional[int], Optional[float], StreamingIndicators]] = [
+            (None, None, StreamingIndicators(spec))]
+        self.series = None
+        self.first: Optional[int] = None
+        self.bars_computed = 0
+        self.lock = threading.Lock()
+
+    def _truncate(self, keep: int):
+        del self.positions[keep:]
+        del self.checkpoints[keep:]
+
+    def _validate(self, series):
+        """Descarta checkpoints cujas barras anteriores mudaram (revisão ou histórico estendido para trás)"""
+        if self.first != int(series.timestamps[0]):
+            self._truncate(1)
+            self.first = int(series.timestamps[0])
+            return
+        for i in range(1, len(self.positions)):
+            position = self.positions[i]
+            timestamp, close, _ = self.checkpoints[i]
+            if (position > len(series) or series.timestamps[position - 1] != timestamp
+                    or series.close[position - 1] != close):
+                self._truncate(i)
+                return
+
+    def _extend(self, series, position: int):
+        """Cria os checkpoints que faltam até a posição pedida"""
+        while self.positions[-1] + self.every <= position:
+            start = self.positions[-1]
+            end = start + self.every
+            state = self.checkpoints[-1][2].copy()
+            state.update(series[start:end].to_frame())
+            self.bars_computed += end - start
+            self.positions.append(end)
+            self.checkpoints.append((int(series.timestamps[end - 1]), float(series.close[end - 1]), state))
+
+    def rows(self, series, positions: np.ndarray) -> pd.DataFrame:
+        """Indicadores na barra positions[i] - 1 (posições >= 1), na ordem pedida
+
+        Cada posição parte do checkpoint estritamente anterior (ao menos uma barra a processar);
+        posições próximas são agrupadas num único update a partir do primeiro checkpoint do grupo.
+        """
+        with self.lock:
+            if series is not self.series:
+                self._validate(series)
+                self.series = series
+            self._extend(series, int(positions.max()))
+            starts = np.asarray(self.positions)
+            order = np.argsort(positions, kind='stable')
+            ordered = positions[order]
+            which = np.searchsorted(starts, ordered, side='left') - 1
+            # Novo grupo só quando o checkpoint seguinte está a mais de MERGE_GAP barras do fim do atual:
+            # cada update tem um custo fixo (pandas) equivalente a milhares de barras
+            breaks = np.flatnonzero(starts[which[1:]] - ordered[:-1] > self.MERGE_GAP) + 1
+            frames = []
+            for members in np.split(np.arange(len(ordered)), breaks):
+                group = which[members[0]]
+                start = int(starts[group])
+                end = int(ordered[members[-1]])
+                state = self.checkpoints[group][2].copy()
+                values = state.update(series[start:end].to_frame())
+                self.bars_computed += end - start
+                frames.append(values.iloc[ordered[members] - 1 - start])
+            frame = pd.concat(frames)
+            return frame.iloc[np.argsort(order, kind='stable')]
+
+
+class AsOfService:
+    """Consultas "como estava em t" sobre as séries do PriceStore, sem recalcular o histórico"""
+
+    def __init__(self, store, every: int = ASOF_CHECKPOINT_BARS, max_indexes: int = ASOF_MAX_INDEXES,
+                 source=provider, max_archives: int = ASOF_MAX_ARCHIVES):
+        self.store = store
+        self.every = every
+        self.max_indexes = max_indexes
+        self.source = source
+        self.max_archives = max_archives
+        self.indexes: OrderedDict = OrderedDict()
+        # (símbolo, intervalo) -> {'series', 'from', 'until', 'stored', 'merged', 'lock'}
+        self.archives: OrderedDict = OrderedDict()
+        self.queries = 0
+        self.backfills = 0
+        self._lock = threading.Lock()
+
+    def index(self, symbol: str, interval: str, spec: str) -> AsOfIndex:
+        key = (symbol.upper(), interval, spec)
+        with self._lock:
+            index = self.indexes.get(key)
+            if index is None:
+                index = self.indexes[key] = AsOfIndex(spec, self.every)
+                while len(self.indexes) > self.max_indexes:
+                    self.indexes.popitem(last=False)
+            self.indexes.move_to_end(key)
+            return index
+
+    def _fetch(self, symbol: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> Optional[CompactSeries]:
+        frames = [normalize_index(chunk, interval) for chunk in
+                  self.source.iter_history(symbol, start.to_pydatetime(), end.to_pydatetime(), interval)]
+        self.backfills += 1
+        if not frames:
+            return None
+        frame = pd.concat(frames)
+        return CompactSeries.from_frame(frame[~frame.index.duplicated(keep='last')].sort_index())
+
+    def series(self, symbol: str, interval: str, earliest: int, latest: int) -> Optional[CompactSeries]:
+        """Série do PriceStore completada pelo provedor quando os instantes pedidos (com aquecimento)
+        caem antes dela, ou quando o intervalo não é mantido no store (bloqueante)"""
+        key = (symbol.upper(), interval)
+        stored = self.store.get(symbol, interval)
+        if stored is not None and len(stored) == 0:
+            stored = None
+        with self._lock:
+            archive = self.archives.get(key)
+            if archive is None:
+                archive = self.archives[key] = {'series': None, 'from': None, 'until': None,
+                                                'stored': None, 'merged': None, 'lock': threading.Lock()}
+                while len(self.archives) > self.max_archives:
+                    self.archives.popitem(last=False)
+            self.archives.move_to_end(key)
+        with archive['lock']:
+            return self._complete(archive, symbol, interval, stored, earliest, latest)
+
+    def _complete(self, archive: Dict, symbol: str, interval: str, stored: Optional[CompactSeries],
+                  earliest: int, latest: int) -> Optional[CompactSeries]:
+        need = pd.Timestamp(earliest) - warmup_span(interval)
+        now = pd.Timestamp(datetime.now())
+        covered = stored if stored is not None else archive['series']
+        first = pd.Timestamp(int(covered.timestamps[0])) if covered is not None else now
+        # Para trás: só o trecho ainda não buscado (o provedor pode não ter nada tão antigo)
+        if need < first and (archive['from'] is None or need < archive['from']):
+            end = archive['from'] if archive['from'] is not None and archive['from'] < first else first
+            older = self._fetch(symbol, interval, need, end + pd.Timedelta(days=1))
+            archive['from'] = need
+            if older is not None:
+                archive['series'] = older if archive['series'] is None else older.merge(archive['series'])
+                archive['merged'] = None
+        # Para frente: intervalos fora do store são completados até o instante mais recente pedido
+        if stored is None and archive['series'] is not None:
+            last = pd.Timestamp(int(archive['series'].timestamps[-1]))
+            if latest > last.value and (archive['until'] is None or archive['until'] < min(pd.Timestamp(latest), now)):
+                newer = self._fetch(symbol, interval, last, now + pd.Timedelta(days=1))
+                archive['until'] = now
+                if newer is not None:
+                    archive['series'] = archive['series'].merge(newer)
+        if archive['series'] is None:
+            return stored
+        if stored is None:
+            return archive['series']
+        # Barras do store (mais recentes) prevalecem; a junção fica em cache até uma delas mudar
+        if archive['merged'] is None or archive['stored'] is not stored:
+            archive['merged'] = archive['series'].merge(stored)
+            archive['stored'] = stored
+        return archive['merged']
+
+    def query(self, symbol: str, at: Sequence[str], spec: str, interval: str = '1d') -> Optional[Dict]:
+        """Indicadores e padrões na última barra com timestamp <= cada instante (bloqueante)
+
+        None se não há histórico do símbolo; ValueError para instantes ou intervalo inválidos.
+        """
+        error = validate_interval(interval)
+        if error:
+            raise ValueError(error)
+        spec = canonical_spec(spec)
+        wanted = to_timestamps(at, interval)
+        series = self.series(symbol, interval, int(wanted.min()), int(wanted.max()))
+        if series is None or len(series) == 0:
+            return None
+        # Busca binária de todos os instantes de uma vez no índice ordenado
+        positions = np.searchsorted(series.timestamps, wanted, side='right')
+        found = positions > 0
+        self.queries += 1
+
+        results: List[Dict] = [{'at': value, 'error': 'Anterior ao início do histórico'} for value in at]
+        if found.any():
+            hits = positions[found]
+            values = self.index(symbol, interval, spec).rows(series, hits)
+            patterns = self._patterns(series, hits)
+            columns = list(values.columns)
+            matrix = values.to_numpy()
+            for row, i in enumerate(np.flatnonzero(found)):
+                bar = int(hits[row]) - 1
+                results[i] = {
+                    'at': at[i],
+                    'bar': pd.Timestamp(int(series.timestamps[bar])).isoformat(),
+                    'indicators': {'current_price': round(float(series.close[bar]), 2),
+                                   **{column: _round(column, value) for column, value in zip(columns, matrix[row])}},
+                    'patterns': patterns[row],
+                }
+        return {'first_bar': pd.Timestamp(int(series.timestamps[0])).isoformat(),
+                'last_bar': series.last_timestamp.isoformat(), 'results': results}
+
+    @staticmethod
+    def _patterns(series, positions: np.ndarray) -> List[List[str]]:
+        """Padrões de candlestick nas barras pedidas: janelas finais empilhadas numa matriz"""
+        width = LOOKBACK + 1
+        rows = positions[:, None] - width + np.arange(width)
+        valid = rows >= 0
+        rows = np.clip(rows, 0, None)
+        ohlc = [np.where(valid, getattr(series, field)[rows].astype(np.float64), np.nan)
+                for field in ('open', 'high', 'low', 'close')]
+        hits = detect_latest(*ohlc)
+        return [[name for name, hit in hits.items() if hit[row, -1]] for row in range(len(positions))]
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            indexes = list(self.indexes.values())
+            archives = [a['series'] for a in self.archives.values() if a['series'] is not None]
+        return {'indexes': len(indexes), 'archives': len(archives), 'archive_bytes': sum(a.nbytes for a in archives),
+                'backfills': self.backfills, 'checkpoints': sum(len(i.positions) for i in indexes),
+                'bars_computed': sum(i.bars_computed for i in indexes), 'queries': self.queries,
+                'checkpoint_bars': self.every}
@@ -0,0 +1,57 @@
+"""Benchmark da ingestão de ticks num core: parse (np.frombuffer) + rings + barras + disco
+
+Uso: python benchmark_ingestion.py [ticks] [símbolos] [bytes por leitura]
+"""
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ingestion import TICK_DTYPE, IngestionService, TickSimulator, TickWriter
+from price_store import PriceStore
+
+
+def main(ticks: int = 2_000_000, symbols: int = 500, read_size: int = 1 << 16):
+    simulator = TickSimulator([f'SYM{i}' for i in range(symbols)], rate=100_000)
+    stream = simulator.generate(ticks)
+    root = tempfile.mkdtemp(prefix='ticks-')
+    service = IngestionService(None, price_store=PriceStore(), writer=TickWriter(root))
+
+    # Mesmo fatiamento do TCPFeed: leituras de read_size com resto guardado para a próxima;
+    # descarga síncrona quando um ring passa da metade (no serviço ela roda numa thread)
+    ingest = flush = 0.0
+    pending = b''
+    for offset in range(0, len(stream), read_size):
+        started = time.perf_counter()
+        data = pending + stream[offset:offset + read_size]
+        count = len(data) // TICK_DTYPE.itemsize
+        service.ingest(np.frombuffer(data, dtype=TICK_DTYPE, count=count))
+        pending = data[count * TICK_DTYPE.itemsize:]
+        ingest += time.perf_counter() - started
+        if service.writer.needs_flush(service.rings):
+            started = time.perf_counter()
+            service.flush_now()
+            flush += time.perf_counter() - started
+
+    started = time.perf_counter()
+    service.publish()
+    bars = time.perf_counter() - started
+
+    started = time.perf_counter()
+    service.flush_now()
+    flush += time.perf_counter() - started
+    written = service.writer.bytes_written
+    shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{ticks:,} ticks, {symbols} símbolos, lotes de {read_size // TICK_DTYPE.itemsize:,} ticks")
+    print(f"Parse + rings: {ticks / ingest:,.0f} ticks/s ({ingest * 1000:.0f} ms)")
+    print(f"Barras ({service.bar_builder.interval}) p/ PriceStore: {bars * 1000:.0f} ms")
+    print(f"Disco: {written / 1e6:.1f} MB em {flush * 1000:.0f} ms ({written / 1e6 / max(flush, 1e-9):,.0f} MB/s), "
+          f"{service.writer.overruns:,} ticks perdidos por volta do ring")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:4]]
+    main(*args)
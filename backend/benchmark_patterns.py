@@ -0,0 +1,82 @@
+"""Benchmark dos padrões de candlestick: matriz (símbolos x barras) vs laço por barra em Python
+
+Uso: python benchmark_patterns.py [símbolos] [barras]
+"""
+import sys
+import time
+
+import numpy as np
+
+from candlestick_patterns import LOOKBACK, PATTERNS, PatternScreener, detect, detect_latest
+from price_store import PriceStore
+from series import CompactSeries
+
+
+def synthetic_ohlc(symbols: int, bars: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, (symbols, bars)), axis=1))
+    open = close * np.exp(rng.normal(0, 0.01, (symbols, bars)))
+    high = np.maximum(open, close) * np.exp(np.abs(rng.normal(0, 0.008, (symbols, bars))))
+    low = np.minimum(open, close) * np.exp(-np.abs(rng.normal(0, 0.008, (symbols, bars))))
+    return open, high, low, close
+
+
+def engulfing_loop(open, high, low, close):
+    """Referência ingênua: um padrão, barra a barra, símbolo a símbolo"""
+    hits = np.zeros(open.shape, dtype=bool)
+    for s in range(open.shape[0]):
+        o, c = open[s].tolist(), close[s].tolist()
+        for t in range(1, len(o)):
+            hits[s, t] = (c[t - 1] < o[t - 1] and c[t] > o[t] and o[t] <= c[t - 1] and c[t] >= o[t - 1]
+                          and abs(c[t] - o[t]) > abs(c[t - 1] - o[t - 1]))
+    return hits
+
+
+def timed(fn, repeat: int = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(symbols: int = 1000, bars: int = 1260):
+    ohlc = synthetic_ohlc(symbols, bars)
+    cells = symbols * bars
+    print(f"{symbols} símbolos x {bars} barras ({cells / 1e6:.2f} M candles), {len(PATTERNS)} padrões")
+
+    full, hits = timed(lambda: detect(*ohlc))
+    print(f"Matriz completa: {full * 1000:.0f} ms ({cells * len(PATTERNS) / full / 1e6:,.0f} M avaliações/s)")
+    per_pattern = {}
+    for name in PATTERNS:
+        elapsed, _ = timed(lambda: detect(*ohlc, patterns=[name]))
+        per_pattern[name] = elapsed
+        print(f"  {name:<22} {elapsed * 1000:7.1f} ms  {hits[name].sum():>7,} ocorrências")
+
+    latest, recent = timed(lambda: detect_latest(*ohlc))
+    assert all((recent[name][:, -1] == hits[name][:, -1]).all() for name in PATTERNS)
+    print(f"Incremental (última barra, janela de {LOOKBACK + 1}): {latest * 1000:.2f} ms")
+
+    loop, reference = timed(lambda: engulfing_loop(*ohlc), repeat=1)
+    assert (reference == hits['bullish_engulfing']).all()
+    print(f"Laço Python (só bullish_engulfing): {loop * 1000:.0f} ms -> "
+          f"{loop / per_pattern['bullish_engulfing']:.0f}x mais lento que a versão vetorizada")
+
+    store = PriceStore()
+    screener = PatternScreener(store)
+    timestamps = np.arange(bars, dtype=np.int64) * 86_400 * 10**9
+    for s in range(symbols):
+        store.update_series(f'SYM{s}', CompactSeries(timestamps, *(x[s] for x in ohlc), np.zeros(bars)))
+    rebuild, _ = timed(screener.rebuild)
+    started = time.perf_counter()
+    for s in range(symbols):
+        screener.on_bars(f'SYM{s}', '1d', store.get(f'SYM{s}'), 1)
+    per_symbol = (time.perf_counter() - started) / symbols
+    print(f"Screener: rebuild de {symbols} símbolos {rebuild * 1000:.1f} ms; "
+          f"barra nova em um símbolo {per_symbol * 1e6:.0f} µs")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
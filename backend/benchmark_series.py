@@ -0,0 +1,65 @@
+"""Benchmark de memória: DataFrame do yfinance vs CompactSeries (bytes por barra)
+
+Uso: python benchmark_series.py [símbolos] [barras]
+"""
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from series import CompactSeries
+
+
+def yfinance_like_frame(bars: int, seed: int) -> pd.DataFrame:
+    """DataFrame no formato de Ticker.history (índice com fuso + 7 colunas float64)"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    index = pd.date_range('2015-01-01', periods=bars, freq='D', tz='America/New_York')
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.002, bars)),
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1e5, 5e7, bars).astype(np.float64),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=index)
+
+
+def measure(build) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return after - before
+
+
+def main(symbols: int = 1000, bars: int = 1260):
+    frames = [yfinance_like_frame(bars, seed) for seed in range(symbols)]
+    total_bars = symbols * bars
+
+    results = {
+        'DataFrame (pandas)': measure(lambda: [f.copy(deep=True) for f in frames]),
+        'CompactSeries float64': measure(lambda: [CompactSeries.from_frame(f, np.float64) for f in frames]),
+        'CompactSeries float32': measure(lambda: [CompactSeries.from_frame(f, np.float32) for f in frames]),
+    }
+
+    payload = {
+        'DataFrame (pandas)': sum(int(f.memory_usage(deep=True).sum()) for f in frames),
+        'CompactSeries float64': sum(CompactSeries.from_frame(f, np.float64).nbytes for f in frames),
+        'CompactSeries float32': sum(CompactSeries.from_frame(f, np.float32).nbytes for f in frames),
+    }
+
+    print(f"{symbols} símbolos x {bars} barras = {total_bars:,} barras")
+    print("alocado (tracemalloc) | dados (nbytes/memory_usage)")
+    baseline = results['DataFrame (pandas)']
+    for name, size in results.items():
+        print(f"{name:<24} {size / 2 ** 20:9.1f} MiB  {size / total_bars:6.1f} bytes/barra  "
+              f"({size / baseline:.0%} do DataFrame) | {payload[name] / total_bars:6.1f} bytes/barra")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
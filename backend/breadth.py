@@ -0,0 +1,146 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SMA_WINDOWS = (20, 50, 200)
+# Máximas/mínimas de 52 semanas
+HIGH_LOW_WINDOW = 252
+# Horizontes (em pregões) dos retornos setoriais
+RETURN_HORIZONS = {'1d': 1, '1w': 5, '1m': 21}
+INDEX_CURVE_BARS = 60
+
+STAT_COLUMNS = (['close', 'prev_close'] + [f'sma_{w}' for w in SMA_WINDOWS]
+                + ['high_52w', 'low_52w'] + [f'ret_{h}' for h in RETURN_HORIZONS])
+
+
+def compute_stats(closes: pd.DataFrame) -> pd.DataFrame:
+    """Estatísticas por símbolo em uma única passada vetorizada (datas x símbolos)"""
+    closes = closes.ffill()
+    values = closes.to_numpy(dtype=np.float64)
+    counts = closes.notna().sum().to_numpy()
+    stats = {'close': values[-1], 'prev_close': values[-2] if len(values) > 1 else values[-1]}
+    for w in SMA_WINDOWS:
+        sma = np.nanmean(values[-w:], axis=0) if len(values) else np.array([])
+        stats[f'sma_{w}'] = np.where(counts >= w, sma, np.nan)
+    window = values[-HIGH_LOW_WINDOW:]
+    stats['high_52w'] = np.nanmax(window, axis=0)
+    stats['low_52w'] = np.nanmin(window, axis=0)
+    for name, bars in RETURN_HORIZONS.items():
+        base = values[-bars - 1] if len(values) > bars else values[0]
+        stats[f'ret_{name}'] = (values[-1] / base - 1) * 100
+    return pd.DataFrame(stats, index=closes.columns)[STAT_COLUMNS]
+
+
+class MarketBreadth:
+    """Amplitude de mercado e retornos setoriais sobre a matriz de preços em cache"""
+
+    def __init__(self, store, fundamentals=None, fx=None):
+        self.store = store
+        self.fundamentals = fundamentals
+        self.fx = fx
+        self.stats = pd.DataFrame(columns=STAT_COLUMNS, dtype=np.float64)
+        # Estatísticas na moeda pedida: moeda -> (versão do câmbio/barras, stats)
+        self._converted_stats: Dict[str, tuple] = {}
+
+    def rebuild(self):
+        """Recalcula todos os símbolos a partir da matriz do PriceStore"""
+        closes = self.store.matrix('Close')
+        if not closes.empty:
+            self.stats = compute_stats(closes)
+
+    def on_bars(self, symbol: str, interval: str, bars, new_bars: int):
+        """Assinante do PriceStore: atualiza apenas a linha do símbolo"""
+        if interval != '1d':
+            return
+        row = compute_stats(bars.tail(HIGH_LOW_WINDOW + 1).to_series('Close').rename(symbol).to_frame())
+        self.stats.loc[symbol] = row.loc[symbol]
+
+    def forget(self, symbol: str):
+        """Tira das contagens um símbolo removido do PriceStore"""
+        self.stats = self.stats.drop(index=symbol, errors='ignore')
+        self._converted_stats.clear()
+
+    def _sector(self, symbol: str) -> str:
+        info = self.fundamentals.get(symbol) if self.fundamentals is not None else None
+        return (info or {}).get('sector') or 'N/A'
+
+    def _stats_in(self, currency: str) -> pd.DataFrame:
+        """Todas as estatísticas com preços convertidos (uma conversão por versão das barras)"""
+        version = self.fx.version()
+        cached = self._converted_stats.get(currency)
+        if cached is None or cached[0] != version:
+            closes = self.fx.converted(currency, window=HIGH_LOW_WINDOW + 1)
+            stats = compute_stats(closes) if not closes.empty else self.stats.iloc[:0]
+            cached = self._converted_stats[currency] = (version, stats)
+        return cached[1]
+
+    def _index_curve(self, symbols: List[str], currency: Optional[str] = None) -> List[Dict]:
+        """Índice equal-weight do universo (base 100)"""
+        if currency:
+            converted = self.fx.converted(currency, window=HIGH_LOW_WINDOW + 1)
+            closes = converted[converted.columns.intersection(symbols)].tail(INDEX_CURVE_BARS + 1)
+            closes = closes.dropna(axis=1, how='all')
+        else:
+            closes = self.store.matrix('Close', symbols).ffill().tail(INDEX_CURVE_BARS + 1)
+        if closes.empty:
+            return []
+        returns = closes.pct_change(fill_method=None).iloc[1:].mean(axis=1).fillna(0)
+        curve = 100 * (1 + returns).cumprod()
+        return [{'date': d.isoformat(), 'value': round(float(v), 2)} for d, v in curve.items()]
+
+    def summary(self, symbols: Optional[List[str]] = None, include_tiles: bool = True,
+                currency: Optional[str] = None) -> Dict:
+        """currency: retornos e índice medidos numa moeda comum (ex.: USD para B3 + EUA)"""
+        currency = currency.upper() if currency and self.fx is not None else None
+        stats = self._stats_in(currency) if currency else self.stats
+        universe = pd.Index([s.upper() for s in symbols]) if symbols is not None else self.stats.index
+        stats = stats.loc[stats.index.intersection(universe)]
+        stats = stats.dropna(subset=['close', 'prev_close'])
+        # Símbolos do universo fora da conta (sem barras, ou sem câmbio para a moeda pedida)
+        excluded = universe.difference(stats.index)
+
+        day = stats['close'] - stats['prev_close']
+        result = {
+            'symbols': len(stats),
+            'advancers': int((day > 0).sum()),
+            'decliners': int((day < 0).sum()),
+            'unchanged': int((day == 0).sum()),
+            'new_highs': int((stats['close'] >= stats['high_52w']).sum()),
+            'new_lows': int((stats['close'] <= stats['low_52w']).sum()),
+            'currency': currency,
+            'excluded': list(excluded),
+            'timestamp': datetime.now().isoformat()
+        }
+        if currency:
+            # Com preço na moeda local mas ainda sem câmbio: a conversão completa quando os pares chegarem
+            without_fx = excluded.intersection(self.stats.dropna(subset=['close', 'prev_close']).index)
+            if len(without_fx):
+                result.update(pending=True, missing_fx=list(without_fx))
+        result['advance_decline_ratio'] = (
+            round(result['advancers'] / result['decliners'], 2) if result['decliners'] else None
+        )
+        for w in SMA_WINDOWS:
+            sma = stats[f'sma_{w}']
+            valid = sma.notna()
+            result[f'pct_above_sma_{w}'] = (
+                round(float((stats['close'][valid] > sma[valid]).mean() * 100), 2) if valid.any() else None
+            )
+
+        sectors = stats.groupby(stats.index.map(self._sector))
+        result['sectors'] = [
+            dict({'sector': name, 'symbols': len(group)},
+                 **{f'return_{h}': round(float(group[f'ret_{h}'].mean()), 2) for h in RETURN_HORIZONS})
+            for name, group in sectors
+        ]
+        if include_tiles:
+            result['tiles'] = [
+                {'symbol': s, 'sector': self._sector(s), 'change_percent': round(float(r), 2)}
+                for s, r in stats['ret_1d'].items()
+            ]
+            result['index_curve'] = self._index_curve(list(stats.index), currency)
+        return result
@@ -0,0 +1,277 @@
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Corpo médio das últimas N barras: referência de corpo "longo" e "pequeno"
+AVG_BODY_BARS = int(os.getenv('PATTERN_AVG_BODY_BARS', '10'))
+# Tendência antes do padrão: fechamento de t-1 contra o de t-1-N
+TREND_BARS = int(os.getenv('PATTERN_TREND_BARS', '5'))
+# Doji: corpo até essa fração da amplitude
+DOJI_BODY = 0.1
+# Barras necessárias para avaliar a última (modo incremental)
+LOOKBACK = max(TREND_BARS + 1, AVG_BODY_BARS + 2)
+
+
+def _lag(x: np.ndarray, k: int) -> np.ndarray:
+    """x deslocado k barras no último eixo (NaN/False no início)"""
+    out = np.empty_like(x)
+    out[..., :k] = False if x.dtype == np.bool_ else np.nan
+    out[..., k:] = x[..., :x.shape[-1] - k]
+    return out
+
+
+class Candles:
+    """Derivados de OHLC (símbolos x tempo) calculados uma vez e compartilhados pelos padrões"""
+
+    def __init__(self, open: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray):
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self._cache: Dict[Tuple[str, int], np.ndarray] = {}
+
+    def get(self, name: str, k: int = 0) -> np.ndarray:
+        """Campo (ou derivado) na barra t-k"""
+        key = (name, k)
+        value = self._cache.get(key)
+        if value is None:
+            value = _lag(self.get(name), k) if k else getattr(self, '_' + name)()
+            self._cache[key] = value
+        return value
+
+    def _open(self):
+        return self.open
+
+    def _high(self):
+        return self.high
+
+    def _low(self):
+        return self.low
+
+    def _close(self):
+        return self.close
+
+    def _body(self):
+        return np.abs(self.close - self.open)
+
+    def _range(self):
+        return self.high - self.low
+
+    def _top(self):
+        return np.maximum(self.open, self.close)
+
+    def _bottom(self):
+        return np.minimum(self.open, self.close)
+
+    def _upper(self):
+        return self.high - self.get('top')
+
+    def _lower(self):
+        return self.get('bottom') - self.low
+
+    def _bull(self):
+        return self.close > self.open
+
+    def _bear(self):
+        return self.close < self.open
+
+    def _avg_body(self):
+        """Média móvel do corpo; NaN enquanto a janela não está completa"""
+        # Soma das defasagens em ordem fixa: mesmo resultado na matriz completa e no modo incremental
+        total = self.get('body').copy()
+        for k in range(1, AVG_BODY_BARS):
+            total += self.get('body', k)
+        return total / AVG_BODY_BARS
+
+    def _long(self):
+        return self.get('body') > self.get('avg_body')
+
+    def _small(self):
+        return self.get('body') < 0.5 * self.get('avg_body')
+
+    def _downtrend(self):
+        return self.get('close', 1) < self.get('close', 1 + TREND_BARS)
+
+    def _uptrend(self):
+        return self.get('close', 1) > self.get('close', 1 + TREND_BARS)
+
+
+# ----- padrões: expressões booleanas sobre a matriz inteira -----
+def doji(c: Candles) -> np.ndarray:
+    return (c.get('range') > 0) & (c.get('body') <= DOJI_BODY * c.get('range'))
+
+
+def hammer(c: Candles) -> np.ndarray:
+    return (c.get('downtrend') & (c.get('range') > 0) & (c.get('lower') >= 2 * c.get('body'))
+            & (c.get('upper') <= 0.1 * c.get('range')))
+
+
+def shooting_star(c: Candles) -> np.ndarray:
+    return (c.get('uptrend') & (c.get('range') > 0) & (c.get('upper') >= 2 * c.get('body'))
+            & (c.get('lower') <= 0.1 * c.get('range')))
+
+
+def bullish_engulfing(c: Candles) -> np.ndarray:
+    return (c.get('bear', 1) & c.get('bull') & (c.get('open') <= c.get('close', 1))
+            & (c.get('close') >= c.get('open', 1)) & (c.get('body') > c.get('body', 1)))
+
+
+def bearish_engulfing(c: Candles) -> np.ndarray:
+    return (c.get('bull', 1) & c.get('bear') & (c.get('open') >= c.get('close', 1))
+            & (c.get('close') <= c.get('open', 1)) & (c.get('body') > c.get('body', 1)))
+
+
+def morning_star(c: Candles) -> np.ndarray:
+    midpoint = (c.get('open', 2) + c.get('close', 2)) / 2
+    return (c.get('bear', 2) & c.get('long', 2) & c.get('small', 1) & (c.get('top', 1) <= c.get('close', 2))
+            & c.get('bull') & (c.get('close') > midpoint))
+
+
+def evening_star(c: Candles) -> np.ndarray:
+    midpoint = (c.get('open', 2) + c.get('close', 2)) / 2
+    return (c.get('bull', 2) & c.get('long', 2) & c.get('small', 1) & (c.get('bottom', 1) >= c.get('close', 2))
+            & c.get('bear') & (c.get('close') < midpoint))
+
+
+def three_white_soldiers(c: Candles) -> np.ndarray:
+    result = c.get('bull', 2) & c.get('bull', 1) & c.get('bull')
+    for k in (0, 1):
+        result &= ((c.get('close', k) > c.get('close', k + 1)) & (c.get('open', k) > c.get('open', k + 1))
+                   & (c.get('open', k) < c.get('close', k + 1)) & (c.get('upper', k) <= 0.3 * c.get('body', k)))
+    return result & (c.get('body') > 0.5 * c.get('avg_body'))
+
+
+def three_black_crows(c: Candles) -> np.ndarray:
+    result = c.get('bear', 2) & c.get('bear', 1) & c.get('bear')
+    for k in (0, 1):
+        result &= ((c.get('close', k) < c.get('close', k + 1)) & (c.get('open', k) < c.get('open', k + 1))
+                   & (c.get('open', k) > c.get('close', k + 1)) & (c.get('lower', k) <= 0.3 * c.get('body', k)))
+    return result & (c.get('body') > 0.5 * c.get('avg_body'))
+
+
+# Nome -> (direção: +1 alta, -1 baixa, 0 indecisão; expressão)
+PATTERNS: Dict[str, Tuple[int, Callable[[Candles], np.ndarray]]] = {
+    'doji': (0, doji),
+    'hammer': (1, hammer),
+    'shooting_star': (-1, shooting_star),
+    'bullish_engulfing': (1, bullish_engulfing),
+    'bearish_engulfing': (-1, bearish_engulfing),
+    'morning_star': (1, morning_star),
+    'evening_star': (-1, evening_star),
+    'three_white_soldiers': (1, three_white_soldiers),
+    'three_black_crows': (-1, three_black_crows),
+}
+
+
+def parse_patterns(spec: Optional[str]) -> Optional[List[str]]:
+    """'hammer,doji' -> lista validada (None = todos)"""
+    if not spec:
+        return None
+    names = [name.strip().lower() for name in spec.split(',') if name.strip()]
+    unknown = [name for name in names if name not in PATTERNS]
+    if unknown:
+        raise ValueError(f"Padrões desconhecidos: {', '.join(unknown)} (disponíveis: {', '.join(PATTERNS)})")
+    return names
+
+
+def detect(open, high, low, close, patterns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """Todos os padrões sobre OHLC (símbolos x tempo, ou só tempo): uma expressão por padrão"""
+    candles = Candles(open, high, low, close)
+    return {name: PATTERNS[name][1](candles) for name in (patterns or PATTERNS)}
+
+
+def detect_latest(open, high, low, close, bars: int = 1,
+                  patterns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """Modo incremental: avalia só as últimas `bars` barras (a janela mínima que elas exigem)"""
+    width = LOOKBACK + bars
+    hits = detect(*(np.asarray(x)[..., -width:] for x in (open, high, low, close)), patterns=patterns)
+    return {name: hit[..., -bars:] for name, hit in hits.items()}
+
+
+def pattern_score(hits: Dict[str, np.ndarray]) -> np.ndarray:
+    """Soma das direções dos padrões presentes (>0 altista, <0 baixista)"""
+    return sum(PATTERNS[name][0] * hit.astype(np.int8) for name, hit in hits.items())
+
+
+def latest_patterns(open, high, low, close) -> List[str]:
+    """Padrões na última barra de um símbolo (arrays 1D)"""
+    hits = detect_latest(open, high, low, close)
+    return [name for name, hit in hits.items() if hit[-1]]
+
+
+def pattern_direction(names: Sequence[str]) -> int:
+    return sum(PATTERNS[name][0] for name in names)
+
+
+class PatternScreener:
+    """Padrões da última barra de cada símbolo, atualizados incrementalmente a cada barra nova"""
+
+    def __init__(self, store, interval: str = '1d'):
+        self.store = store
+        self.interval = interval
+        # símbolo -> (timestamp da última barra, padrões nela)
+        self.latest: Dict[str, Tuple[int, List[str]]] = {}
+        self.evaluations = 0
+
+    def on_bars(self, symbol: str, interval: str, bars, new_bars: int):
+        """Assinante do PriceStore: só a janela final da série é avaliada"""
+        if interval != self.interval or len(bars) == 0:
+            return
+        tail = bars.tail(LOOKBACK + 1)
+        self.latest[symbol] = (int(tail.timestamps[-1]),
+                               latest_patterns(tail.open, tail.high, tail.low, tail.close))
+        self.evaluations += 1
+
+    def rebuild(self):
+        """Reavalia todos os símbolos do store numa passada: caudas alinhadas pela direita"""
+        symbols = self.store.symbols(self.interval)
+        if not symbols:
+            return
+        width = LOOKBACK + 1
+        matrix = {field: np.full((len(symbols), width), np.nan) for field in ('open', 'high', 'low', 'close')}
+        last = []
+        for row, symbol in enumerate(symbols):
+            tail = self.store.get(symbol, self.interval).tail(width)
+            for field, values in matrix.items():
+                values[row, width - len(tail):] = getattr(tail, field)
+            last.append(int(tail.timestamps[-1]))
+        hits = detect_latest(matrix['open'], matrix['high'], matrix['low'], matrix['close'])
+        for row, symbol in enumerate(symbols):
+            self.latest[symbol] = (last[row], [name for name, hit in hits.items() if hit[row, -1]])
+        self.evaluations += len(symbols)
+
+    def screen(self, patterns: Optional[Sequence[str]] = None, symbols: Optional[Sequence[str]] = None,
+               direction: Optional[str] = None) -> List[Dict]:
+        """Símbolos com algum dos padrões pedidos na última barra (direction: bullish|bearish)"""
+        wanted = set(patterns or PATTERNS)
+        candidates = symbols if symbols is not None else list(self.latest)
+        results = []
+        for symbol in candidates:
+            entry = self.latest.get(symbol.upper())
+            if entry is None:
+                continue
+            if self.store.get(symbol, self.interval) is None:
+                # Símbolo despejado do store
+                self.latest.pop(symbol.upper(), None)
+                continue
+            found = [name for name in entry[1] if name in wanted]
+            if not found:
+                continue
+            score = pattern_direction(entry[1])
+            if (direction == 'bullish' and score <= 0) or (direction == 'bearish' and score >= 0):
+                continue
+            results.append({'symbol': symbol.upper(), 'patterns': found, 'all_patterns': entry[1],
+                            'score': score, 'last_bar': pd.Timestamp(entry[0]).isoformat()})
+        return sorted(results, key=lambda r: (-abs(r['score']), r['symbol']))
+
+    def metrics(self) -> Dict:
+        counts = {name: 0 for name in PATTERNS}
+        for _, names in self.latest.values():
+            for name in names:
+                counts[name] += 1
+        return {'symbols': len(self.latest), 'evaluations': self.evaluations, 'active': counts}
@@ -0,0 +1,111 @@
+import logging
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from indicator_pipeline import compile_plan
+
+logger = logging.getLogger(__name__)
+
+# Barras exibidas por padrão e limite do ?bars=
+CHART_BARS = int(os.getenv('CHART_BARS', '120'))
+CHART_MAX_BARS = int(os.getenv('CHART_MAX_BARS', '1260'))
+# Barras extras antes da janela para aquecer médias exponenciais e RSI
+CHART_WARMUP_BARS = 200
+
+PRICE_SPEC = "sma:20,ema:20"
+MOMENTUM_SPEC = "rsi:14,macd:12:26:9"
+
+
+def _values(series: pd.Series, digits: int = 4) -> List:
+    """Valores JSON-compatíveis (NaN -> None)"""
+    values = series.to_numpy(dtype=np.float64).round(digits)
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def _dates(index: pd.DatetimeIndex, interval: str) -> List[str]:
+    fmt = '%Y-%m-%d' if interval.endswith(('d', 'wk', 'mo')) else '%Y-%m-%dT%H:%M'
+    return list(index.strftime(fmt))
+
+
+def price_figure(data: pd.DataFrame, symbol: str, currency: str, interval: str) -> Dict:
+    indicators = compile_plan(PRICE_SPEC).run(data)
+    x = _dates(data.index, interval)
+    return {
+        'data': [
+            {'type': 'scatter', 'mode': 'lines', 'name': 'Preço', 'x': x, 'y': _values(data['Close']),
+             'line': {'color': '#2E86AB', 'width': 3}},
+            {'type': 'scatter', 'mode': 'lines', 'name': 'SMA 20', 'x': x, 'y': _values(indicators['sma_20']),
+             'line': {'color': '#F18F01', 'width': 2, 'dash': 'dash'}},
+            {'type': 'scatter', 'mode': 'lines', 'name': 'EMA 20', 'x': x, 'y': _values(indicators['ema_20']),
+             'line': {'color': '#A23B72', 'width': 2, 'dash': 'dot'}},
+        ],
+        'layout': {
+            'title': {'text': f"{symbol} - Preço e Médias Móveis"},
+            'xaxis': {'title': {'text': 'Data'}},
+            'yaxis': {'title': {'text': f"Preço ({currency})"}},
+            'height': 400,
+            'showlegend': True
+        }
+    }
+
+
+def momentum_figure(data: pd.DataFrame, symbol: str, currency: str, interval: str) -> Dict:
+    """RSI com faixas 30/70 em cima, MACD com histograma embaixo (eixos compartilhando o x)"""
+    indicators = compile_plan(MOMENTUM_SPEC).run(data)
+    x = _dates(data.index, interval)
+    histogram = indicators['macd_hist']
+    colors = np.where(histogram.to_numpy() >= 0, '#2ca02c', '#d62728').tolist()
+    band = {'type': 'rect', 'xref': 'paper', 'x0': 0, 'x1': 1, 'yref': 'y', 'layer': 'below', 'line': {'width': 0}}
+    return {
+        'data': [
+            {'type': 'scatter', 'mode': 'lines', 'name': 'RSI (14)', 'x': x, 'y': _values(indicators['rsi_14'], 2),
+             'line': {'color': 'darkblue', 'width': 2}, 'yaxis': 'y'},
+            {'type': 'bar', 'name': 'Histograma', 'x': x, 'y': _values(histogram), 'marker': {'color': colors},
+             'yaxis': 'y2'},
+            {'type': 'scatter', 'mode': 'lines', 'name': 'MACD', 'x': x, 'y': _values(indicators['macd']),
+             'line': {'color': '#2E86AB', 'width': 2}, 'yaxis': 'y2'},
+            {'type': 'scatter', 'mode': 'lines', 'name': 'Sinal', 'x': x, 'y': _values(indicators['macd_signal']),
+             'line': {'color': '#F18F01', 'width': 2, 'dash': 'dash'}, 'yaxis': 'y2'},
+        ],
+        'layout': {
+            'title': {'text': f"{symbol} - Momentum"},
+            'yaxis': {'title': {'text': 'RSI'}, 'domain': [0.55, 1], 'range': [0, 100]},
+            'yaxis2': {'title': {'text': 'MACD'}, 'domain': [0, 0.45]},
+            'shapes': [dict(band, y0=0, y1=30, fillcolor='lightgreen', opacity=0.3),
+                       dict(band, y0=70, y1=100, fillcolor='lightcoral', opacity=0.3)],
+            'height': 500,
+            'showlegend': True
+        }
+    }
+
+
+# Tipo de gráfico -> construtor do figure (JSON do Plotly, sem depender do plotly no backend)
+CHART_BUILDERS = {
+    'price': price_figure,
+    'momentum': momentum_figure,
+}
+
+
+def build_chart(series, symbol: str, chart: str, bars: int = CHART_BARS, interval: str = '1d',
+                currency: str = 'USD') -> Dict:
+    """Payload pronto para st.plotly_chart a partir das barras em memória (bloqueante)"""
+    data = series.tail(bars + CHART_WARMUP_BARS).to_frame()
+    figure = CHART_BUILDERS[chart](data, symbol, currency, interval)
+    # Só a janela pedida vai na resposta; o aquecimento ficou nos cálculos
+    for trace in figure['data']:
+        for field in ('x', 'y'):
+            trace[field] = trace[field][-bars:]
+        if isinstance(trace.get('marker', {}).get('color'), list):
+            trace['marker']['color'] = trace['marker']['color'][-bars:]
+    return {
+        'symbol': symbol,
+        'chart': chart,
+        'interval': interval,
+        'bars': min(bars, len(series)),
+        'last_bar': series.last_timestamp.isoformat(),
+        'figure': figure,
+        'success': True
+    }
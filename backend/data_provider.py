@@ -0,0 +1,204 @@
+import logging
+import os
+import re
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+logger = logging.getLogger(__name__)
+
+# yahoo (padrão) ou local: dados sintéticos determinísticos, sem rede (replay, benchmarks)
+DATA_PROVIDER = os.getenv('DATA_PROVIDER', 'yahoo').lower()
+# Último dia dos dados locais (AAAA-MM-DD); vazio = hoje
+LOCAL_PROVIDER_END = os.getenv('LOCAL_PROVIDER_END', '')
+
+# Tamanho da janela (dias) por requisição ao provedor, por intervalo.
+# O Yahoo limita o histórico intraday por chamada.
+CHUNK_DAYS = {
+    '1m': 7, '2m': 30, '5m': 30, '15m': 30, '30m': 30, '60m': 90, '90m': 30, '1h': 90,
+    '1d': 365, '5d': 365 * 5, '1wk': 365 * 5, '1mo': 365 * 10, '3mo': 365 * 10
+}
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class HistoryFetchError(Exception):
+    """Falha ao buscar uma janela do histórico: quem consome não deve seguir com um buraco nos dados"""
+
+
+class BaseProvider:
+    """Interface comum dos provedores de dados"""
+
+    def history(self, symbol: str, period: Optional[str] = None, start=None, end=None,
+                interval: str = '1d') -> pd.DataFrame:
+        raise NotImplementedError
+
+    def info(self, symbol: str) -> Dict:
+        raise NotImplementedError
+
+    def iter_history(self, symbol: str, start: datetime, end: Optional[datetime] = None,
+                     interval: str = '1d') -> Iterator[pd.DataFrame]:
+        """Histórico em janelas consecutivas, sem montar o período inteiro em memória"""
+        end = end or datetime.now()
+        step = timedelta(days=CHUNK_DAYS.get(interval, 365))
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + step, end)
+            try:
+                chunk = self.history(symbol, start=window_start, end=window_end, interval=interval)
+            except Exception as e:
+                logger.warning(f"Erro ao buscar {symbol} ({window_start:%Y-%m-%d}): {e}")
+                raise HistoryFetchError(
+                    f"Falha ao buscar {symbol} de {window_start:%Y-%m-%d} a {window_end:%Y-%m-%d}: {e}"
+                ) from e
+            if not chunk.empty:
+                yield chunk[OHLCV_COLUMNS]
+            window_start = window_end
+
+
+class YahooProvider(BaseProvider):
+    """Acesso ao Yahoo Finance (único ponto que fala com o yfinance)"""
+
+    def history(self, symbol: str, period: Optional[str] = None, start=None, end=None,
+                interval: str = '1d') -> pd.DataFrame:
+        stock = yf.Ticker(symbol)
+        if period is not None:
+            return stock.history(period=period, interval=interval)
+        return stock.history(start=start, end=end, interval=interval)
+
+    def info(self, symbol: str) -> Dict:
+        return yf.Ticker(symbol).info or {}
+
+
+# ----- provedor local (sintético) -----
+LOCAL_HISTORY_START = '2015-01-02'
+# Intraday: só os últimos dias, dentro do pregão (UTC)
+LOCAL_INTRADAY_DAYS = 30
+LOCAL_RESAMPLE = {'1wk': 'W-FRI', '1mo': 'MS', '3mo': 'QS'}
+LOCAL_SECTORS = ['Technology', 'Financial Services', 'Energy', 'Basic Materials', 'Healthcare',
+                 'Consumer Cyclical', 'Industrials', 'Utilities', 'Communication Services']
+# Câmbio sintético em níveis plausíveis (conversões de moeda no modo local)
+LOCAL_FX_BASES = {'USDBRL=X': 3.2, 'EURUSD=X': 1.1}
+PERIOD_PATTERN = re.compile(r'^(\d+)(d|wk|mo|y)$')
+
+
+def _seed(symbol: str) -> int:
+    return zlib.crc32(symbol.upper().encode())
+
+
+def _timezone(symbol: str) -> str:
+    return 'America/Sao_Paulo' if symbol.upper().endswith('.SA') else 'America/New_York'
+
+
+def _bars(rng: np.random.Generator, base: float, n: int, volatility: float = 0.018) -> Dict[str, np.ndarray]:
+    close = base * np.exp(np.cumsum(rng.normal(0.0003 * volatility / 0.018, volatility, n)))
+    opens = np.concatenate(([base], close[:-1])) * (1 + rng.normal(0, 0.004, n))
+    spread = np.abs(rng.normal(0, 0.008, n))
+    return {
+        'Open': opens,
+        'High': np.maximum(opens, close) * (1 + spread),
+        'Low': np.minimum(opens, close) * (1 - spread),
+        'Close': close,
+        'Volume': np.round(rng.lognormal(14, 0.6, n)),
+    }
+
+
+def _as_tz(value, tz) -> pd.Timestamp:
+    moment = pd.Timestamp(value)
+    return moment.tz_convert(tz) if moment.tzinfo else moment.tz_localize(tz)
+
+
+@lru_cache(maxsize=512)
+def _synthetic_frame(symbol: str, interval: str, end: str) -> pd.DataFrame:
+    """Série inteira do símbolo até `end`; o prefixo não muda quando `end` avança"""
+    seed = _seed(symbol)
+    rng = np.random.default_rng(seed)
+    base = LOCAL_FX_BASES.get(symbol, 10 + seed % 490)
+    volatility = 0.006 if symbol.endswith('=X') else 0.018
+    tz = _timezone(symbol)
+    if interval in CHUNK_DAYS and interval[-1] in 'mh':
+        step = interval.replace('m', 'min') if interval.endswith('m') else interval
+        stop = pd.Timestamp(end, tz='UTC') + pd.Timedelta(days=1)
+        index = pd.date_range(stop - pd.Timedelta(days=LOCAL_INTRADAY_DAYS), stop, freq=step, inclusive='left')
+        index = index[(index.weekday < 5) & (index.hour >= 13) & (index.hour < 20)].tz_convert(tz)
+        frame = pd.DataFrame(_bars(rng, base, len(index), volatility), index=index)
+        frame['Volume'] = np.round(frame['Volume'] / 50)
+    else:
+        index = pd.bdate_range(LOCAL_HISTORY_START, end, tz=tz)
+        frame = pd.DataFrame(_bars(rng, base, len(index), volatility), index=index)
+        if interval in LOCAL_RESAMPLE:
+            frame = frame.resample(LOCAL_RESAMPLE[interval]).agg(
+                {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+            ).dropna()
+        elif interval == '5d':
+            frame = frame.iloc[::5]
+    frame.index.name = 'Date'
+    frame['Dividends'] = 0.0
+    frame['Stock Splits'] = 0.0
+    return frame
+
+
+def local_cache_info() -> Dict:
+    return _synthetic_frame.cache_info()._asdict()
+
+
+class LocalProvider(BaseProvider):
+    """Dados sintéticos determinísticos (mesmo símbolo e dia -> mesmas barras), sem rede"""
+
+    def __init__(self, end: str = LOCAL_PROVIDER_END):
+        self.end = end
+
+    def _end(self) -> str:
+        return self.end or datetime.now().strftime('%Y-%m-%d')
+
+    def history(self, symbol: str, period: Optional[str] = None, start=None, end=None,
+                interval: str = '1d') -> pd.DataFrame:
+        frame = _synthetic_frame(symbol.upper(), interval, self._end())
+        if period is not None:
+            found = PERIOD_PATTERN.match(period)
+            if found:
+                amount, unit = int(found.group(1)), found.group(2)
+                offset = {'d': pd.DateOffset(days=amount), 'wk': pd.DateOffset(weeks=amount),
+                          'mo': pd.DateOffset(months=amount), 'y': pd.DateOffset(years=amount)}[unit]
+                frame = frame[frame.index > frame.index[-1] - offset] if len(frame) else frame
+            elif period == 'ytd' and len(frame):
+                frame = frame[frame.index.year == frame.index[-1].year]
+            return frame.copy()
+        if start is not None:
+            frame = frame[frame.index >= _as_tz(start, frame.index.tz)]
+        if end is not None:
+            frame = frame[frame.index < _as_tz(end, frame.index.tz)]
+        return frame.copy()
+
+    def info(self, symbol: str) -> Dict:
+        symbol = symbol.upper()
+        rng = np.random.default_rng(_seed(symbol) + 1)
+        close = self.history(symbol, period='1y')['Close']
+        return {
+            'symbol': symbol,
+            'longName': f'{symbol} (local)',
+            'shortName': symbol,
+            'sector': LOCAL_SECTORS[_seed(symbol) % len(LOCAL_SECTORS)],
+            'currency': 'BRL' if symbol.endswith('.SA') else 'USD',
+            'marketCap': int(rng.uniform(1e9, 5e11)),
+            'totalRevenue': int(rng.uniform(1e8, 1e11)),
+            'profitMargins': round(float(rng.normal(0.12, 0.08)), 4),
+            'revenueGrowth': round(float(rng.normal(0.06, 0.1)), 4),
+            'earningsGrowth': round(float(rng.normal(0.05, 0.15)), 4),
+            'returnOnEquity': round(float(rng.normal(0.15, 0.08)), 4),
+            'debtToEquity': round(float(rng.uniform(10, 200)), 2),
+            'trailingPE': round(float(rng.uniform(5, 40)), 2),
+            'priceToBook': round(float(rng.uniform(0.5, 8)), 2),
+            'dividendYield': round(float(rng.uniform(0, 0.08)), 4),
+            'beta': round(float(rng.uniform(0.5, 1.8)), 2),
+            'fiftyTwoWeekHigh': round(float(close.max()), 2) if len(close) else None,
+            'fiftyTwoWeekLow': round(float(close.min()), 2) if len(close) else None,
+        }
+
+
+provider = LocalProvider() if DATA_PROVIDER == 'local' else YahooProvider()
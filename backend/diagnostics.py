@@ -0,0 +1,182 @@
+import asyncio
+import gc
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Token dos endpoints /api/admin/diagnostics (header X-Admin-Token); vazio = desabilitados
+DIAGNOSTICS_TOKEN = os.getenv('DIAGNOSTICS_TOKEN', '')
+# Ligar o tracemalloc já no boot (custa CPU e memória; por padrão só no primeiro snapshot)
+DIAGNOSTICS_TRACEMALLOC = os.getenv('DIAGNOSTICS_TRACEMALLOC', 'false').lower() in ('1', 'true', 'yes')
+TRACEMALLOC_FRAMES = int(os.getenv('TRACEMALLOC_FRAMES', '10'))
+# Watchdog: avisa quando o RSS cresce mais que isso desde o último aviso (ou do boot)
+RSS_WATCHDOG_INTERVAL = float(os.getenv('RSS_WATCHDOG_INTERVAL', '60'))
+RSS_GROWTH_WARN_MB = float(os.getenv('RSS_GROWTH_WARN_MB', '200'))
+
+# Frames do próprio tracemalloc e do import não interessam na busca por vazamentos
+TRACE_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def rss_bytes() -> int:
+    """RSS atual do processo (/proc no Linux; pico via getrusage como alternativa)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss é em KB no Linux e em bytes no macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if peak > 1 << 32 else peak * 1024
+
+
+def _mb(value: float) -> float:
+    return round(value / (1024 * 1024), 2)
+
+
+def _site(stat) -> str:
+    frame = stat.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+class Diagnostics:
+    """Memória do processo: tracemalloc, contagem de objetos, tamanhos de caches e conexões"""
+
+    def __init__(self, growth_warn_mb: float = RSS_GROWTH_WARN_MB, interval: float = RSS_WATCHDOG_INTERVAL):
+        self.growth_warn = growth_warn_mb * 1024 * 1024
+        self.interval = interval
+        self.started_rss = rss_bytes()
+        self.watermark = self.started_rss
+        self.rss_history: List[tuple] = []
+        self.warnings = 0
+        self._caches: Dict[str, Callable[[], object]] = {}
+        self._connections: Dict[str, Callable[[], object]] = {}
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.last: Optional[tracemalloc.Snapshot] = None
+        if DIAGNOSTICS_TRACEMALLOC:
+            self.start_tracing()
+
+    # ----- registro dos subsistemas -----
+    def register_cache(self, name: str, size: Callable[[], object]):
+        """size() devolve o tamanho atual (número ou dict) do cache do subsistema"""
+        self._caches[name] = size
+
+    def register_connections(self, name: str, describe: Callable[[], object]):
+        self._connections[name] = describe
+
+    @staticmethod
+    def _collect(sources: Dict[str, Callable]) -> Dict:
+        result = {}
+        for name, source in sources.items():
+            try:
+                result[name] = source()
+            except Exception as e:
+                result[name] = {'error': str(e)}
+        return result
+
+    def caches(self) -> Dict:
+        return self._collect(self._caches)
+
+    def connections(self) -> Dict:
+        return self._collect(self._connections)
+
+    # ----- objetos e gc -----
+    def object_counts(self, top: int = 30) -> Dict:
+        counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+        return {
+            'tracked_objects': sum(counts.values()),
+            'gc_counts': gc.get_count(),
+            'gc_thresholds': gc.get_threshold(),
+            'gc_collections': [stats['collections'] for stats in gc.get_stats()],
+            'uncollectable': len(gc.garbage),
+            'top_types': [{'type': name, 'count': count} for name, count in counts.most_common(top)]
+        }
+
+    # ----- tracemalloc -----
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self.baseline = self.last = None
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+
+    def snapshot(self, top: int = 20) -> Dict:
+        """Liga o tracemalloc se preciso e guarda um snapshot (o primeiro vira a linha de base)"""
+        self.start_tracing()
+        snapshot = self._take()
+        if self.baseline is None:
+            self.baseline = snapshot
+        self.last = snapshot
+        stats = snapshot.statistics('lineno')
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'traced_mb': _mb(current),
+            'traced_peak_mb': _mb(peak),
+            'top_sites': [{'site': _site(s), 'size_kb': round(s.size / 1024, 1), 'count': s.count}
+                          for s in stats[:top]]
+        }
+
+    def diff(self, top: int = 20, against: str = 'last') -> Dict:
+        """Novo snapshot comparado ao último (ou à linha de base): sites que mais cresceram"""
+        reference = self.baseline if against == 'baseline' else self.last
+        if reference is None or not tracemalloc.is_tracing():
+            return {'error': 'Nenhum snapshot anterior; faça um snapshot primeiro', 'success': False}
+        snapshot = self._take()
+        stats = snapshot.compare_to(reference, 'lineno')
+        self.last = snapshot
+        return {
+            'against': against,
+            'total_growth_kb': round(sum(s.size_diff for s in stats) / 1024, 1),
+            'top_growth': [{'site': _site(s), 'size_diff_kb': round(s.size_diff / 1024, 1),
+                            'count_diff': s.count_diff, 'size_kb': round(s.size / 1024, 1),
+                            'traceback': s.traceback.format()[-6:]}
+                           for s in stats[:top]]
+        }
+
+    # ----- RSS -----
+    def check_rss(self, now: Optional[float] = None) -> int:
+        rss = rss_bytes()
+        self.rss_history.append((now or time.time(), rss))
+        del self.rss_history[:-120]
+        if rss - self.watermark > self.growth_warn:
+            self.warnings += 1
+            logger.warning(f"RSS cresceu {_mb(rss - self.watermark)} MB desde {_mb(self.watermark)} MB "
+                           f"(boot: {_mb(self.started_rss)} MB); veja /api/admin/diagnostics")
+            # Próximo aviso só após mais um degrau de crescimento
+            self.watermark = rss
+        return rss
+
+    async def run_watchdog(self):
+        while True:
+            try:
+                self.check_rss()
+            except Exception as e:
+                logger.error(f"Erro no watchdog de memória: {e}")
+            await asyncio.sleep(self.interval)
+
+    def summary(self) -> Dict:
+        rss = rss_bytes()
+        return {
+            'rss_mb': _mb(rss),
+            'rss_at_start_mb': _mb(self.started_rss),
+            'rss_growth_mb': _mb(rss - self.started_rss),
+            'rss_history_mb': [(round(t), _mb(v)) for t, v in self.rss_history[-30:]],
+            'watchdog_warnings': self.warnings,
+            'gc_counts': gc.get_count(),
+            'tracemalloc': tracemalloc.is_tracing(),
+            'caches': self.caches(),
+            'connections': self.connections()
+        }
@@ -0,0 +1,103 @@
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from data_provider import OHLCV_COLUMNS, HistoryFetchError, provider
+from streaming_indicators import StreamingIndicators
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet é opcional
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class _DrainableSink(io.RawIOBase):
+    """Destino de escrita do Parquet cujo conteúdo é drenado a cada row group"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _prepare(chunk: pd.DataFrame, indicators: Optional[StreamingIndicators]) -> pd.DataFrame:
+    frame = chunk[OHLCV_COLUMNS]
+    if indicators is not None:
+        frame = frame.join(indicators.update(frame))
+    frame = frame.reset_index()
+    frame.columns = ['timestamp'] + list(frame.columns[1:])
+    return frame
+
+
+def iter_export(symbol: str, start: datetime, end: Optional[datetime] = None, interval: str = '1d',
+                indicators: Optional[str] = None, fmt: str = 'csv', source=provider) -> Iterator[bytes]:
+    """OHLCV + indicadores em blocos; memória constante independente do período
+
+    Se uma janela falha, o arquivo termina com a marca de erro (CSV/NDJSON) e a exceção
+    interrompe a resposta: nunca sai um arquivo aparentemente completo com um buraco.
+    """
+    try:
+        yield from _export_chunks(symbol, start, end, interval, indicators, fmt, source)
+    except HistoryFetchError as e:
+        if fmt == 'ndjson':
+            yield (json.dumps({'error': str(e)}) + '\n').encode()
+        elif fmt == 'csv':
+            yield f'# erro: {e}\n'.encode()
+        raise
+
+
+def _export_chunks(symbol: str, start: datetime, end: Optional[datetime], interval: str,
+                   indicators: Optional[str], fmt: str, source) -> Iterator[bytes]:
+    state = StreamingIndicators(indicators) if indicators else None
+    chunks = source.iter_history(symbol, start, end, interval)
+
+    if fmt == 'parquet':
+        sink, writer = _DrainableSink(), None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(_prepare(chunk, state), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            # Cada bloco vira um row group
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is not None:
+            writer.close()
+            yield sink.drain()
+        return
+
+    header = True
+    for chunk in chunks:
+        frame = _prepare(chunk, state)
+        if fmt == 'ndjson':
+            frame['timestamp'] = frame['timestamp'].map(lambda t: t.isoformat())
+            frame = frame.astype(object).where(frame.notna(), None)
+            yield ''.join(json.dumps(row) + '\n' for row in frame.to_dict('records')).encode()
+        else:
+            yield frame.to_csv(index=False, header=header).encode()
+            header = False
@@ -0,0 +1,390 @@
+import asyncio
+import math
+import os
+import sys
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from indicator_pipeline import compile_plan
+from result_cache import bar_version, make_key
+
+logger = logging.getLogger(__name__)
+
+FORECAST_MODEL_DIR = os.getenv(
+    'FORECAST_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'models')
+)
+# Horizonte da previsão (pregões) e regularização da regressão ridge
+FORECAST_HORIZON = int(os.getenv('FORECAST_HORIZON', '5'))
+FORECAST_RIDGE_ALPHA = float(os.getenv('FORECAST_RIDGE_ALPHA', '10'))
+FORECAST_MIN_SAMPLES = int(os.getenv('FORECAST_MIN_SAMPLES', '60'))
+# Modelos mantidos em memória (LRU) e processos de treino
+FORECAST_MODEL_CACHE = int(os.getenv('FORECAST_MODEL_CACHE', '256'))
+FORECAST_WORKERS = int(os.getenv('FORECAST_WORKERS', '2'))
+FORECAST_RETRAIN_INTERVAL = float(os.getenv('FORECAST_RETRAIN_INTERVAL', '60'))
+# Janela de agrupamento das previsões em lote (segundos) e tamanho máximo do lote
+FORECAST_BATCH_WINDOW = float(os.getenv('FORECAST_BATCH_WINDOW', '0.005'))
+FORECAST_MAX_BATCH = int(os.getenv('FORECAST_MAX_BATCH', '64'))
+# Símbolos aceitos por requisição em /api/predictions?symbols=
+FORECAST_MAX_SYMBOLS = int(os.getenv('FORECAST_MAX_SYMBOLS', '20'))
+# Abaixo dessa probabilidade de acerto da direção a previsão é SIDEWAYS
+SIDEWAYS_CONFIDENCE = 0.55
+
+# Incrementar ao mudar as features: modelos antigos são descartados
+FEATURE_VERSION = 1
+FEATURE_NAMES = ['ret_1', 'ret_2', 'ret_3', 'ret_4', 'ret_5', 'mom_5', 'mom_20',
+                 'vol_20', 'rsi_14', 'dist_sma_20', 'volume_z']
+FEATURE_LABELS = {
+    'ret_1': 'Retorno do último pregão',
+    'ret_2': 'Retorno de 2 pregões atrás',
+    'ret_3': 'Retorno de 3 pregões atrás',
+    'ret_4': 'Retorno de 4 pregões atrás',
+    'ret_5': 'Retorno de 5 pregões atrás',
+    'mom_5': 'Momento de 5 dias',
+    'mom_20': 'Momento de 20 dias',
+    'vol_20': 'Volatilidade de 20 dias',
+    'rsi_14': 'RSI (14)',
+    'dist_sma_20': 'Distância da SMA 20',
+    'volume_z': 'Volume relativo',
+}
+# Barras necessárias para calcular as features da última barra
+FEATURE_WINDOW = 60
+HORIZON_LABELS = {1: '1D', 5: '1W', 21: '1M'}
+
+_FEATURE_PLAN = compile_plan('rsi:14,sma:20')
+
+
+def build_features(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """Matriz barras x features (NaN onde ainda não há histórico suficiente)"""
+    close = pd.Series(np.asarray(close, dtype=np.float64))
+    log_close = np.log(close)
+    ret = log_close.diff()
+    features = {f'ret_{i}': ret.shift(i - 1) for i in range(1, 6)}
+    features['mom_5'] = log_close.diff(5)
+    features['mom_20'] = log_close.diff(20)
+    features['vol_20'] = ret.rolling(20).std()
+    indicators = _FEATURE_PLAN.run(pd.DataFrame({'Close': close}))
+    features['rsi_14'] = indicators['rsi_14'] / 100 - 0.5
+    features['dist_sma_20'] = close / indicators['sma_20'] - 1
+    log_volume = np.log1p(pd.Series(np.asarray(volume, dtype=np.float64)))
+    volume_std = log_volume.rolling(20).std()
+    features['volume_z'] = ((log_volume - log_volume.rolling(20).mean()) / volume_std).where(volume_std > 0, 0.0)
+    return pd.DataFrame(features)[FEATURE_NAMES].to_numpy()
+
+
+def build_targets(close: np.ndarray, horizon: int = FORECAST_HORIZON) -> np.ndarray:
+    """Log-retorno dos próximos horizon pregões; a última barra (ainda em formação) não vira alvo"""
+    close = np.asarray(close, dtype=np.float64)
+    targets = np.full(len(close), np.nan)
+    if len(close) > horizon + 1:
+        targets[:-horizon - 1] = np.log(close[horizon:-1] / close[:-horizon - 1])
+    return targets
+
+
+def empty_state() -> Dict:
+    size = len(FEATURE_NAMES) + 1
+    return {'xtx': np.zeros((size, size)), 'xty': np.zeros(size), 'yy': 0.0, 'n': 0,
+            'trained_until': -1, 'feature_version': FEATURE_VERSION, 'horizon': FORECAST_HORIZON}
+
+
+def train_model(timestamps: np.ndarray, close: np.ndarray, volume: np.ndarray,
+                state: Optional[Dict] = None) -> Dict:
+    """Acumula X'X e X'y das barras ainda não vistas (roda no pool de processos)"""
+    state = dict(state) if state is not None else empty_state()
+    features = build_features(close, volume)
+    targets = build_targets(close, state['horizon'])
+    rows = np.isfinite(features).all(axis=1) & np.isfinite(targets) & (timestamps > state['trained_until'])
+    if rows.any():
+        x = np.hstack((np.ones((rows.sum(), 1)), features[rows]))
+        y = targets[rows]
+        state['xtx'] = state['xtx'] + x.T @ x
+        state['xty'] = state['xty'] + x.T @ y
+        state['yy'] = state['yy'] + float(y @ y)
+        state['n'] = state['n'] + int(rows.sum())
+        state['trained_until'] = int(timestamps[rows][-1])
+    return state
+
+
+class ForecastModel:
+    """Ridge (features padronizadas, intercepto livre) resolvida a partir das estatísticas suficientes"""
+
+    def __init__(self, state: Dict, alpha: float = FORECAST_RIDGE_ALPHA):
+        self.state = state
+        n = max(state['n'], 1)
+        xtx, xty = state['xtx'], state['xty']
+        mean = xtx[0, 1:] / n
+        self.mean = mean
+        variance = np.clip(np.diag(xtx)[1:] / n - mean ** 2, 1e-12, None)
+        penalty = np.diag(np.concatenate(([0.0], alpha * variance)))
+        self.weights = np.linalg.solve(xtx + penalty + 1e-9 * np.eye(len(xty)), xty)
+        sse = state['yy'] - 2 * self.weights @ xty + self.weights @ xtx @ self.weights
+        self.sigma = math.sqrt(max(sse, 0.0) / max(state['n'] - len(xty), 1)) or 1e-6
+
+    @property
+    def samples(self) -> int:
+        return self.state['n']
+
+    @property
+    def trained_until(self) -> Optional[str]:
+        ts = self.state['trained_until']
+        return pd.Timestamp(ts).isoformat() if ts >= 0 else None
+
+    def describe(self, features: np.ndarray, predicted: float) -> Dict:
+        change_percent = math.expm1(predicted) * 100
+        prob_up = 0.5 * (1 + math.erf(predicted / (self.sigma * math.sqrt(2))))
+        confidence = max(prob_up, 1 - prob_up)
+        if confidence < SIDEWAYS_CONFIDENCE:
+            direction = 'SIDEWAYS'
+        else:
+            direction = 'UP' if predicted > 0 else 'DOWN'
+        # Features que mais pesaram na previsão (contribuição em relação à média)
+        contributions = self.weights[1:] * (features - self.mean)
+        top = np.argsort(-np.abs(contributions))[:3]
+        reasoning = [
+            f"{FEATURE_LABELS[FEATURE_NAMES[i]]} {'favorável' if contributions[i] > 0 else 'desfavorável'}"
+            for i in top
+        ]
+        return {
+            'predicted_direction': direction,
+            'confidence_score': round(confidence, 4),
+            'predicted_change_percent': round(change_percent, 2),
+            'probability_up': round(prob_up, 4),
+            'time_horizon': HORIZON_LABELS.get(self.state['horizon'], f"{self.state['horizon']}D"),
+            'reasoning': reasoning,
+            'model': {'type': 'ridge', 'samples': self.samples, 'trained_until': self.trained_until,
+                      'residual_std': round(self.sigma, 6)}
+        }
+
+
+def model_path(symbol: str, model_dir: str = FORECAST_MODEL_DIR) -> str:
+    return os.path.join(model_dir, f"{symbol.upper()}.npz")
+
+
+def save_state(symbol: str, state: Dict, model_dir: str = FORECAST_MODEL_DIR):
+    os.makedirs(model_dir, exist_ok=True)
+    path = model_path(symbol, model_dir)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **{k: np.asarray(v) for k, v in state.items()})
+    os.replace(tmp, path)
+
+
+def load_state(symbol: str, model_dir: str = FORECAST_MODEL_DIR) -> Optional[Dict]:
+    path = model_path(symbol, model_dir)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        state = {k: data[k] for k in data.files}
+    state['yy'] = float(state['yy'])
+    for key in ('n', 'trained_until', 'feature_version', 'horizon'):
+        state[key] = int(state[key])
+    if state['feature_version'] != FEATURE_VERSION or state['horizon'] != FORECAST_HORIZON:
+        return None
+    return state
+
+
+class ForecastService:
+    """Modelos por símbolo: treino incremental em processos, previsões em lote e em cache até a próxima barra"""
+
+    def __init__(self, store, result_cache=None, model_dir: str = FORECAST_MODEL_DIR,
+                 cache_size: int = FORECAST_MODEL_CACHE, workers: int = FORECAST_WORKERS):
+        self.store = store
+        self.result_cache = result_cache
+        self.model_dir = model_dir
+        self.cache_size = cache_size
+        self.workers = workers
+        self.models: OrderedDict = OrderedDict()
+        self.dirty = set()
+        self._training = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_handle = None
+        self.batches = 0
+        self.batched_predictions = 0
+
+    # ----- modelos (LRU em memória, persistidos em disco) -----
+    def get_model(self, symbol: str) -> Optional[ForecastModel]:
+        symbol = symbol.upper()
+        model = self.models.get(symbol)
+        if model is None:
+            state = load_state(symbol, self.model_dir)
+            if state is None or state['n'] < FORECAST_MIN_SAMPLES:
+                return None
+            model = ForecastModel(state)
+            self._remember(symbol, model)
+        else:
+            self.models.move_to_end(symbol)
+        return model
+
+    def _remember(self, symbol: str, model: ForecastModel):
+        self.models[symbol] = model
+        self.models.move_to_end(symbol)
+        while len(self.models) > self.cache_size:
+            self.models.popitem(last=False)
+
+    def on_bars(self, symbol: str, interval: str, bars, new_bars: int):
+        """Assinante do PriceStore: barra nova marca o modelo para re-treino"""
+        if interval == '1d' and new_bars:
+            self.dirty.add(symbol)
+
+    # ----- treino -----
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def train(self, symbol: str):
+        """Treino incremental em processo separado (não bloqueia o event loop)"""
+        symbol = symbol.upper()
+        bars = self.store.get(symbol)
+        if bars is None or symbol in self._training:
+            return
+        self._training.add(symbol)
+        try:
+            current = self.models.get(symbol)
+            state = current.state if current is not None else load_state(symbol, self.model_dir)
+            loop = asyncio.get_running_loop()
+            state = await loop.run_in_executor(
+                self._get_pool(), train_model,
+                bars.timestamps.copy(), bars.close.astype(np.float64), bars.volume.astype(np.float64), state
+            )
+            await asyncio.to_thread(save_state, symbol, state, self.model_dir)
+            if state['n'] >= FORECAST_MIN_SAMPLES:
+                self._remember(symbol, ForecastModel(state))
+        except Exception as e:
+            logger.warning(f"Erro ao treinar modelo de {symbol}: {e}")
+        finally:
+            self._training.discard(symbol)
+
+    async def run(self, tick: float = FORECAST_RETRAIN_INTERVAL):
+        """Re-treina em lote os símbolos com barras novas"""
+        while True:
+            try:
+                symbols, self.dirty = list(self.dirty), set()
+                if symbols:
+                    await asyncio.gather(*(self.train(s) for s in symbols))
+            except Exception as e:
+                logger.error(f"Erro no job de previsões: {e}")
+            await asyncio.sleep(tick)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ----- inferência em lote -----
+    async def predict(self, symbol: str) -> Dict:
+        """Previsão de um símbolo; requisições próximas são resolvidas no mesmo lote"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(symbol.upper(), []).append(future)
+        if sum(len(f) for f in self._pending.values()) >= FORECAST_MAX_BATCH:
+            self._schedule_flush(0)
+        elif self._flush_handle is None:
+            self._schedule_flush(FORECAST_BATCH_WINDOW)
+        return await future
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(delay, lambda: asyncio.ensure_future(self._flush()))
+
+    def _cache_key(self, symbol: str, bars, model: ForecastModel) -> str:
+        version = bar_version(bars.last_timestamp, bars.close[-1], bars.volume[-1])
+        return make_key('forecast', symbol, '1d', version,
+                        {'features': FEATURE_VERSION, 'samples': model.samples, 'horizon': FORECAST_HORIZON})
+
+    async def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        results: Dict[str, Dict] = {}
+        batch = []
+        for symbol in pending:
+            bars = self.store.get(symbol)
+            model = self.get_model(symbol) if bars is not None else None
+            if bars is None or model is None:
+                if bars is not None:
+                    self.dirty.add(symbol)
+                results[symbol] = {'symbol': symbol, 'success': False, 'pending': True,
+                                   'error': f'Modelo de {symbol} em treinamento, tente novamente em instantes'}
+                continue
+            key = self._cache_key(symbol, bars, model)
+            cached = await self.result_cache.get(key) if self.result_cache is not None else None
+            if cached is not None:
+                results[symbol] = cached
+            else:
+                batch.append((symbol, bars, model, key))
+
+        if batch:
+            try:
+                computed = await asyncio.to_thread(self._predict_batch, batch)
+                for (symbol, _, _, key), result in zip(batch, computed):
+                    results[symbol] = result
+                    if self.result_cache is not None:
+                        await self.result_cache.set(key, result)
+            except Exception as e:
+                logger.warning(f"Erro na inferência em lote: {e}")
+                for symbol, *_ in batch:
+                    results[symbol] = {'symbol': symbol, 'error': f'Erro na previsão: {e}', 'success': False}
+
+        for symbol, futures in pending.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results[symbol])
+
+    def _predict_batch(self, batch) -> List[Dict]:
+        """Features da última barra de cada símbolo e um único produto matricial para o lote"""
+        rows = []
+        for _, bars, _, _ in batch:
+            tail = bars.tail(FEATURE_WINDOW)
+            rows.append(build_features(tail.close, tail.volume)[-1])
+        features = np.vstack(rows)
+        weights = np.vstack([model.weights for _, _, model, _ in batch])
+        design = np.hstack((np.ones((len(batch), 1)), np.nan_to_num(features)))
+        predicted = np.einsum('ij,ij->i', design, weights)
+        self.batches += 1
+        self.batched_predictions += len(batch)
+
+        results = []
+        for (symbol, bars, model, _), row, value in zip(batch, features, predicted):
+            result = {'symbol': symbol, 'as_of': bars.last_timestamp.isoformat()}
+            result.update(model.describe(np.nan_to_num(row), float(value)))
+            result['updated_at'] = datetime.now().isoformat()
+            result['success'] = True
+            results.append(result)
+        return results
+
+    def metrics(self) -> Dict:
+        return {
+            'models_in_memory': len(self.models),
+            'model_cache_size': self.cache_size,
+            'training': len(self._training),
+            'dirty': len(self.dirty),
+            'batches': self.batches,
+            'avg_batch_size': round(self.batched_predictions / self.batches, 2) if self.batches else None
+        }
+
+
+if __name__ == "__main__":
+    # Treino offline: python forecasting.py ibovespa demo
+    from data_provider import provider
+    from series import CompactSeries
+    from universes import get_universe
+
+    logging.basicConfig(level=logging.INFO)
+    for name in sys.argv[1:] or ['demo']:
+        trained = 0
+        for symbol in get_universe(name):
+            try:
+                bars = CompactSeries.from_frame(provider.history(symbol, period='5y'))
+                state = train_model(bars.timestamps, bars.close.astype(np.float64),
+                                    bars.volume.astype(np.float64), load_state(symbol))
+                save_state(symbol, state)
+                trained += 1
+            except Exception as e:
+                logger.warning(f"Erro ao treinar {symbol}: {e}")
+        print(f"{name}: {trained} modelos treinados")
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import sys
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import (JSON, Column, DateTime, Integer, MetaData, String, Table,
+                        create_engine, insert, select)
+
+from data_provider import provider
+from universes import get_universe
+
+logger = logging.getLogger(__name__)
+
+FUNDAMENTALS_DB_URL = os.getenv(
+    'FUNDAMENTALS_DB_URL',
+    'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fundamentals.db')
+)
+# Fundamentos mudam no máximo diariamente
+FUNDAMENTALS_MAX_AGE = float(os.getenv('FUNDAMENTALS_MAX_AGE', str(24 * 3600)))
+FUNDAMENTALS_UNIVERSES = [u for u in os.getenv('FUNDAMENTALS_UNIVERSES', 'ibovespa,demo').split(',') if u]
+FUNDAMENTALS_WORKERS = int(os.getenv('FUNDAMENTALS_WORKERS', '4'))
+
+# Campos guardados de Ticker.info (preços ficam no snapshot, não aqui)
+FUNDAMENTAL_FIELDS = [
+    'longName', 'shortName', 'sector', 'industry', 'country', 'currency', 'exchange',
+    'marketCap', 'enterpriseValue', 'totalRevenue', 'profitMargins', 'revenueGrowth',
+    'earningsGrowth', 'returnOnEquity', 'debtToEquity', 'trailingPE', 'forwardPE',
+    'priceToBook', 'dividendYield', 'beta', 'fiftyTwoWeekHigh', 'fiftyTwoWeekLow'
+]
+
+metadata = MetaData()
+
+fundamentals_table = Table(
+    'fundamentals', metadata,
+    Column('symbol', String(32), primary_key=True),
+    Column('data', JSON, nullable=False),
+    Column('fetched_at', DateTime, nullable=False)
+)
+
+changes_table = Table(
+    'fundamental_changes', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('symbol', String(32), index=True, nullable=False),
+    Column('field', String(64), nullable=False),
+    Column('old_value', JSON),
+    Column('new_value', JSON),
+    Column('changed_at', DateTime, nullable=False)
+)
+
+
+def diff_fields(old: Dict, new: Dict) -> List[Dict]:
+    """Compara campo a campo e retorna as alterações"""
+    changes = []
+    for field in FUNDAMENTAL_FIELDS:
+        if old.get(field) != new.get(field):
+            changes.append({'field': field, 'old_value': old.get(field), 'new_value': new.get(field)})
+    return changes
+
+
+class FundamentalsStore:
+    """Fundamentos (Ticker.info) persistidos localmente em SQLite"""
+
+    def __init__(self, db_url: str = FUNDAMENTALS_DB_URL, rate_limiter=None):
+        if db_url.startswith('sqlite:///'):
+            os.makedirs(os.path.dirname(db_url[len('sqlite:///'):]) or '.', exist_ok=True)
+        self.engine = create_engine(db_url, connect_args={'check_same_thread': False}
+                                    if db_url.startswith('sqlite') else {})
+        metadata.create_all(self.engine)
+        self.rate_limiter = rate_limiter
+        self.pending = set()
+        self._cache: Dict[str, Dict] = {}
+        self._fetched_at: Dict[str, datetime] = {}
+        self._load()
+
+    def _load(self):
+        with self.engine.connect() as conn:
+            for row in conn.execute(select(fundamentals_table)):
+                self._cache[row.symbol] = row.data
+                self._fetched_at[row.symbol] = row.fetched_at
+
+    # ----- leitura (memória, sem rede) -----
+    def get(self, symbol: str) -> Optional[Dict]:
+        return self._cache.get(symbol.upper())
+
+    def fetched_at(self, symbol: str) -> Optional[datetime]:
+        return self._fetched_at.get(symbol.upper())
+
+    def symbols(self) -> List[str]:
+        return list(self._cache)
+
+    def request(self, symbol: str):
+        """Agenda a busca de um símbolo ainda sem fundamentos"""
+        symbol = symbol.upper()
+        if symbol not in self._cache:
+            self.pending.add(symbol)
+
+    def is_stale(self, symbol: str, max_age: float = FUNDAMENTALS_MAX_AGE) -> bool:
+        fetched = self._fetched_at.get(symbol)
+        return fetched is None or (datetime.now() - fetched).total_seconds() >= max_age
+
+    def changes(self, symbol: str, limit: int = 50) -> List[Dict]:
+        """Histórico de alterações de um símbolo (mais recentes primeiro)"""
+        query = (select(changes_table).where(changes_table.c.symbol == symbol.upper())
+                 .order_by(changes_table.c.id.desc()).limit(limit))
+        with self.engine.connect() as conn:
+            return [
+                {'field': r.field, 'old_value': r.old_value, 'new_value': r.new_value,
+                 'changed_at': r.changed_at.isoformat()}
+                for r in conn.execute(query)
+            ]
+
+    # ----- atualização -----
+    def fetch_info(self, symbol: str) -> Dict:
+        info = provider.info(symbol)
+        return {field: info.get(field) for field in FUNDAMENTAL_FIELDS}
+
+    def refresh(self, symbol: str) -> List[Dict]:
+        """Busca fundamentos, grava e retorna os campos alterados"""
+        symbol = symbol.upper()
+        data = self.fetch_info(symbol)
+        now = datetime.now()
+        old = self._cache.get(symbol)
+        changes = diff_fields(old, data) if old is not None else []
+
+        with self.engine.begin() as conn:
+            if old is None:
+                conn.execute(insert(fundamentals_table).values(symbol=symbol, data=data, fetched_at=now))
+            else:
+                conn.execute(fundamentals_table.update()
+                             .where(fundamentals_table.c.symbol == symbol)
+                             .values(data=data, fetched_at=now))
+            if changes:
+                conn.execute(insert(changes_table), [dict(c, symbol=symbol, changed_at=now) for c in changes])
+
+        self._cache[symbol] = data
+        self._fetched_at[symbol] = now
+        self.pending.discard(symbol)
+        if changes:
+            logger.info(f"{symbol}: {len(changes)} campos alterados ({', '.join(c['field'] for c in changes)})")
+        return changes
+
+    def bulk_refresh(self, symbols: List[str], max_workers: int = FUNDAMENTALS_WORKERS) -> Dict[str, int]:
+        """Atualiza vários símbolos em paralelo; retorna nº de alterações por símbolo (-1 = erro)"""
+        def safe_refresh(symbol):
+            try:
+                return len(self.refresh(symbol))
+            except Exception as e:
+                logger.warning(f"Erro ao atualizar fundamentos de {symbol}: {e}")
+                return -1
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(symbols, executor.map(safe_refresh, symbols)))
+
+    async def refresh_async(self, symbol: str):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        try:
+            await asyncio.to_thread(self.refresh, symbol)
+        except Exception as e:
+            self.pending.discard(symbol)
+            logger.warning(f"Erro ao atualizar fundamentos de {symbol}: {e}")
+
+    def stale_symbols(self, universes: List[str]) -> List[str]:
+        symbols = list(self._cache)
+        for universe in universes:
+            symbols.extend(get_universe(universe))
+        return [s for s in dict.fromkeys(symbols) if self.is_stale(s)]
+
+    async def run(self, universes: Optional[List[str]] = None, tick: float = 5.0):
+        """Job de atualização: pedidos pendentes logo, demais uma vez por dia"""
+        universes = FUNDAMENTALS_UNIVERSES if universes is None else universes
+        last_sweep = 0.0
+        while True:
+            try:
+                for symbol in list(self.pending):
+                    await self.refresh_async(symbol)
+                if time.time() - last_sweep >= tick * 60:
+                    for symbol in self.stale_symbols(universes):
+                        await self.refresh_async(symbol)
+                    last_sweep = time.time()
+            except Exception as e:
+                logger.error(f"Erro no job de fundamentos: {e}")
+            await asyncio.sleep(tick)
+
+
+if __name__ == "__main__":
+    # Atualização em lote: python fundamentals.py ibovespa demo
+    logging.basicConfig(level=logging.INFO)
+    store = FundamentalsStore()
+    for name in sys.argv[1:] or FUNDAMENTALS_UNIVERSES:
+        result = store.bulk_refresh(get_universe(name))
+        print(f"{name}: {sum(1 for n in result.values() if n >= 0)}/{len(result)} atualizados")
@@ -0,0 +1,154 @@
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Moeda de exibição padrão das visões multi-mercado
+FX_BASE_CURRENCY = os.getenv('FX_BASE_CURRENCY', 'USD').upper()
+# Pares cotados no Yahoo: (base, cotada) -> símbolo; o close é quanto 1 base vale na cotada
+FX_PAIRS = {('USD', 'BRL'): 'USDBRL=X', ('EUR', 'USD'): 'EURUSD=X'}
+B3_INDICES = {'^BVSP', '^IBX50', '^IFIX'}
+# Visões convertidas guardadas (moeda, campo, janela, intervalo)
+FX_CACHE_SIZE = int(os.getenv('FX_CACHE_SIZE', '32'))
+
+
+def currency_of(symbol: str) -> str:
+    """Moeda de cotação pelo sufixo do ticker (B3 e cripto em BRL; o resto em USD)"""
+    symbol = symbol.upper()
+    if symbol.endswith('.SA') or symbol.endswith('-BRL') or symbol in B3_INDICES:
+        return 'BRL'
+    return 'USD'
+
+
+def asof_positions(source: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Índice da última observação <= cada alvo (-1 se não há); ambos int64 ordenados"""
+    return np.searchsorted(source, targets, side='right') - 1
+
+
+class FXService:
+    """Séries de câmbio no PriceStore e conversão vetorizada de matrizes (datas x símbolos)"""
+
+    def __init__(self, store, touch=None, pairs: Dict[Tuple[str, str], str] = FX_PAIRS,
+                 cache_size: int = FX_CACHE_SIZE):
+        self.store = store
+        # touch(symbol) mantém o par em atualização pelo agendador de snapshots
+        self.touch = touch
+        self.pairs = pairs
+        self.cache_size = cache_size
+        # Versão por intervalo: barras intraday não invalidam as visões diárias
+        self.versions: Dict[str, int] = {}
+        self._cache: Dict[Tuple, Tuple[int, pd.DataFrame]] = {}
+        self.hits = 0
+        self.misses = 0
+        # Os pares ficam no mesmo store, mas fora das visões e assinantes de ações
+        store.mark_auxiliary(self.pair_symbols())
+        store.subscribe(self.on_bars, auxiliary=True)
+        store.subscribe_removals(self.forget)
+
+    def on_bars(self, symbol: str, interval: str, bars, new_bars: int):
+        """Barra nova invalida as visões convertidas do intervalo"""
+        self.versions[interval] = self.versions.get(interval, 0) + 1
+
+    def forget(self, symbol: str):
+        """Símbolo removido do store: as visões convertidas deixam de ter a coluna dele"""
+        for interval in list(self.versions) or ['1d']:
+            self.versions[interval] = self.versions.get(interval, 0) + 1
+
+    def version(self, interval: str = '1d') -> int:
+        return self.versions.get(interval, 0)
+
+    def pair_symbols(self) -> List[str]:
+        return list(self.pairs.values())
+
+    def currencies(self) -> List[str]:
+        """Moedas alcançáveis pelos pares (direto ou cruzando pelo USD)"""
+        return sorted({currency for pair in self.pairs for currency in pair})
+
+    def validate_currency(self, currency: str) -> Optional[str]:
+        """Mensagem de erro se não há como converter para a moeda"""
+        if currency.upper() not in self.currencies():
+            return f"Moeda não suportada: {currency} (disponíveis: {', '.join(self.currencies())})"
+        return None
+
+    def ensure_pairs(self):
+        if self.touch is not None:
+            for symbol in self.pair_symbols():
+                self.touch(symbol)
+
+    def _pair_for(self, source: str, target: str) -> Optional[Tuple[str, bool]]:
+        """(símbolo do par, invertido?) para converter source -> target"""
+        if (source, target) in self.pairs:
+            return self.pairs[(source, target)], False
+        if (target, source) in self.pairs:
+            return self.pairs[(target, source)], True
+        return None
+
+    def rates(self, source: str, target: str, index: pd.DatetimeIndex, interval: str = '1d') -> np.ndarray:
+        """Fator source->target alinhado (as-of) ao índice; NaN antes da primeira cotação"""
+        if source == target:
+            return np.ones(len(index))
+        pair = self._pair_for(source, target)
+        if pair is None:
+            # Sem par direto: cruza pelo USD (ex.: EUR -> BRL)
+            if 'USD' not in (source, target):
+                return self.rates(source, 'USD', index, interval) * self.rates('USD', target, index, interval)
+            return np.full(len(index), np.nan)
+        symbol, inverted = pair
+        series = self.store.get(symbol, interval)
+        if series is None or len(series) == 0:
+            return np.full(len(index), np.nan)
+        positions = asof_positions(series.timestamps, index.to_numpy(dtype='datetime64[ns]').view(np.int64))
+        close = series.close.astype(np.float64)
+        rates = np.where(positions >= 0, close[np.clip(positions, 0, None)], np.nan)
+        return 1 / rates if inverted else rates
+
+    def convert(self, matrix: pd.DataFrame, target: str, currencies: Optional[List[str]] = None,
+                interval: str = '1d') -> pd.DataFrame:
+        """Converte a matriz inteira numa multiplicação: valores * fatores[datas, moeda da coluna]"""
+        target = target.upper()
+        if matrix.empty:
+            return matrix
+        currencies = currencies or [currency_of(symbol) for symbol in matrix.columns]
+        codes, column_codes = np.unique(currencies, return_inverse=True)
+        factors = np.column_stack([self.rates(code, target, matrix.index, interval) for code in codes])
+        values = matrix.to_numpy(dtype=np.float64) * factors[:, column_codes]
+        return pd.DataFrame(values, index=matrix.index, columns=matrix.columns)
+
+    def converted(self, target: str, field: str = 'Close', window: Optional[int] = None,
+                  interval: str = '1d') -> pd.DataFrame:
+        """Matriz de todos os símbolos do store na moeda alvo (últimas `window` datas), em cache
+        até chegar barra nova; visões de portfólio e screens só selecionam colunas dela"""
+        target = target.upper()
+        key = (target, field, window, interval)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == self.version(interval):
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        version = self.version(interval)
+        matrix = self.store.matrix(field, interval=interval)
+        if window is not None:
+            matrix = matrix.tail(window)
+        result = self.convert(matrix.ffill(), target, interval=interval)
+        if len(self._cache) >= self.cache_size and key not in self._cache:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (version, result)
+        return result
+
+    def latest_rates(self, target: str = FX_BASE_CURRENCY) -> Dict[str, Optional[float]]:
+        index = pd.DatetimeIndex([pd.Timestamp.now().normalize() + pd.Timedelta(days=1)])
+        result = {}
+        for source, quote in self.pairs:
+            for currency in (source, quote):
+                if currency != target and currency not in result:
+                    rate = self.rates(currency, target, index)[0]
+                    result[currency] = None if np.isnan(rate) else round(float(rate), 6)
+        return result
+
+    def metrics(self) -> Dict:
+        return {'version': self.version(), 'views': len(self._cache), 'hits': self.hits, 'misses': self.misses,
+                'pairs': {symbol: len(self.store.get(symbol) or []) for symbol in self.pair_symbols()}}
@@ -0,0 +1,186 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from streaming_indicators import STATE_CLASSES, parse_indicator_spec
+
+# Indicadores de calculate_indicators quando nenhum spec é pedido
+DEFAULT_SPEC = "sma:20,ema:20,rsi:14,macd:12:26:9,bb:20:2"
+
+# Colunas do spec padrão -> nomes usados na resposta original da API
+LEGACY_NAMES = {
+    'sma_20': 'sma_20',
+    'ema_20': 'ema_20',
+    'rsi_14': 'rsi',
+    'macd': 'macd',
+    'macd_signal': 'macd_signal',
+    'bb_upper_20': 'bb_upper',
+    'bb_lower_20': 'bb_lower',
+}
+
+# ----- nós do grafo -----
+# Cada nó é uma tupla (op, *args); args que são tuplas são nós de entrada.
+# Nós iguais (ex.: EMA-12 pedida sozinha e dentro do MACD) viram um só cálculo.
+
+
+def _field(name: str) -> Tuple:
+    return ('field', name)
+
+
+CLOSE = _field('Close')
+
+
+def _ema(source: Tuple, span: int) -> Tuple:
+    return ('ema', source, 2 / (span + 1), span)
+
+
+def _wilder(source: Tuple, window: int) -> Tuple:
+    return ('ema', source, 1 / window, window)
+
+
+def _rolling(source: Tuple, how: str, window: int) -> Tuple:
+    return ('rolling', source, how, window)
+
+
+def _sma_nodes(window: int) -> List[Tuple]:
+    return [_rolling(CLOSE, 'mean', window)]
+
+
+def _ema_nodes(span: int) -> List[Tuple]:
+    return [_ema(CLOSE, span)]
+
+
+def _rsi_nodes(window: int) -> List[Tuple]:
+    diff = ('diff', CLOSE)
+    return [('rsi', _wilder(('clip', diff, 'up'), window), _wilder(('clip', diff, 'down'), window))]
+
+
+def _macd_nodes(fast: int, slow: int, signal: int) -> List[Tuple]:
+    macd = ('sub', _ema(CLOSE, fast), _ema(CLOSE, slow))
+    macd_signal = _ema(macd, signal)
+    return [macd, macd_signal, ('sub', macd, macd_signal)]
+
+
+def _bb_nodes(window: int, k: float) -> List[Tuple]:
+    mean = _rolling(CLOSE, 'mean', window)
+    std = _rolling(CLOSE, 'std', window)
+    return [('band', mean, std, k), mean, ('band', mean, std, -k)]
+
+
+def _stoch_nodes(window: int, smooth: int) -> List[Tuple]:
+    k = ('stoch', CLOSE, _rolling(_field('High'), 'max', window), _rolling(_field('Low'), 'min', window))
+    return [k, _rolling(k, 'mean', smooth)]
+
+
+NODE_BUILDERS = {
+    'sma': _sma_nodes,
+    'ema': _ema_nodes,
+    'rsi': _rsi_nodes,
+    'macd': _macd_nodes,
+    'bb': _bb_nodes,
+    'stoch': _stoch_nodes,
+}
+
+
+# ----- operações (mesmas fórmulas da biblioteca ta) -----
+def _op_clip(series: pd.Series, side: str) -> pd.Series:
+    return series.where(series > 0, 0.0) if side == 'up' else -series.where(series < 0, 0.0)
+
+
+def _op_ema(series: pd.Series, alpha: float, min_periods: int) -> pd.Series:
+    return series.ewm(alpha=alpha, min_periods=min_periods, adjust=False).mean()
+
+
+def _op_rolling(series: pd.Series, how: str, window: int) -> pd.Series:
+    rolling = series.rolling(window, min_periods=window)
+    return rolling.std(ddof=0) if how == 'std' else getattr(rolling, how)()
+
+
+def _op_rsi(up: pd.Series, down: pd.Series) -> pd.Series:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.Series(np.where(down == 0, 100.0, 100 - 100 / (1 + up / down)), index=up.index)
+
+
+def _op_stoch(close: pd.Series, highest: pd.Series, lowest: pd.Series) -> pd.Series:
+    return 100 * (close - lowest) / (highest - lowest)
+
+
+OPS = {
+    'diff': lambda series: series.diff(),
+    'clip': _op_clip,
+    'ema': _op_ema,
+    'rolling': _op_rolling,
+    'sub': lambda a, b: a - b,
+    'band': lambda mean, std, k: mean + k * std,
+    'rsi': _op_rsi,
+    'stoch': _op_stoch,
+}
+
+
+class IndicatorPlan:
+    """Plano compilado: nós em ordem topológica e colunas pedidas"""
+
+    def __init__(self, spec: str, steps: Tuple[Tuple, ...], outputs: Tuple[Tuple[str, Tuple], ...]):
+        self.spec = spec
+        self.steps = steps
+        self.outputs = outputs
+
+    def columns(self) -> List[str]:
+        return [column for column, _ in self.outputs]
+
+    def run(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Executa o plano sobre um histórico OHLCV (cada nó calculado uma vez)"""
+        results: Dict[Tuple, pd.Series] = {}
+        for node in self.steps:
+            op, *args = node
+            if op == 'field':
+                results[node] = data[args[0]].astype(np.float64)
+            else:
+                results[node] = OPS[op](*(results[a] if isinstance(a, tuple) else a for a in args))
+        return pd.DataFrame({column: results[node] for column, node in self.outputs}, index=data.index)
+
+    def latest(self, data: pd.DataFrame) -> Dict[str, Optional[float]]:
+        """Último valor de cada coluna (None quando ainda não há barras suficientes)"""
+        last = self.run(data).iloc[-1]
+        return {
+            column: None if pd.isna(value) else round(float(value), 4 if column.startswith('macd') else 2)
+            for column, value in last.items()
+        }
+
+
+def canonical_spec(spec: str) -> str:
+    """Forma normalizada do spec (ordem e parâmetros padrão), usada em chaves de cache"""
+    items = sorted(parse_indicator_spec(spec))
+    return ','.join(':'.join([name] + [str(p) for p in params]) for name, params in items)
+
+
+def _visit(node: Tuple, order: Dict[Tuple, None]):
+    if node in order:
+        return
+    for arg in node[1:]:
+        if isinstance(arg, tuple):
+            _visit(arg, order)
+    order[node] = None
+
+
+@lru_cache(maxsize=256)
+def _compile(spec: str) -> IndicatorPlan:
+    outputs = []
+    for name, params in parse_indicator_spec(spec):
+        columns = STATE_CLASSES[name](*params).columns()
+        outputs.extend(zip(columns, NODE_BUILDERS[name](*params)))
+    order: Dict[Tuple, None] = {}
+    for _, node in outputs:
+        _visit(node, order)
+    return IndicatorPlan(spec, tuple(order), tuple(outputs))
+
+
+def compile_plan(spec: str) -> IndicatorPlan:
+    """Compila o spec em um DAG que compartilha resultados intermediários (memoizado)"""
+    return _compile(canonical_spec(spec))
+
+
+def plan_cache_info() -> Dict:
+    return _compile.cache_info()._asdict()
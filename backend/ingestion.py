@@ -0,0 +1,447 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from series import CompactSeries
+
+logger = logging.getLogger(__name__)
+
+# Feed de ticks: vazio (desligado), 'simulator' (simulador TCP local) ou 'tcp://host:porta'
+INGEST_FEED = os.getenv('INGEST_FEED', '')
+# Ticks guardados em memória por símbolo (ring buffer pré-alocado)
+INGEST_RING_CAPACITY = int(os.getenv('INGEST_RING_CAPACITY', str(1 << 14)))
+INGEST_DIR = os.getenv('INGEST_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ticks'))
+# Descarga no disco a cada N segundos, ou antes se algum ring passar da metade sem gravar
+INGEST_FLUSH_INTERVAL = float(os.getenv('INGEST_FLUSH_INTERVAL', '5'))
+INGEST_BAR_SECONDS = int(os.getenv('INGEST_BAR_SECONDS', '60'))
+# Cadência de barras para o PriceStore e de cotações para o /ws
+INGEST_PUBLISH_INTERVAL = float(os.getenv('INGEST_PUBLISH_INTERVAL', '1'))
+SIMULATOR_HOST = os.getenv('SIMULATOR_HOST', '127.0.0.1')
+SIMULATOR_PORT = int(os.getenv('SIMULATOR_PORT', '9009'))
+SIMULATOR_RATE = float(os.getenv('SIMULATOR_RATE', '20000'))
+SIMULATOR_SYMBOLS = [s for s in os.getenv(
+    'SIMULATOR_SYMBOLS',
+    'PETR4.SA,VALE3.SA,ITUB4.SA,BBDC4.SA,BBAS3.SA,ABEV3.SA,WEGE3.SA,B3SA3.SA,'
+    'AAPL,MSFT,GOOGL,AMZN,NVDA,META,TSLA,JPM,V,BTC-USD'
+).split(',') if s]
+
+# Formato do fio: registros fixos little-endian, lidos direto com np.frombuffer
+TICK_DTYPE = np.dtype([('ts', '<f8'), ('symbol', 'S12'), ('price', '<f8'), ('size', '<f8')])
+# Formato no ring buffer e no disco (o símbolo fica no nome do arquivo)
+RING_DTYPE = np.dtype([('ts', '<f8'), ('price', '<f8'), ('size', '<f8')])
+READ_SIZE = 1 << 16
+
+
+class TickRing:
+    """Ticks recentes de um símbolo em array pré-alocado; `written` é o cursor absoluto"""
+
+    __slots__ = ('symbol', 'buffer', 'capacity', 'written')
+
+    def __init__(self, symbol: str, capacity: int = INGEST_RING_CAPACITY):
+        self.symbol = symbol
+        self.buffer = np.zeros(capacity, dtype=RING_DTYPE)
+        self.capacity = capacity
+        self.written = 0
+
+    def append(self, ticks: np.ndarray):
+        if len(ticks) > self.capacity:
+            self.written += len(ticks) - self.capacity
+            ticks = ticks[-self.capacity:]
+        start = self.written % self.capacity
+        first = min(len(ticks), self.capacity - start)
+        for field in RING_DTYPE.names:
+            self.buffer[field][start:start + first] = ticks[field][:first]
+            self.buffer[field][:len(ticks) - first] = ticks[field][first:]
+        self.written += len(ticks)
+
+    def oldest(self) -> int:
+        return max(self.written - self.capacity, 0)
+
+    def segments(self, since: int, until: Optional[int] = None) -> List[np.ndarray]:
+        """Views (sem cópia) dos ticks [since, until); no máximo duas por causa da volta do ring"""
+        until = self.written if until is None else until
+        since = max(since, self.oldest())
+        if since >= until:
+            return []
+        start, end = since % self.capacity, until % self.capacity or self.capacity
+        if start < end:
+            return [self.buffer[start:end]]
+        return [self.buffer[start:], self.buffer[:end]]
+
+    def latest(self, n: int = 1) -> np.ndarray:
+        segments = self.segments(self.written - n)
+        if not segments:
+            return self.buffer[:0]
+        return segments[0] if len(segments) == 1 else np.concatenate(segments)
+
+
+def encode_ticks(symbols: np.ndarray, ts: np.ndarray, price: np.ndarray, size: np.ndarray) -> bytes:
+    batch = np.empty(len(ts), dtype=TICK_DTYPE)
+    batch['ts'], batch['symbol'], batch['price'], batch['size'] = ts, symbols, price, size
+    return batch.tobytes()
+
+
+# ----- feeds -----
+class TCPFeed:
+    """Ticks binários (TICK_DTYPE) por TCP; reconecta com backoff"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.connected = False
+
+    async def batches(self) -> AsyncIterator[np.ndarray]:
+        backoff = 1.0
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                logger.warning(f"Feed {self.host}:{self.port} indisponível: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            self.connected, backoff = True, 1.0
+            pending = b''
+            try:
+                while True:
+                    chunk = await reader.read(READ_SIZE)
+                    if not chunk:
+                        break
+                    data = pending + chunk if pending else chunk
+                    count = len(data) // TICK_DTYPE.itemsize
+                    if count:
+                        yield np.frombuffer(data, dtype=TICK_DTYPE, count=count)
+                    pending = data[count * TICK_DTYPE.itemsize:]
+            finally:
+                self.connected = False
+                writer.close()
+
+
+class TickSimulator:
+    """Passeio aleatório de preços por símbolo, para testes e benchmarks"""
+
+    def __init__(self, symbols: List[str] = SIMULATOR_SYMBOLS, rate: float = SIMULATOR_RATE, seed: int = 7):
+        self.symbols = np.array([s.encode() for s in symbols], dtype='S12')
+        self.rate = rate
+        self.rng = np.random.default_rng(seed)
+        self.prices = self.rng.uniform(10, 500, len(symbols))
+
+    def generate(self, n: int, now: Optional[float] = None) -> bytes:
+        now = now or time.time()
+        which = self.rng.integers(0, len(self.symbols), n)
+        # Passeio por símbolo: soma acumulada dos passos dentro de cada grupo
+        order = np.argsort(which, kind='stable')
+        grouped = which[order]
+        walk = np.cumsum(self.rng.normal(0, 0.00005, n))
+        ids = np.arange(len(self.symbols))
+        starts = np.searchsorted(grouped, ids)
+        ends = np.searchsorted(grouped, ids, side='right') - 1
+        walk -= np.r_[0.0, walk][starts][grouped]
+        price = np.empty(n)
+        price[order] = self.prices[grouped] * np.exp(walk)
+        present = ends >= starts
+        self.prices[present] = price[order][ends[present]]
+        ts = now + np.arange(n) / max(self.rate, 1)
+        size = self.rng.integers(1, 50, n) * 100.0
+        return encode_ticks(self.symbols[which], ts, np.round(price, 4), size)
+
+    async def _serve_client(self, reader, writer):
+        tick = 0.01
+        try:
+            while True:
+                writer.write(self.generate(max(int(self.rate * tick), 1)))
+                await writer.drain()
+                await asyncio.sleep(tick)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = SIMULATOR_HOST, port: int = SIMULATOR_PORT) -> asyncio.AbstractServer:
+        server = await asyncio.start_server(self._serve_client, host, port)
+        logger.info(f"Simulador de ticks em {host}:{port} ({self.rate:.0f} ticks/s)")
+        return server
+
+
+class SimulatorFeed(TCPFeed):
+    """Sobe o simulador local e consome dele pelo mesmo caminho TCP de um feed real"""
+
+    def __init__(self, host: str = SIMULATOR_HOST, port: int = SIMULATOR_PORT,
+                 simulator: Optional[TickSimulator] = None):
+        super().__init__(host, port)
+        self.simulator = simulator or TickSimulator()
+
+    async def batches(self) -> AsyncIterator[np.ndarray]:
+        server = await self.simulator.start(self.host, self.port)
+        try:
+            async for batch in super().batches():
+                yield batch
+        finally:
+            server.close()
+
+
+def open_feed(spec: str = INGEST_FEED):
+    if not spec:
+        return None
+    if spec == 'simulator':
+        return SimulatorFeed()
+    if spec.startswith('tcp://'):
+        host, _, port = spec[len('tcp://'):].rpartition(':')
+        return TCPFeed(host, int(port))
+    raise ValueError(f"INGEST_FEED inválido: {spec}")
+
+
+# ----- barras -----
+def _bar_interval(seconds: int) -> str:
+    return f"{seconds // 60}m" if seconds % 60 == 0 else f"{seconds}s"
+
+
+class BarBuilder:
+    """Agrega ticks novos do ring em barras OHLCV; a barra corrente é reemitida até fechar"""
+
+    def __init__(self, bar_seconds: int = INGEST_BAR_SECONDS):
+        self.bar_seconds = bar_seconds
+        self.interval = _bar_interval(bar_seconds)
+        self.cursors: Dict[str, int] = {}
+        # Barra em aberto por símbolo: (bucket, open, high, low, close, volume)
+        self.partial: Dict[str, Tuple] = {}
+
+    def build(self, ring: TickRing) -> Optional[CompactSeries]:
+        segments = ring.segments(self.cursors.get(ring.symbol, 0))
+        self.cursors[ring.symbol] = ring.written
+        if not segments:
+            return None
+        ticks = segments[0] if len(segments) == 1 else np.concatenate(segments)
+        bucket = (ticks['ts'] // self.bar_seconds).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        buckets = bucket[starts]
+        price, size = ticks['price'], ticks['size']
+        opens = price[starts]
+        highs = np.maximum.reduceat(price, starts)
+        lows = np.minimum.reduceat(price, starts)
+        closes = price[np.r_[starts[1:] - 1, len(price) - 1]]
+        volumes = np.add.reduceat(size, starts)
+
+        partial = self.partial.get(ring.symbol)
+        if partial is not None and partial[0] == buckets[0]:
+            opens[0] = partial[1]
+            highs[0] = max(highs[0], partial[2])
+            lows[0] = min(lows[0], partial[3])
+            volumes[0] += partial[5]
+        self.partial[ring.symbol] = (buckets[-1], opens[-1], highs[-1], lows[-1], closes[-1], volumes[-1])
+        timestamps = buckets * self.bar_seconds * 1_000_000_000
+        return CompactSeries(timestamps, opens, highs, lows, closes, volumes.astype(np.uint64))
+
+
+# ----- persistência -----
+class TickWriter:
+    """Grava ticks novos em data/ticks/<SÍMBOLO>/<AAAA-MM-DD>.ticks com escritas sequenciais grandes"""
+
+    def __init__(self, root: str = INGEST_DIR):
+        self.root = root
+        self.flushed: Dict[str, int] = {}
+        self.bytes_written = 0
+        self.overruns = 0
+
+    def pending_bytes(self, rings: Dict[str, TickRing]) -> int:
+        return sum(ring.written - self.flushed.get(symbol, 0) for symbol, ring in rings.items()) * RING_DTYPE.itemsize
+
+    def needs_flush(self, rings: Dict[str, TickRing]) -> bool:
+        """Algum ring com mais de meia volta sem gravar (a próxima volta perderia ticks)"""
+        return any(ring.written - self.flushed.get(symbol, 0) >= ring.capacity // 2
+                   for symbol, ring in rings.items())
+
+    def collect(self, rings: Dict[str, TickRing], until: Dict[str, int]) -> Dict[str, np.ndarray]:
+        """Copia os ticks ainda não gravados; roda no loop, antes da thread, porque o ring
+        continua sendo sobrescrito pelo ingest enquanto a escrita acontece"""
+        pending = {}
+        for symbol, end in until.items():
+            ring = rings[symbol]
+            start = self.flushed.get(symbol, 0)
+            if start < ring.oldest():
+                # Ring deu a volta antes da descarga: ticks perdidos no disco
+                self.overruns += ring.oldest() - start
+            segments = ring.segments(start, end)
+            if segments:
+                pending[symbol] = np.concatenate(segments)
+            self.flushed[symbol] = end
+        return pending
+
+    def write(self, pending: Dict[str, np.ndarray]) -> int:
+        """Roda numa thread; só toca nas cópias feitas por collect"""
+        written = 0
+        for symbol, ticks in pending.items():
+            days = (ticks['ts'] // 86400).astype(np.int64)
+            cuts = np.flatnonzero(days[1:] != days[:-1]) + 1
+            for part in np.split(ticks, cuts):
+                written += self._write(symbol, part)
+        self.bytes_written += written
+        return written
+
+    def flush(self, rings: Dict[str, TickRing], until: Dict[str, int]) -> int:
+        """Descarga síncrona; `until` fixa o cursor de cada ring"""
+        return self.write(self.collect(rings, until))
+
+    def _write(self, symbol: str, ticks: np.ndarray) -> int:
+        day = time.strftime('%Y-%m-%d', time.gmtime(float(ticks['ts'][0])))
+        directory = os.path.join(self.root, symbol.replace('/', '_'))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'{day}.ticks'), 'ab') as f:
+            f.write(ticks.data)
+        return ticks.nbytes
+
+
+def read_ticks(symbol: str, day: str, root: str = INGEST_DIR) -> np.ndarray:
+    """Ticks gravados de um símbolo num dia (UTC), como array RING_DTYPE"""
+    path = os.path.join(root, symbol.upper().replace('/', '_'), f'{day}.ticks')
+    if not os.path.exists(path):
+        return np.empty(0, dtype=RING_DTYPE)
+    return np.fromfile(path, dtype=RING_DTYPE)
+
+
+# ----- serviço -----
+class IngestionService:
+    """Consome o feed em lotes, anexa aos rings, descarrega no disco e publica barras/cotações"""
+
+    def __init__(self, feed, price_store=None, writer: Optional[TickWriter] = None,
+                 bar_builder: Optional[BarBuilder] = None, capacity: int = INGEST_RING_CAPACITY,
+                 flush_interval: float = INGEST_FLUSH_INTERVAL,
+                 publish_interval: float = INGEST_PUBLISH_INTERVAL):
+        self.feed = feed
+        self.price_store = price_store
+        self.writer = writer or TickWriter()
+        self.bar_builder = bar_builder or BarBuilder()
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.publish_interval = publish_interval
+        self.rings: Dict[str, TickRing] = {}
+        self._dirty: set = set()
+        self._listeners: List[Callable] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_flush = time.monotonic()
+        self.ticks = 0
+        self.batches = 0
+        self.started = time.monotonic()
+
+    def subscribe(self, callback: Callable):
+        """callback(quotes) com a última cotação dos símbolos que mudaram, a cada publish_interval"""
+        self._listeners.append(callback)
+
+    def ring(self, symbol: str) -> TickRing:
+        ring = self.rings.get(symbol)
+        if ring is None:
+            ring = self.rings[symbol] = TickRing(symbol, self.capacity)
+        return ring
+
+    def ingest(self, batch: np.ndarray) -> int:
+        """Agrupa o lote por símbolo (ordem estável) e anexa cada grupo ao ring do símbolo"""
+        if not len(batch):
+            return 0
+        symbols, inverse = np.unique(batch['symbol'], return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        grouped = batch[order]
+        bounds = np.cumsum(np.bincount(inverse, minlength=len(symbols)))[:-1]
+        for raw, ticks in zip(symbols, np.split(grouped, bounds)):
+            symbol = raw.decode()
+            self.ring(symbol).append(ticks)
+            self._dirty.add(symbol)
+        self.ticks += len(batch)
+        self.batches += 1
+        return len(batch)
+
+    def publish(self):
+        """Barras novas para o PriceStore e cotações para os assinantes"""
+        dirty, self._dirty = self._dirty, set()
+        quotes = {}
+        for symbol in dirty:
+            ring = self.rings[symbol]
+            bars = self.bar_builder.build(ring)
+            if bars is not None and self.price_store is not None:
+                self.price_store.update_series(symbol, bars, self.bar_builder.interval)
+            last = ring.latest()[0]
+            quotes[symbol] = {'price': round(float(last['price']), 4), 'size': float(last['size']),
+                              'ts': round(float(last['ts']), 3)}
+        if quotes:
+            for callback in self._listeners:
+                try:
+                    callback(quotes)
+                except Exception as e:
+                    logger.error(f"Erro em assinante de cotações: {e}")
+
+    def cursors(self) -> Dict[str, int]:
+        return {symbol: ring.written for symbol, ring in self.rings.items()}
+
+    async def flush(self):
+        pending = self.writer.collect(self.rings, self.cursors())
+        self._last_flush = time.monotonic()
+        try:
+            await asyncio.to_thread(self.writer.write, pending)
+        except Exception as e:
+            logger.error(f"Erro ao gravar ticks: {e}")
+
+    def _maybe_flush(self):
+        if self._flushing is not None and not self._flushing.done():
+            return
+        due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due or self.writer.needs_flush(self.rings):
+            self._flushing = asyncio.create_task(self.flush())
+
+    async def _publish_loop(self):
+        while True:
+            await asyncio.sleep(self.publish_interval)
+            try:
+                self.publish()
+                self._maybe_flush()
+            except Exception as e:
+                logger.error(f"Erro ao publicar ticks: {e}")
+
+    async def run(self):
+        self._task = asyncio.current_task()
+        publisher = asyncio.create_task(self._publish_loop())
+        try:
+            async for batch in self.feed.batches():
+                self.ingest(batch)
+        finally:
+            publisher.cancel()
+
+    def flush_now(self):
+        """Descarga síncrona de tudo que falta"""
+        self.writer.flush(self.rings, self.cursors())
+
+    async def close(self):
+        """Desligamento: para o consumo, espera a descarga em andamento e grava o resto"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._flushing is not None and not self._flushing.done():
+            await self._flushing
+        self.flush_now()
+
+    def latest_ticks(self, symbol: str, limit: int = 100) -> List[Dict]:
+        ring = self.rings.get(symbol.upper())
+        if ring is None:
+            return []
+        ticks = ring.latest(min(limit, ring.written, ring.capacity))
+        return [{'ts': round(float(t['ts']), 3), 'price': float(t['price']), 'size': float(t['size'])}
+                for t in ticks]
+
+    def metrics(self) -> Dict:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            'connected': getattr(self.feed, 'connected', None),
+            'symbols': len(self.rings),
+            'ticks': self.ticks,
+            'batches': self.batches,
+            'ticks_per_second': round(self.ticks / elapsed, 1),
+            'ring_capacity': self.capacity,
+            'ring_bytes': len(self.rings) * self.capacity * RING_DTYPE.itemsize,
+            'pending_flush_bytes': self.writer.pending_bytes(self.rings),
+            'bytes_written': self.writer.bytes_written,
+            'overruns': self.writer.overruns,
+            'bar_interval': self.bar_builder.interval
+        }
@@ -1,18 +1,44 @@
-from fastapi import FastAPI, WebSocket, BackgroundTasks
+from fastapi import FastAPI, WebSocket, BackgroundTasks, Request, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 import asyncio
 import json
-import yfinance as yf
 import requests
 from textblob import TextBlob
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import os
+import hmac
 from typing import Dict, List
 import random
 import warnings
-import ta
+from market_snapshot import MarketSnapshotService
+from market_calendar import MarketCalendar
+from prefetch import Prefetcher
+from fundamentals import FundamentalsStore
+from price_store import PriceStore
+from peers import PeerIndex
+from breadth import MarketBreadth
+from universes import get_universe
+from streaming import StreamHub, format_ndjson, format_sse
+from data_provider import HistoryFetchError, local_cache_info, provider
+from export import EXPORT_FORMATS, iter_export, pq
+from streaming_indicators import parse_indicator_spec
+from result_cache import ResultCache, bar_version, make_key
+from ws_stream import WS_PER_MESSAGE_DEFLATE, MarketFeed
+from forecasting import FORECAST_MAX_SYMBOLS, ForecastService
+from symbol_index import SymbolIndex
+from diagnostics import DIAGNOSTICS_TOKEN, Diagnostics
+from ingestion import IngestionService, open_feed
+from anomalies import VolumeAnomalyDetector
+from asof import ASOF_MAX_TIMESTAMPS, AsOfService
+from charts import CHART_BARS, CHART_BUILDERS, CHART_MAX_BARS, build_chart
+from candlestick_patterns import PATTERNS, PatternScreener, latest_patterns, parse_patterns, pattern_direction
+from fx import FX_BASE_CURRENCY, FXService, currency_of
+from traffic_capture import TrafficCaptureMiddleware, open_capture
+from admission import AdmissionController, AdmissionMiddleware
+from indicator_pipeline import DEFAULT_SPEC, LEGACY_NAMES, canonical_spec, compile_plan, plan_cache_info
 
 # Ignorar warnings
 warnings.filterwarnings('ignore')
@@ -20,80 +46,82 @@ warnings.filterwarnings('ignore')
 # ===== ANÁLISE TÉCNICA =====
 class TechnicalAnalysis:
     def __init__(self):
-        pass
+        # Indicadores calculados por calculate_indicators (entra na chave do cache)
+        self.indicator_spec = DEFAULT_SPEC
     
     def get_stock_data(self, symbol: str) -> pd.DataFrame:
         """Busca dados da ação"""
         try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period="6mo")
+            data = provider.history(symbol, period="1y")
             return data
         except Exception as e:
             print(f"Erro ao buscar {symbol}: {e}")
             return pd.DataFrame()
     
-    def calculate_indicators(self, data: pd.DataFrame) -> Dict:
-        """Calcula indicadores técnicos"""
+    def calculate_indicators(self, data: pd.DataFrame, spec: str = None) -> Dict:
+        """Calcula indicadores técnicos (todos os padrão, ou só os do spec pedido)"""
         if data.empty:
             return {}
         
         # Preço atual
-        current_price = data['Close'].iloc[-1] if len(data) > 0 else 0
+        current_price = round(float(data['Close'].iloc[-1]), 2)
+        values = compile_plan(spec or self.indicator_spec).latest(data)
+        if spec:
+            return {'current_price': current_price, **values}
         
-        # Médias móveis
-        sma_20 = data['Close'].rolling(20).mean().iloc[-1]
-        ema_20 = data['Close'].ewm(span=20).mean().iloc[-1]
-        
-        # RSI
-        rsi = ta.momentum.RSIIndicator(data['Close'], window=14).rsi().iloc[-1]
-        
-        # MACD
-        macd_line = ta.trend.MACD(data['Close']).macd().iloc[-1]
-        macd_signal = ta.trend.MACD(data['Close']).macd_signal().iloc[-1]
-        
-        # Bollinger Bands
-        bb_upper = ta.volatility.BollingerBands(data['Close']).bollinger_hband().iloc[-1]
-        bb_lower = ta.volatility.BollingerBands(data['Close']).bollinger_lband().iloc[-1]
-        
-        return {
-            'current_price': round(current_price, 2),
-            'sma_20': round(sma_20, 2),
-            'ema_20': round(ema_20, 2),
-            'rsi': round(rsi, 2),
-            'macd': round(macd_line, 4),
-            'macd_signal': round(macd_signal, 4),
-            'bb_upper': round(bb_upper, 2),
-            'bb_lower': round(bb_lower, 2)
-        }
+        # Formato original da resposta (rsi, bb_upper, ...)
+        return {'current_price': current_price,
+                **{name: values.get(column) for column, name in LEGACY_NAMES.items()}}
     
-    def generate_signals(self, indicators: Dict) -> Dict:
+    def detect_patterns(self, data: pd.DataFrame) -> List[str]:
+        """Padrões de candlestick na última barra"""
+        if data.empty:
+            return []
+        return latest_patterns(data['Open'].to_numpy(), data['High'].to_numpy(),
+                               data['Low'].to_numpy(), data['Close'].to_numpy())
+    
+    def generate_signals(self, indicators: Dict, patterns: List[str] = None) -> Dict:
         """Gera sinais de compra/venda"""
         signals = {}
         
+        # Sinais só para os indicadores disponíveis (spec parcial ou histórico curto)
         # Sinal RSI
-        rsi = indicators.get('rsi', 50)
-        if rsi < 30:
-            signals['rsi_signal'] = 'COMPRA'
-        elif rsi > 70:
-            signals['rsi_signal'] = 'VENDA'
-        else:
-            signals['rsi_signal'] = 'NEUTRO'
+        rsi = indicators.get('rsi', indicators.get('rsi_14'))
+        if rsi is not None:
+            if rsi < 30:
+                signals['rsi_signal'] = 'COMPRA'
+            elif rsi > 70:
+                signals['rsi_signal'] = 'VENDA'
+            else:
+                signals['rsi_signal'] = 'NEUTRO'
         
         # Sinal MACD
-        macd = indicators.get('macd', 0)
-        macd_signal = indicators.get('macd_signal', 0)
-        if macd > macd_signal:
-            signals['macd_signal'] = 'COMPRA'
-        else:
-            signals['macd_signal'] = 'VENDA'
+        macd = indicators.get('macd')
+        macd_signal = indicators.get('macd_signal')
+        if macd is not None and macd_signal is not None:
+            if macd > macd_signal:
+                signals['macd_signal'] = 'COMPRA'
+            else:
+                signals['macd_signal'] = 'VENDA'
         
         # Sinal Tendência
-        price = indicators.get('current_price', 0)
-        sma = indicators.get('sma_20', 0)
-        if price > sma:
-            signals['trend_signal'] = 'COMPRA'
-        else:
-            signals['trend_signal'] = 'VENDA'
+        price = indicators.get('current_price')
+        sma = indicators.get('sma_20')
+        if price is not None and sma is not None:
+            if price > sma:
+                signals['trend_signal'] = 'COMPRA'
+            else:
+                signals['trend_signal'] = 'VENDA'
+        
+        # Sinal dos padrões de candlestick da última barra
+        if patterns is not None:
+            direction = pattern_direction(patterns)
+            if direction > 0:
+                signals['pattern_signal'] = 'COMPRA'
+            elif direction < 0:
+                signals['pattern_signal'] = 'VENDA'
+            else:
+                signals['pattern_signal'] = 'NEUTRO'
         
         # Sinal Geral
         buy_signals = list(signals.values()).count('COMPRA')
@@ -120,12 +148,14 @@ class TechnicalAnalysis:
             indicators = self.calculate_indicators(data)
             
             # Gerar sinais
-            signals = self.generate_signals(indicators)
+            patterns = self.detect_patterns(data)
+            signals = self.generate_signals(indicators, patterns)
             
             return {
                 'symbol': symbol,
                 'indicators': indicators,
                 'signals': signals,
+                'patterns': patterns,
                 'success': True
             }
             
@@ -136,6 +166,63 @@ class TechnicalAnalysis:
 tech_analyzer = TechnicalAnalysis()
 # ===== FIM ANÁLISE TÉCNICA =====
 
+# Snapshot compartilhado por todos os endpoints (atualizado em background)
+price_store = PriceStore()
+# Cache de resultados em dois níveis (L1 local + L2 Redis/local)
+result_cache = ResultCache()
+# Pregões e feriados por bolsa: fora do horário o agendador fica ocioso
+market_calendar = MarketCalendar.load()
+snapshot_service = MarketSnapshotService(tech_analyzer, price_store=price_store, result_cache=result_cache,
+                                         calendar=market_calendar)
+# Cadastro local de símbolos (autocomplete) e cache negativo de tickers inválidos
+symbol_index = SymbolIndex.load()
+prefetcher = Prefetcher(snapshot_service, is_rejected=symbol_index.is_rejected)
+# Fundamentos persistidos localmente (nunca buscados no caminho da requisição)
+fundamentals_store = FundamentalsStore(rate_limiter=snapshot_service.rate_limiter)
+# Pares por correlação, atualizados a cada barra nova
+peer_index = PeerIndex(price_store, fundamentals_store)
+price_store.subscribe(peer_index.on_bars)
+price_store.subscribe_removals(peer_index.forget)
+# Câmbio (USDBRL=X etc.) no mesmo PriceStore; visões convertidas em cache por (moeda, janela)
+fx_service = FXService(price_store, touch=snapshot_service.touch)
+PORTFOLIO_WINDOW = 253
+# Amplitude de mercado mantida incrementalmente sobre o mesmo PriceStore
+market_breadth = MarketBreadth(price_store, fundamentals_store, fx=fx_service)
+price_store.subscribe(market_breadth.on_bars)
+price_store.subscribe_removals(market_breadth.forget)
+# Picos de volume: EWMA por símbolo atualizada a cada barra, alertas no /ws
+anomaly_detector = VolumeAnomalyDetector(calendar=market_calendar)
+price_store.subscribe(anomaly_detector.on_bars)
+# Padrões de candlestick da última barra de cada símbolo (screener)
+pattern_screener = PatternScreener(price_store)
+price_store.subscribe(pattern_screener.on_bars)
+# Consultas "como estava em t": checkpoints do estado dos indicadores por (símbolo, intervalo, spec)
+asof_service = AsOfService(price_store)
+
+def forget_invalid_symbol(symbol: str, snapshot: Dict):
+    if not snapshot.get('success'):
+        symbol_index.mark_invalid(symbol)
+        if symbol not in symbol_index:
+            snapshot_service.untrack(symbol)
+
+snapshot_service.subscribe(forget_invalid_symbol)
+
+def rejected_symbol(symbol: str):
+    """Resposta de erro imediata para símbolos recusados pelo cadastro (sem chamada ao provedor)"""
+    error = symbol_index.validate(symbol)
+    if error:
+        return {'symbol': symbol.upper(), 'error': error, 'success': False, 'invalid': True}
+    return None
+
+# Previsões: modelos por símbolo re-treinados a cada barra nova
+forecaster = ForecastService(price_store, result_cache)
+price_store.subscribe(forecaster.on_bars)
+# Streams de análise técnica (um produtor por símbolo)
+stream_hub = StreamHub(snapshot_service)
+# Ingestão de ticks (INGEST_FEED): rings por símbolo, barras intraday no PriceStore
+tick_feed = open_feed()
+ingestion = IngestionService(tick_feed, price_store) if tick_feed is not None else None
+
 app = FastAPI(
     title="🚀 Market Intelligence Pro",
     description="Sistema Avançado de Análise de Mercado e Previsões",
@@ -144,6 +231,10 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Cotas por cliente/rota e descarte de carga; símbolo sem snapshot custa mais (busca no Yahoo)
+admission = AdmissionController(is_warm=lambda symbol: snapshot_service.get(symbol) is not None)
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -152,6 +243,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Captura opcional de tráfego (metadados e tempos, sem payloads) para replay; mais externa de todas
+traffic_capture = open_capture()
+app.add_middleware(TrafficCaptureMiddleware, writer=traffic_capture)
+
 market_insights = {}
 social_sentiment = {}
 
@@ -172,33 +267,69 @@ class AIBusinessOracle:
                 "volume_trend": random.choice(["INCREASING", "DECREASING", "STABLE"])
             }
         }
-    
-    def predict_market_movement(self, symbol: str = "SPY") -> Dict:
-        """Previsão de movimento de mercado"""
-        try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            
-            prediction = {
-                "symbol": symbol,
-                "predicted_direction": random.choice(["UP", "DOWN", "SIDEWAYS"]),
-                "confidence_score": random.uniform(0.6, 0.9),
-                "predicted_change_percent": random.uniform(-5, 5),
-                "time_horizon": "1W",
-                "reasoning": [
-                    "Análise técnica favorável",
-                    "Sentimento positivo em redes sociais",
-                    "Fundamentos sólidos",
-                    "Tendência de alta no setor"
-                ]
-            }
-            return prediction
-        except Exception as e:
-            return {"error": f"Erro na previsão: {str(e)}"}
 
 # Instância do Oracle
 oracle = AIBusinessOracle()
 
+# Diagnóstico de memória (admin): tamanhos por subsistema e conexões abertas
+diagnostics = Diagnostics()
+diagnostics.register_cache('result_cache', lambda: {'entries': len(result_cache.l1), 'bytes': result_cache.l1.size})
+diagnostics.register_cache('price_store', lambda: len(price_store.symbols()))
+diagnostics.register_cache('snapshots', lambda: {'snapshots': len(snapshot_service.snapshots),
+                                                 'tracked': len(snapshot_service.last_requested)})
+diagnostics.register_cache('demand', lambda: len(snapshot_service.demand.scores))
+diagnostics.register_cache('symbol_negative_cache', lambda: symbol_index.metrics()['negative_cache'])
+diagnostics.register_cache('forecast_models', lambda: len(forecaster.models))
+diagnostics.register_cache('fundamentals_pending', lambda: len(fundamentals_store.pending))
+diagnostics.register_cache('asof_checkpoints', asof_service.metrics)
+diagnostics.register_cache('volume_anomalies', lambda: {'symbols': len(anomaly_detector),
+                                                         'bytes': anomaly_detector.nbytes()})
+diagnostics.register_cache('peer_returns', lambda: peer_index.returns.shape)
+diagnostics.register_cache('admission_buckets', lambda: len(admission.buckets))
+diagnostics.register_cache('indicator_plans', plan_cache_info)
+diagnostics.register_cache('local_provider_frames', local_cache_info)
+diagnostics.register_cache('stream_history', lambda: sum(len(st.events) for st in stream_hub.streams.values()))
+diagnostics.register_cache('market_insights', lambda: len(market_insights))
+diagnostics.register_cache('social_sentiment', lambda: len(social_sentiment))
+diagnostics.register_cache('oracle', lambda: {'market_data': len(oracle.market_data),
+                                              'ai_predictions': len(oracle.ai_predictions)})
+diagnostics.register_connections('ws', lambda: [
+    {k: c[k] for k in ('id', 'peer', 'interval_ms', 'unacked', 'messages_sent')}
+    for c in market_feed.metrics(limit=100)['per_client']
+])
+diagnostics.register_connections('streams', stream_hub.connections)
+if ingestion is not None:
+    diagnostics.register_cache('tick_rings', lambda: {'symbols': len(ingestion.rings),
+                                                      'bytes': ingestion.metrics()['ring_bytes']})
+
+def require_admin(token: str):
+    """Endpoints de diagnóstico só com DIAGNOSTICS_TOKEN configurado e informado em X-Admin-Token"""
+    if not DIAGNOSTICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Diagnóstico desabilitado")
+    if not token or not hmac.compare_digest(token, DIAGNOSTICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administrador inválido")
+
+@app.on_event("startup")
+async def start_background_jobs():
+    asyncio.create_task(snapshot_service.run_scheduler())
+    asyncio.create_task(prefetcher.run())
+    asyncio.create_task(fundamentals_store.run())
+    asyncio.create_task(peer_index.run())
+    asyncio.create_task(market_feed.run())
+    asyncio.create_task(forecaster.run())
+    asyncio.create_task(diagnostics.run_watchdog())
+    if ingestion is not None:
+        asyncio.create_task(ingestion.run())
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    prefetcher.save_popularity()
+    forecaster.shutdown()
+    if traffic_capture is not None:
+        traffic_capture.close()
+    if ingestion is not None:
+        await ingestion.close()
+
 @app.get("/")
 async def root():
     return {
@@ -214,30 +345,61 @@ async def root():
         ]
     }
 
+def build_live_state() -> Dict:
+    """Estado do mercado enviado no /ws (calculado uma vez para todos os clientes)"""
+    # Dados em tempo real simulados
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "market_pulse": random.uniform(-1, 1),
+        "opportunity_score": random.uniform(0, 100),
+        "risk_level": random.choice(["LOW", "MEDIUM", "HIGH"]),
+        "alerts": anomaly_detector.recent(5) or generate_smart_alerts(),
+        "top_performers": snapshot_service.top_movers(3),
+        "market_insights": oracle.analyze_market_sentiment()
+    }
+
+# Feed do /ws: cadência por cliente e deltas em vez do estado completo
+market_feed = MarketFeed(build_live_state)
+snapshot_service.subscribe(
+    lambda symbol, snapshot: market_feed.publish({"top_performers": snapshot_service.top_movers(3)})
+    if market_feed.clients else None
+)
+anomaly_detector.subscribe(lambda alert: market_feed.publish({"alerts": anomaly_detector.recent(5)}))
+if ingestion is not None:
+    # Cotações dos ticks entram no estado do /ws; o delta leva só os símbolos que mudaram
+    ingestion.subscribe(
+        lambda quotes: market_feed.publish({"quotes": dict(market_feed.state.get("quotes", {}), **quotes)})
+    )
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
+    """Snapshot inicial e depois deltas; o cliente ajusta a cadência com mensagens subscribe
+    e responde {"type": "ping"} com {"action": "pong"}"""
     try:
-        while True:
-            # Dados em tempo real simulados
-            live_data = {
-                "timestamp": datetime.now().isoformat(),
-                "market_pulse": random.uniform(-1, 1),
-                "opportunity_score": random.uniform(0, 100),
-                "risk_level": random.choice(["LOW", "MEDIUM", "HIGH"]),
-                "alerts": generate_smart_alerts(),
-                "top_performers": [
-                    {"symbol": "AAPL", "change": random.uniform(1, 5)},
-                    {"symbol": "MSFT", "change": random.uniform(1, 4)},
-                    {"symbol": "GOOGL", "change": random.uniform(0.5, 3)}
-                ],
-                "market_insights": oracle.analyze_market_sentiment()
-            }
-            await websocket.send_json(live_data)
-            await asyncio.sleep(3)
+        await market_feed.serve(websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
 
+@app.get("/api/ws/stats")
+async def get_ws_stats(limit: int = 100):
+    """Conexões, limites, heartbeats, despejos e bytes enviados por cliente do /ws"""
+    return market_feed.metrics(limit=max(0, limit))
+
+@app.get("/api/ingestion/stats")
+async def get_ingestion_stats():
+    """Taxa de ticks, rings e gravação em disco da ingestão"""
+    if ingestion is None:
+        return {'enabled': False}
+    return dict(ingestion.metrics(), enabled=True)
+
+@app.get("/api/ticks/{symbol}")
+async def get_ticks(symbol: str, limit: int = 100):
+    """Últimos ticks do símbolo no ring buffer"""
+    if ingestion is None:
+        return {'symbol': symbol.upper(), 'error': 'Ingestão de ticks desabilitada', 'success': False}
+    return {'symbol': symbol.upper(), 'ticks': ingestion.latest_ticks(symbol, min(max(limit, 1), 5000)),
+            'success': True}
+
 @app.get("/api/market-analysis")
 async def get_market_analysis():
     """Análise completa do mercado"""
@@ -249,34 +411,321 @@ async def get_market_analysis():
             "risk_indicators": calculate_risk_indicators(),
             "opportunity_zones": identify_opportunity_zones(),
             "recommendations": generate_recommendations(),
+            "market_breadth": market_breadth.summary(include_tiles=False),
             "timestamp": datetime.now().isoformat()
         }
         return analysis
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/api/market-breadth")
+async def get_market_breadth(universe: str = None, currency: str = None):
+    """Amplitude de mercado e heatmap setorial (sem chamadas por símbolo); ?currency=USD|BRL"""
+    try:
+        symbols = get_universe(universe) if universe else None
+        if currency:
+            error = fx_service.validate_currency(currency)
+            if error:
+                return {'error': error, 'success': False}
+            fx_service.ensure_pairs()
+        return market_breadth.summary(symbols, currency=currency)
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/api/fx")
+async def get_fx(currency: str = None):
+    """Cotações de câmbio mais recentes e uso do cache de visões convertidas"""
+    currency = (currency or FX_BASE_CURRENCY).upper()
+    error = fx_service.validate_currency(currency)
+    if error:
+        return {'error': error, 'success': False}
+    fx_service.ensure_pairs()
+    return {'currency': currency, 'rates': fx_service.latest_rates(currency), **fx_service.metrics()}
+
+@app.get("/api/anomalies")
+async def get_anomalies(symbols: str = None, limit: int = 20):
+    """Picos de volume recentes e z-score corrente (estado já calculado, sem download)"""
+    limit = max(1, min(limit, 200))
+    if symbols:
+        requested = [s.strip().upper() for s in symbols.split(',') if s.strip()]
+        states = [anomaly_detector.state(symbol) for symbol in requested]
+        current = [state for state in states if state is not None]
+        missing = [symbol for symbol, state in zip(requested, states) if state is None]
+        for symbol in missing:
+            if not rejected_symbol(symbol):
+                snapshot_service.touch(symbol)
+    else:
+        current, missing = anomaly_detector.top(limit), []
+    return {
+        'alerts': anomaly_detector.recent(limit),
+        'current': current,
+        'missing': missing,
+        'pending': bool(missing),
+        **anomaly_detector.metrics(),
+        'timestamp': datetime.now().isoformat()
+    }
+
+@app.get("/api/screener/patterns")
+async def screen_patterns(patterns: str = None, universe: str = None, direction: str = None, limit: int = 50):
+    """Símbolos com padrões de candlestick na última barra (?patterns=hammer,doji&direction=bullish)"""
+    try:
+        names = parse_patterns(patterns)
+    except ValueError as e:
+        return {'error': str(e), 'success': False}
+    if direction not in (None, 'bullish', 'bearish'):
+        return {'error': 'direction deve ser bullish ou bearish', 'success': False}
+    symbols = get_universe(universe) if universe else None
+    results = pattern_screener.screen(names, symbols, direction)
+    return {
+        'results': results[:max(1, min(limit, 500))],
+        'count': len(results),
+        'available': list(PATTERNS),
+        **pattern_screener.metrics(),
+        'timestamp': datetime.now().isoformat()
+    }
+
+@app.get("/api/market-calendar")
+async def get_market_calendar():
+    """Fase do pregão por bolsa e símbolos acompanhados em cada uma"""
+    status = market_calendar.status()
+    tracked = {}
+    for symbol in snapshot_service.last_requested:
+        name = market_calendar.exchange_for(symbol).name
+        tracked[name] = tracked.get(name, 0) + 1
+    for exchange in status:
+        exchange['tracked_symbols'] = tracked.get(exchange['exchange'], 0)
+    return {'exchanges': status, 'timestamp': datetime.now().isoformat()}
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    """Admitidas, rejeitadas (429) e descartadas (503) por rota"""
+    return admission.metrics()
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Métricas de acerto por nível do cache de resultados"""
+    return dict(result_cache.metrics(), symbols=symbol_index.metrics())
+
+@app.get("/api/admin/diagnostics")
+async def get_diagnostics(x_admin_token: str = Header(None)):
+    """RSS, gc, tamanhos de cache por subsistema e conexões abertas"""
+    require_admin(x_admin_token)
+    return diagnostics.summary()
+
+@app.get("/api/admin/diagnostics/objects")
+async def get_object_counts(top: int = 30, x_admin_token: str = Header(None)):
+    """Objetos rastreados pelo gc, por tipo"""
+    require_admin(x_admin_token)
+    return await asyncio.to_thread(diagnostics.object_counts, min(max(top, 1), 200))
+
+@app.post("/api/admin/diagnostics/tracemalloc/snapshot")
+async def take_tracemalloc_snapshot(top: int = 20, x_admin_token: str = Header(None)):
+    """Liga o tracemalloc (se preciso) e guarda um snapshot dos sites de alocação"""
+    require_admin(x_admin_token)
+    return await asyncio.to_thread(diagnostics.snapshot, min(max(top, 1), 100))
+
+@app.get("/api/admin/diagnostics/tracemalloc/diff")
+async def get_tracemalloc_diff(top: int = 20, against: str = "last", x_admin_token: str = Header(None)):
+    """Sites de alocação que mais cresceram desde o último snapshot (ou a linha de base)"""
+    require_admin(x_admin_token)
+    return await asyncio.to_thread(diagnostics.diff, min(max(top, 1), 100), against)
+
+@app.post("/api/admin/diagnostics/tracemalloc/stop")
+async def stop_tracemalloc(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    diagnostics.stop_tracing()
+    return {'tracemalloc': False}
+
+@app.get("/api/symbols/search")
+async def search_symbols(q: str = "", limit: int = 10):
+    """Autocomplete de símbolos pelo cadastro local (ticker ou nome)"""
+    results = symbol_index.search(q, min(max(limit, 1), 50))
+    return {'query': q, 'results': results}
+
+async def custom_tech_analysis(symbol: str, indicators: str) -> Dict:
+    """Só os indicadores pedidos, sobre as barras já em memória (cache por barra + spec)"""
+    try:
+        spec = canonical_spec(indicators)
+    except ValueError as e:
+        return {'symbol': symbol, 'error': str(e), 'success': False}
+    bars = price_store.get(symbol)
+    if bars is None or len(bars) == 0:
+        return {'symbol': symbol, 'error': f'Dados de {symbol} em atualização, tente novamente em instantes',
+                'success': False, 'pending': True}
+
+    def compute():
+        data = bars.to_frame()
+        values = tech_analyzer.calculate_indicators(data, spec)
+        patterns = tech_analyzer.detect_patterns(data)
+        return {'symbol': symbol.upper(), 'indicators': values, 'patterns': patterns,
+                'signals': tech_analyzer.generate_signals(values, patterns), 'currency': currency_of(symbol),
+                'last_bar': bars.last_timestamp.isoformat(), 'updated_at': datetime.now().isoformat(),
+                'success': True}
+
+    version = bar_version(bars.last_timestamp, bars.close[-1], bars.volume[-1])
+    key = make_key('indicators', symbol, '1d', version, spec)
+    result = await result_cache.get_or_compute(key, lambda: asyncio.to_thread(compute))
+    return dict(result, indicator_spec=spec)
+
 @app.get("/api/tech-analysis/{symbol}")
-async def get_tech_analysis(symbol: str):
-    """Análise técnica com indicadores reais"""
+async def get_tech_analysis(symbol: str, indicators: str = None):
+    """Análise técnica com indicadores reais (?indicators=rsi:14,sma:20,bb:20:2)"""
     try:
-        analysis = tech_analyzer.analyze(symbol)
-        return analysis
+        rejected = rejected_symbol(symbol)
+        if rejected:
+            return rejected
+        snapshot_service.touch(symbol)
+        if indicators:
+            return await custom_tech_analysis(symbol, indicators)
+        snapshot = snapshot_service.get(symbol)
+        if snapshot is None:
+            return {'symbol': symbol, 'error': f'Dados de {symbol} em atualização, tente novamente em instantes',
+                    'success': False, 'pending': True}
+        if not snapshot.get('success'):
+            return {'error': snapshot['error'], 'success': False}
+        return {
+            'symbol': snapshot['symbol'],
+            'indicators': snapshot['indicators'],
+            'signals': snapshot['signals'],
+            'patterns': snapshot.get('patterns', []),
+            'currency': currency_of(snapshot['symbol']),
+            'last_bar': snapshot.get('last_bar'),
+            'updated_at': snapshot['updated_at'],
+            'success': True
+        }
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/api/charts/{symbol}")
+async def get_chart(symbol: str, chart: str = "price", interval: str = "1d", bars: int = CHART_BARS):
+    """Figure Plotly pronto (JSON), montado uma vez por barra nova e compartilhado entre sessões"""
+    if chart not in CHART_BUILDERS:
+        return {'error': f"Gráfico desconhecido: {chart} (disponíveis: {', '.join(CHART_BUILDERS)})", 'success': False}
+    # Só os intervalos mantidos no PriceStore: os demais ficariam pendentes para sempre
+    intervals = ['1d'] + ([ingestion.bar_builder.interval] if ingestion is not None else [])
+    if interval not in intervals:
+        return {'error': f"Intervalo indisponível para gráficos: {interval} (disponíveis: {', '.join(intervals)})",
+                'success': False}
+    rejected = rejected_symbol(symbol)
+    if rejected:
+        return rejected
+    snapshot_service.touch(symbol)
+    series = price_store.get(symbol, interval)
+    if series is None or len(series) == 0:
+        return {'symbol': symbol, 'error': f'Dados de {symbol} em atualização, tente novamente em instantes',
+                'success': False, 'pending': True}
+    bars = max(10, min(bars, CHART_MAX_BARS))
+    symbol = symbol.upper()
+    version = bar_version(series.last_timestamp, series.close[-1], series.volume[-1])
+    key = make_key('chart', symbol, interval, version, {'chart': chart, 'bars': bars})
+    return await result_cache.get_or_compute(key, lambda: asyncio.to_thread(
+        build_chart, series, symbol, chart, bars, interval, currency_of(symbol)))
+
+@app.get("/api/asof/{symbol}")
+async def get_asof(symbol: str, at: str, indicators: str = None, interval: str = "1d"):
+    """Indicadores, padrões e sinais como estavam em cada instante (?at=2024-03-15T10:30,2024-03-18)
+
+    Instantes anteriores às barras em memória (ou intervalos fora do PriceStore) são buscados no provedor.
+    """
+    instants = [value.strip() for value in at.split(',') if value.strip()]
+    if not instants:
+        return {'error': 'Informe ao menos um instante em at', 'success': False}
+    if len(instants) > ASOF_MAX_TIMESTAMPS:
+        return {'error': f'Máximo de {ASOF_MAX_TIMESTAMPS} instantes por consulta', 'success': False}
+    rejected = rejected_symbol(symbol)
+    if rejected:
+        return rejected
+    spec = indicators or DEFAULT_SPEC
+    try:
+        answer = await asyncio.to_thread(asof_service.query, symbol, instants, spec, interval)
+    except ValueError as e:
+        return {'symbol': symbol, 'error': str(e), 'success': False}
+    except HistoryFetchError as e:
+        # Backfill incompleto não vira resultado: nada é guardado e a próxima consulta tenta de novo
+        return {'symbol': symbol, 'error': str(e), 'success': False}
+    if answer is None:
+        return {'symbol': symbol, 'error': f'Sem histórico de {symbol} ({interval})', 'success': False}
+    for result in answer['results']:
+        if 'indicators' not in result:
+            continue
+        if not indicators:
+            # Mesmo formato de calculate_indicators sem spec (rsi, bb_upper, ...)
+            values = result['indicators']
+            result['indicators'] = {'current_price': values['current_price'],
+                                    **{name: values.get(column) for column, name in LEGACY_NAMES.items()}}
+        result['signals'] = tech_analyzer.generate_signals(result['indicators'], result['patterns'])
+    return {
+        'symbol': symbol.upper(),
+        'interval': interval,
+        'indicator_spec': canonical_spec(spec),
+        **answer,
+        'success': True
+    }
+
+@app.get("/api/stream/tech-analysis/{symbol}")
+async def stream_tech_analysis(symbol: str, request: Request, format: str = "sse", last_event_id: str = None):
+    """Stream de indicadores/sinais: snapshot completo e depois só deltas (SSE ou NDJSON)"""
+    last_event_id = request.headers.get('last-event-id') or last_event_id
+    formatter = format_ndjson if format == "ndjson" else format_sse
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+
+    async def event_stream():
+        async for event in stream_hub.listen(symbol, last_event_id):
+            if await request.is_disconnected():
+                break
+            yield formatter(event)
+
+    return StreamingResponse(event_stream(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/export/{symbol}")
+async def export_history(symbol: str, start: str, end: str = None, interval: str = "1d",
+                         format: str = "csv", indicators: str = None):
+    """Exporta OHLCV + indicadores em blocos (CSV, NDJSON ou Parquet)"""
+    try:
+        if format not in EXPORT_FORMATS:
+            return {"error": f"Formato inválido: {format} (use {', '.join(EXPORT_FORMATS)})"}
+        if format == "parquet" and pq is None:
+            return {"error": "Exportação Parquet requer pyarrow instalado"}
+        if indicators:
+            parse_indicator_spec(indicators)
+        start_date = datetime.fromisoformat(start)
+        end_date = datetime.fromisoformat(end) if end else None
+    except ValueError as e:
+        return {"error": str(e)}
+    rejected = rejected_symbol(symbol)
+    if rejected:
+        return rejected
+
+    filename = f"{symbol}_{interval}_{start}.{format}"
+    return StreamingResponse(
+        iter_export(symbol, start_date, end_date, interval, indicators, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/api/company-insights/{symbol}")
 async def get_company_insights(symbol: str):
     """Insights profundos sobre empresas"""
     try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
-        history = stock.history(period="1mo")
+        rejected = rejected_symbol(symbol)
+        if rejected:
+            return rejected
+        info = fundamentals_store.get(symbol)
+        if info is None:
+            fundamentals_store.request(symbol)
+            info = {}
+        snapshot_service.touch(symbol)
+        snapshot = snapshot_service.get(symbol)
         
-        # Análise de preço
-        if not history.empty:
-            price_change = ((history['Close'][-1] - history['Close'][0]) / history['Close'][0]) * 100
-            volume_trend = "HIGH" if history['Volume'].mean() > 1000000 else "LOW"
+        # Análise de preço (a partir do snapshot compartilhado)
+        if snapshot and snapshot.get('success'):
+            current_price = snapshot['price']
+            price_change = snapshot['month_change_percent']
+            volume_state = anomaly_detector.state(symbol)
+            volume_trend = volume_state['classification'] if volume_state else "UNKNOWN"
         else:
+            current_price = None
             price_change = 0
             volume_trend = "UNKNOWN"
         
@@ -284,7 +733,7 @@ async def get_company_insights(symbol: str):
             "company_name": info.get('longName', symbol),
             "sector": info.get('sector', 'N/A'),
             "market_cap": info.get('marketCap', 0),
-            "current_price": info.get('currentPrice', info.get('regularMarketPrice', 0)),
+            "current_price": current_price,
             "price_change_percent": price_change,
             "volume_trend": volume_trend,
             "analysis_score": calculate_investment_score(info),
@@ -292,6 +741,7 @@ async def get_company_insights(symbol: str):
             "risk_factors": identify_risk_factors(info),
             "competitor_analysis": analyze_competitors(symbol),
             "investment_recommendation": generate_investment_recommendation(price_change),
+            "fundamentals_updated_at": fundamentals_store.fetched_at(symbol).isoformat() if info else None,
             "timestamp": datetime.now().isoformat()
         }
         return insights
@@ -323,14 +773,42 @@ async def get_social_intelligence():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/api/predictions")
+async def get_batch_predictions(symbols: str):
+    """Previsões de vários símbolos (?symbols=AAPL,MSFT) resolvidas em um único lote"""
+    names = list(dict.fromkeys(s.strip().upper() for s in symbols.split(',') if s.strip()))
+    if not names:
+        return {'error': 'Informe ao menos um símbolo em symbols', 'success': False}
+    if len(names) > FORECAST_MAX_SYMBOLS:
+        return {'error': f'Máximo de {FORECAST_MAX_SYMBOLS} símbolos por consulta', 'success': False}
+    # Recusados pelo cadastro voltam na posição deles, sem touch nem busca no provedor
+    rejected = {name: rejected_symbol(name) for name in names}
+    accepted = [name for name in names if rejected[name] is None]
+    for name in accepted:
+        snapshot_service.touch(name)
+    predicted = dict(zip(accepted, await asyncio.gather(*(forecaster.predict(name) for name in accepted))))
+    results = [rejected[name] or predicted[name] for name in names]
+    return {'predictions': results, 'metrics': forecaster.metrics()}
+
 @app.get("/api/predictions/{symbol}")
 async def get_predictions(symbol: str):
     """Previsões para símbolo específico"""
-    return oracle.predict_market_movement(symbol)
+    try:
+        rejected = rejected_symbol(symbol)
+        if rejected:
+            return rejected
+        snapshot_service.touch(symbol)
+        return await forecaster.predict(symbol)
+    except Exception as e:
+        return {"error": f"Erro na previsão: {str(e)}"}
 
 @app.get("/api/portfolio-analysis")
-async def analyze_portfolio():
-    """Análise de portfolio"""
+async def analyze_portfolio(holdings: str = None, currency: str = None):
+    """Análise de portfolio numa moeda comum (?holdings=AAPL:0.5,PETR4.SA:0.5&currency=BRL)"""
+    currency = (currency or FX_BASE_CURRENCY).upper()
+    error = fx_service.validate_currency(currency)
+    if error:
+        return {'error': error, 'success': False}
     sample_portfolio = [
         {"symbol": "AAPL", "weight": 0.25},
         {"symbol": "MSFT", "weight": 0.20},
@@ -338,12 +816,43 @@ async def analyze_portfolio():
         {"symbol": "AMZN", "weight": 0.20},
         {"symbol": "TSLA", "weight": 0.20}
     ]
-    
+    if holdings:
+        try:
+            sample_portfolio = [
+                {"symbol": symbol.strip().upper(), "weight": float(weight)}
+                for symbol, _, weight in (item.partition(':') for item in holdings.split(',') if item)
+            ]
+        except ValueError:
+            return {'error': 'Formato de holdings inválido (use SÍMBOLO:peso,...)', 'success': False}
+        weights = [h['weight'] for h in sample_portfolio]
+        if not weights or not all(np.isfinite(weights)) or sum(weights) <= 0:
+            return {'error': 'Pesos inválidos: precisam ser números finitos com soma positiva', 'success': False}
+    for holding in sample_portfolio:
+        snapshot_service.touch(holding['symbol'])
+    fx_service.ensure_pairs()
+
+    # Visão convertida compartilhada (cache por moeda/janela): aqui só se selecionam colunas
+    closes = fx_service.converted(currency, window=PORTFOLIO_WINDOW)
+    symbols = [h['symbol'] for h in sample_portfolio]
+    # Sem coluna (barras não chegaram) ou coluna toda NaN (câmbio da moeda ainda não carregado)
+    missing = [s for s in symbols if s not in closes.columns or closes[s].isna().all()]
+    for holding in sample_portfolio:
+        holding['currency'] = currency_of(holding['symbol'])
+        if holding['symbol'] in closes.columns:
+            price = closes[holding['symbol']].iloc[-1]
+            holding['price'] = None if pd.isna(price) else round(float(price), 2)
+
+    weights = np.array([h['weight'] for h in sample_portfolio], dtype=np.float64)
+    weights = weights / weights.sum()
     analysis = {
         "portfolio": sample_portfolio,
-        "total_risk_score": random.uniform(0.1, 0.8),
-        "diversification_score": random.uniform(0.5, 0.95),
-        "expected_return": random.uniform(5, 25),
+        "currency": currency,
+        # Preenchidos com os retornos quando todas as séries estão disponíveis
+        "total_risk_score": None,
+        "expected_return": None,
+        "volatility": None,
+        # 1 - Herfindahl dos pesos: 0 = concentrado num ativo
+        "diversification_score": round(float(1 - (weights ** 2).sum()), 3),
         "sector_allocation": {
             "Technology": 0.45,
             "Consumer Cyclical": 0.25,
@@ -357,7 +866,19 @@ async def analyze_portfolio():
         ],
         "timestamp": datetime.now().isoformat()
     }
-    
+    if missing:
+        analysis.update(pending=True, missing=missing)
+        return analysis
+
+    returns = closes[symbols].pct_change(fill_method=None).iloc[1:].dropna()
+    portfolio_returns = returns.to_numpy() @ weights
+    if len(portfolio_returns) > 1:
+        volatility = float(portfolio_returns.std() * np.sqrt(252))
+        analysis.update(
+            expected_return=round(float(portfolio_returns.mean() * 252 * 100), 2),
+            volatility=round(volatility * 100, 2),
+            total_risk_score=round(min(volatility / 0.5, 1.0), 3)
+        )
     return analysis
 
 # Funções auxiliares
@@ -406,14 +927,20 @@ def identify_risk_factors(info):
     return random.sample(risks, 2)
 
 def analyze_competitors(symbol):
-    competitors = {
-        "AAPL": ["MSFT", "GOOGL", "SAMSUNG"],
-        "MSFT": ["AAPL", "GOOGL", "AMZN"],
-        "GOOGL": ["MSFT", "AAPL", "META"],
-        "AMZN": ["WMT", "TGT", "EBAY"],
-        "TSLA": ["F", "GM", "NIO"]
-    }
-    return competitors.get(symbol, [f"{symbol}_COMP1", f"{symbol}_COMP2"])
+    # Pares pré-calculados (correlação de retornos + setor)
+    peers = peer_index.peers(symbol)
+    if peers:
+        return peers
+
+    # Sem histórico suficiente ainda: pares do mesmo setor no store de fundamentos
+    info = fundamentals_store.get(symbol)
+    if not info or not info.get('sector'):
+        return []
+    same_sector = [
+        other for other in fundamentals_store.symbols()
+        if other != symbol.upper() and fundamentals_store.get(other).get('sector') == info['sector']
+    ]
+    return [{"symbol": other, "sector": info['sector']} for other in same_sector[:3]]
 
 def generate_influencers(topic):
     return [f"influencer_{topic}_{i}" for i in range(1, 3)]
@@ -469,4 +996,4 @@ if __name__ == "__main__":
     import uvicorn
     print("🚀 Iniciando Market Intelligence Pro Server...")
     print("📊 Dashboard: http://localhost:8000/docs")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE)
@@ -6,6 +6,7 @@ import ta
 from datetime import datetime
 import logging
 import random
+from universes import BASE_PRICES
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -24,12 +25,7 @@ app.add_middleware(
 class TechnicalAnalysis:
     def generate_simulated_data(self, symbol: str):
         """Gera dados simulados para demonstração"""
-        base_prices = {
-            'PETR4.SA': 35.50, 'VALE3.SA': 68.20, 'ITSA4.SA': 10.15,
-            'AAPL': 185.00, 'TSLA': 245.50, 'MSFT': 410.75
-        }
-        
-        base_price = base_prices.get(symbol, 50.00)
+        base_price = BASE_PRICES.get(symbol, 50.00)
         
         # Simular variação de preço
         current_price = base_price * (1 + random.uniform(-0.1, 0.1))
@@ -0,0 +1,132 @@
+import json
+import os
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+MARKET_CALENDAR_FILE = os.getenv(
+    'MARKET_CALENDAR_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'market_calendar.json')
+)
+# Quantos dias procurar o pregão anterior/seguinte (feriados emendados + fim de semana)
+SEARCH_DAYS = 14
+
+
+def _parse_time(value: str) -> Tuple[dtime, int]:
+    """'HH:MM' -> (hora, dias extras); '24:00' vira meia-noite do dia seguinte"""
+    hours, minutes = (int(part) for part in value.split(':'))
+    return dtime(hours % 24, minutes), hours // 24
+
+
+class ExchangeCalendar:
+    """Pregão de uma bolsa: horário local, dias úteis, feriados e fechamentos antecipados"""
+
+    def __init__(self, name: str, timezone: str, open: str, close: str,
+                 weekdays: Iterable[int] = (0, 1, 2, 3, 4), holidays: Iterable[str] = (),
+                 early_closes: Optional[Dict[str, str]] = None, after_close_minutes: float = 30,
+                 suffixes: Iterable[str] = (), symbols: Iterable[str] = (),
+                 concurrency: int = 2, rate: float = 1.0):
+        self.name = name
+        self.tz = ZoneInfo(timezone)
+        self.open = _parse_time(open)
+        self.close = _parse_time(close)
+        self.weekdays = set(weekdays)
+        self.holidays = {date.fromisoformat(d) for d in holidays}
+        self.early_closes = {date.fromisoformat(d): _parse_time(t) for d, t in (early_closes or {}).items()}
+        self.after_close = timedelta(minutes=after_close_minutes)
+        self.suffixes = tuple(s.upper() for s in suffixes)
+        self.symbols = {s.upper() for s in symbols}
+        # Limites do agendador (sobrescritos por SCHEDULER_<BOLSA>_CONCURRENCY / _RATE)
+        self.concurrency = int(os.getenv(f'SCHEDULER_{name}_CONCURRENCY', str(concurrency)))
+        self.rate = float(os.getenv(f'SCHEDULER_{name}_RATE', str(rate)))
+
+    def _at(self, day: date, moment: Tuple[dtime, int]) -> datetime:
+        clock, extra_days = moment
+        return datetime.combine(day + timedelta(days=extra_days), clock, tzinfo=self.tz)
+
+    def session(self, day: date) -> Optional[Tuple[datetime, datetime]]:
+        """(abertura, fechamento) do pregão no dia local, ou None se não há pregão"""
+        if day.weekday() not in self.weekdays or day in self.holidays:
+            return None
+        return self._at(day, self.open), self._at(day, self.early_closes.get(day, self.close))
+
+    def _sessions(self, now: datetime, step: int):
+        day = now.date()
+        for offset in range(SEARCH_DAYS):
+            session = self.session(day + timedelta(days=offset * step))
+            if session is not None:
+                yield session
+
+    def phase(self, now: Optional[float] = None) -> str:
+        """'open', 'after_close' (janela pós-fechamento) ou 'closed'"""
+        local = datetime.fromtimestamp(now or time.time(), self.tz)
+        for opens, closes in self._sessions(local, -1):
+            if opens <= local < closes:
+                return 'open'
+            if closes <= local < closes + self.after_close:
+                return 'after_close'
+            if closes + self.after_close <= local:
+                break
+        return 'closed'
+
+    def is_active(self, now: Optional[float] = None) -> bool:
+        return self.phase(now) != 'closed'
+
+    def last_settled(self, now: Optional[float] = None) -> float:
+        """Instante (epoch) em que terminou a janela pós-fechamento do último pregão"""
+        now = now or time.time()
+        local = datetime.fromtimestamp(now, self.tz)
+        for _, closes in self._sessions(local, -1):
+            if closes + self.after_close <= local:
+                return (closes + self.after_close).timestamp()
+        return 0.0
+
+    def next_open(self, now: Optional[float] = None) -> Optional[float]:
+        local = datetime.fromtimestamp(now or time.time(), self.tz)
+        for opens, _ in self._sessions(local, 1):
+            if opens > local:
+                return opens.timestamp()
+        return None
+
+    def matches(self, symbol: str) -> bool:
+        return symbol in self.symbols or any(symbol.endswith(s) for s in self.suffixes)
+
+
+class MarketCalendar:
+    """Calendário das bolsas lido de data/market_calendar.json"""
+
+    def __init__(self, exchanges: List[ExchangeCalendar], default_exchange: str):
+        self.exchanges = {exchange.name: exchange for exchange in exchanges}
+        self.default = self.exchanges[default_exchange]
+        self._by_symbol: Dict[str, ExchangeCalendar] = {}
+
+    @classmethod
+    def load(cls, path: str = MARKET_CALENDAR_FILE) -> 'MarketCalendar':
+        with open(path) as f:
+            config = json.load(f)
+        exchanges = [ExchangeCalendar(name, **spec) for name, spec in config['exchanges'].items()]
+        return cls(exchanges, config.get('default_exchange', exchanges[0].name))
+
+    def exchange_for(self, symbol: str) -> ExchangeCalendar:
+        symbol = symbol.upper()
+        exchange = self._by_symbol.get(symbol)
+        if exchange is None:
+            exchange = next((e for e in self.exchanges.values() if e.matches(symbol)), self.default)
+            self._by_symbol[symbol] = exchange
+        return exchange
+
+    def status(self, now: Optional[float] = None) -> List[Dict]:
+        now = now or time.time()
+        result = []
+        for exchange in self.exchanges.values():
+            next_open = exchange.next_open(now)
+            result.append({
+                'exchange': exchange.name,
+                'phase': exchange.phase(now),
+                'local_time': datetime.fromtimestamp(now, exchange.tz).isoformat(),
+                'next_open': datetime.fromtimestamp(next_open, exchange.tz).isoformat() if next_open else None,
+                'concurrency': exchange.concurrency,
+                'rate': exchange.rate
+            })
+        return result
@@ -0,0 +1,232 @@
+import asyncio
+import contextlib
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from market_calendar import MarketCalendar
+from prefetch import DemandTracker, RateLimiter
+from price_store import PriceStore
+from result_cache import ResultCache, bar_version, make_key
+
+logger = logging.getLogger(__name__)
+
+# Intervalos de atualização (segundos)
+HOT_INTERVAL = float(os.getenv('SNAPSHOT_HOT_INTERVAL', '15'))
+COLD_INTERVAL = float(os.getenv('SNAPSHOT_COLD_INTERVAL', '300'))
+# Demanda (requisições com decaimento) a partir da qual um símbolo é "quente"
+HOT_SCORE = float(os.getenv('SNAPSHOT_HOT_SCORE', '0.5'))
+# Símbolos sem demanda por mais tempo que isso deixam de ser acompanhados
+IDLE_TTL = float(os.getenv('SNAPSHOT_IDLE_TTL', '3600'))
+MAX_CONCURRENCY = int(os.getenv('SNAPSHOT_MAX_CONCURRENCY', '4'))
+
+# Pregões aproximados em um mês
+MONTH_BARS = 21
+
+
+class MarketSnapshotService:
+    """Snapshot em memória por símbolo, atualizado em background"""
+
+    def __init__(self, analyzer, hot_interval: float = HOT_INTERVAL,
+                 cold_interval: float = COLD_INTERVAL, hot_score: float = HOT_SCORE,
+                 idle_ttl: float = IDLE_TTL, max_concurrency: int = MAX_CONCURRENCY,
+                 demand: Optional[DemandTracker] = None, rate_limiter: Optional[RateLimiter] = None,
+                 price_store: Optional[PriceStore] = None, result_cache: Optional[ResultCache] = None,
+                 calendar: Optional[MarketCalendar] = None):
+        self.analyzer = analyzer
+        self.calendar = calendar
+        self.result_cache = result_cache
+        self.price_store = price_store if price_store is not None else PriceStore()
+        self.hot_interval = hot_interval
+        self.cold_interval = cold_interval
+        self.hot_score = hot_score
+        self.idle_ttl = idle_ttl
+        self.max_concurrency = max_concurrency
+        self.demand = demand or DemandTracker()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.snapshots: Dict[str, Dict] = {}
+        self.refreshed_at: Dict[str, float] = {}
+        self.last_requested: Dict[str, float] = {}
+        self._inflight = set()
+        self._listeners = []
+        self._wake: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Limites por bolsa: (semáforo, rate limiter)
+        self._exchange_limits: Dict[str, tuple] = {}
+
+    # ----- leitura (O(1), nunca busca dados) -----
+    def get(self, symbol: str) -> Optional[Dict]:
+        """Retorna o último snapshot do símbolo, se existir"""
+        return self.snapshots.get(symbol.upper())
+
+    def touch(self, symbol: str):
+        """Registra demanda pelo símbolo e agenda a primeira atualização"""
+        symbol = symbol.upper()
+        self.demand.record(symbol)
+        self.track(symbol)
+
+    def track(self, symbol: str):
+        """Mantém o símbolo acompanhado sem contar como demanda"""
+        symbol = symbol.upper()
+        is_new = symbol not in self.last_requested
+        self.last_requested[symbol] = time.time()
+        if is_new and self._wake is not None:
+            self._wake.set()
+
+    def subscribe(self, callback):
+        """callback(symbol, snapshot) a cada snapshot atualizado"""
+        self._listeners.append(callback)
+
+    def top_movers(self, limit: int = 3) -> List[Dict]:
+        """Maiores altas do dia entre os símbolos acompanhados"""
+        movers = [
+            {"symbol": s['symbol'], "change": s['change_percent'], "price": s['price']}
+            for s in self.snapshots.values() if s.get('success') and not self.price_store.is_auxiliary(s['symbol'])
+        ]
+        movers.sort(key=lambda m: m['change'], reverse=True)
+        return movers[:limit]
+
+    # ----- agendamento -----
+    def is_hot(self, symbol: str, now: Optional[float] = None) -> bool:
+        return self.demand.score(symbol, now) >= self.hot_score
+
+    def interval_for(self, symbol: str, now: Optional[float] = None) -> float:
+        return self.hot_interval if self.is_hot(symbol, now) else self.cold_interval
+
+    def is_due(self, symbol: str, now: Optional[float] = None, lead: float = 0.0) -> bool:
+        """Expirado (com antecedência lead); com a bolsa fechada, só uma vez após o fechamento"""
+        now = now or time.time()
+        refreshed = self.refreshed_at.get(symbol, 0)
+        if self.calendar is not None:
+            exchange = self.calendar.exchange_for(symbol)
+            if not exchange.is_active(now):
+                return refreshed < exchange.last_settled(now)
+        return now - refreshed >= self.interval_for(symbol, now) - lead
+
+    def due_symbols(self, now: Optional[float] = None) -> List[str]:
+        """Símbolos cujo snapshot expirou, quentes primeiro"""
+        now = now or time.time()
+        due = [s for s in self.last_requested if s not in self._inflight and self.is_due(s, now)]
+        due.sort(key=lambda s: self.demand.score(s, now), reverse=True)
+        return due
+
+    def evict_idle(self, now: Optional[float] = None):
+        """Para de acompanhar símbolos sem demanda recente"""
+        now = now or time.time()
+        for symbol in [s for s, t in self.last_requested.items() if now - t > self.idle_ttl]:
+            self.untrack(symbol)
+
+    def untrack(self, symbol: str):
+        """Deixa de acompanhar o símbolo e libera seus dados"""
+        symbol = symbol.upper()
+        self.last_requested.pop(symbol, None)
+        self.snapshots.pop(symbol, None)
+        self.refreshed_at.pop(symbol, None)
+        # Sem isso o prefetcher volta a acompanhar o símbolo pela demanda acumulada
+        self.demand.forget(symbol)
+        self.price_store.remove(symbol)
+
+    # ----- atualização -----
+    async def build_cached(self, symbol: str, data) -> Dict:
+        """Snapshot calculado uma vez por versão da última barra (compartilhado entre réplicas)"""
+        if data.empty or self.result_cache is None:
+            return await asyncio.to_thread(self.build_snapshot, symbol, data)
+        last = data.iloc[-1]
+        key = make_key('snapshot', symbol, '1d', bar_version(data.index[-1], last['Close'], last['Volume']),
+                       getattr(self.analyzer, 'indicator_spec', None))
+        return await self.result_cache.get_or_compute(
+            key, lambda: asyncio.to_thread(self.build_snapshot, symbol, data)
+        )
+
+    def build_snapshot(self, symbol: str, data) -> Dict:
+        """Monta o snapshot a partir do histórico (bloqueante, roda em thread)"""
+        if data.empty:
+            return {'symbol': symbol, 'error': f'Dados não encontrados para {symbol}', 'success': False,
+                    'updated_at': datetime.now().isoformat()}
+
+        close = data['Close']
+        volume = data['Volume']
+        price = float(close.iloc[-1])
+        previous_close = float(close.iloc[-2]) if len(close) > 1 else price
+        month_ago = float(close.iloc[-MONTH_BARS - 1]) if len(close) > MONTH_BARS else float(close.iloc[0])
+
+        indicators = self.analyzer.calculate_indicators(data)
+        patterns = self.analyzer.detect_patterns(data)
+        signals = self.analyzer.generate_signals(indicators, patterns)
+
+        return {
+            'symbol': symbol,
+            'price': round(price, 2),
+            'previous_close': round(previous_close, 2),
+            'change': round(price - previous_close, 2),
+            'change_percent': round((price / previous_close - 1) * 100, 2) if previous_close else 0.0,
+            'volume': int(volume.iloc[-1]),
+            'month_change_percent': (price / month_ago - 1) * 100 if month_ago else 0.0,
+            'avg_volume_1mo': float(volume.iloc[-MONTH_BARS:].mean()),
+            'indicators': indicators,
+            'signals': signals,
+            'patterns': patterns,
+            'last_bar': data.index[-1].isoformat(),
+            'updated_at': datetime.now().isoformat(),
+            'success': True
+        }
+
+    async def refresh(self, symbol: str):
+        """Atualiza o snapshot de um símbolo sem bloquear o event loop"""
+        if symbol in self._inflight:
+            return
+        self._inflight.add(symbol)
+        try:
+            limits = self._limits_for(symbol)
+            if limits is not None:
+                await limits[1].acquire()
+            await self.rate_limiter.acquire()
+            async with limits[0] if limits is not None else contextlib.nullcontext():
+                async with self._get_semaphore():
+                    data = await asyncio.to_thread(self.analyzer.get_stock_data, symbol)
+            snapshot = await self.build_cached(symbol, data)
+            # Símbolo pode ter sido despejado enquanto buscávamos
+            if symbol in self.last_requested:
+                self.snapshots[symbol] = snapshot
+                self.price_store.update(symbol, data)
+                for callback in self._listeners:
+                    callback(symbol, snapshot)
+        except Exception as e:
+            logger.warning(f"Erro ao atualizar snapshot de {symbol}: {e}")
+        finally:
+            if symbol in self.last_requested:
+                self.refreshed_at[symbol] = time.time()
+            self._inflight.discard(symbol)
+
+    async def run_scheduler(self, tick: float = 1.0):
+        """Loop de atualização: quentes a cada hot_interval, frios a cada cold_interval"""
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                self.evict_idle()
+                for symbol in self.due_symbols():
+                    asyncio.create_task(self.refresh(symbol))
+            except Exception as e:
+                logger.error(f"Erro no agendador de snapshots: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=tick)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _limits_for(self, symbol: str):
+        """Semáforo e orçamento de chamadas da bolsa do símbolo (None sem calendário)"""
+        if self.calendar is None:
+            return None
+        exchange = self.calendar.exchange_for(symbol)
+        if exchange.name not in self._exchange_limits:
+            self._exchange_limits[exchange.name] = (asyncio.Semaphore(exchange.concurrency),
+                                                    RateLimiter(exchange.rate))
+        return self._exchange_limits[exchange.name]
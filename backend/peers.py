@@ -0,0 +1,198 @@
+import asyncio
+import os
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PEER_TOP_K = int(os.getenv('PEER_TOP_K', '5'))
+# Janela de retornos diários usada na correlação
+PEER_WINDOW = int(os.getenv('PEER_WINDOW', '120'))
+PEER_MIN_OVERLAP = int(os.getenv('PEER_MIN_OVERLAP', '40'))
+PEER_REBUILD_INTERVAL = float(os.getenv('PEER_REBUILD_INTERVAL', str(6 * 3600)))
+# Bônus de similaridade por metadados setoriais
+SECTOR_WEIGHT = 0.15
+INDUSTRY_WEIGHT = 0.15
+
+# Pregões aproximados em um mês
+MONTH_BARS = 21
+
+
+class PeerIndex:
+    """Índice de pares por correlação de retornos + setor, com top-K pré-calculado"""
+
+    def __init__(self, store, fundamentals=None, k: int = PEER_TOP_K, window: int = PEER_WINDOW,
+                 min_overlap: int = PEER_MIN_OVERLAP):
+        self.store = store
+        self.fundamentals = fundamentals
+        self.k = k
+        self.window = window
+        self.min_overlap = min_overlap
+        self.symbols: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self.returns = pd.DataFrame()
+        self.corr = np.empty((0, 0), dtype=np.float32)
+        self.neighbors: Dict[str, List[int]] = {}
+
+    # ----- similaridade -----
+    def _meta(self, symbol: str) -> Dict:
+        info = self.fundamentals.get(symbol) if self.fundamentals is not None else None
+        return info or {}
+
+    def _sector_bonus(self, symbol: str, others: List[str]) -> np.ndarray:
+        meta = self._meta(symbol)
+        bonus = np.zeros(len(others), dtype=np.float32)
+        if not meta.get('sector'):
+            return bonus
+        for j, other in enumerate(others):
+            other_meta = self._meta(other)
+            if other_meta.get('sector') == meta['sector']:
+                bonus[j] += SECTOR_WEIGHT
+                if meta.get('industry') and other_meta.get('industry') == meta['industry']:
+                    bonus[j] += INDUSTRY_WEIGHT
+        return bonus
+
+    def _similarity_row(self, i: int) -> np.ndarray:
+        row = np.nan_to_num(self.corr[i], nan=-1.0) + self._sector_bonus(self.symbols[i], self.symbols)
+        row[i] = -np.inf
+        return row
+
+    def _pair_similarity(self, i: int, j: int) -> float:
+        corr = self.corr[i, j]
+        bonus = self._sector_bonus(self.symbols[i], [self.symbols[j]])[0]
+        return (-1.0 if np.isnan(corr) else float(corr)) + float(bonus)
+
+    def _top_k(self, i: int) -> List[int]:
+        row = self._similarity_row(i)
+        candidates = np.flatnonzero(~np.isnan(self.corr[i]))
+        candidates = candidates[candidates != i]
+        if len(candidates) == 0:
+            return []
+        k = min(self.k, len(candidates))
+        best = candidates[np.argpartition(-row[candidates], k - 1)[:k]]
+        return best[np.argsort(-row[best])].tolist()
+
+    # ----- construção completa (offline) -----
+    def _returns_matrix(self) -> pd.DataFrame:
+        closes = self.store.matrix('Close')
+        if closes.empty:
+            return closes
+        return closes.pct_change(fill_method=None).iloc[1:].tail(self.window)
+
+    def _correlate(self, returns: pd.DataFrame) -> np.ndarray:
+        return returns.corr(min_periods=self.min_overlap).to_numpy(dtype=np.float32)
+
+    def _install(self, returns: pd.DataFrame, corr: np.ndarray):
+        self.returns = returns
+        self.symbols = list(returns.columns)
+        self._pos = {s: i for i, s in enumerate(self.symbols)}
+        self.corr = corr
+        self.neighbors = {s: self._top_k(i) for i, s in enumerate(self.symbols)}
+        logger.info(f"Índice de pares reconstruído: {len(self.symbols)} símbolos")
+
+    def rebuild(self):
+        """Recalcula toda a matriz de correlação e as listas de vizinhos"""
+        returns = self._returns_matrix()
+        if not returns.empty:
+            self._install(returns, self._correlate(returns))
+
+    async def run(self, interval: float = PEER_REBUILD_INTERVAL):
+        """Reconstrução periódica completa; barras novas entram incrementalmente"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                returns = self._returns_matrix()
+                if not returns.empty:
+                    corr = await asyncio.to_thread(self._correlate, returns)
+                    self._install(returns, corr)
+            except Exception as e:
+                logger.error(f"Erro ao reconstruir índice de pares: {e}")
+
+    # ----- atualização incremental -----
+    def on_bars(self, symbol: str, interval: str, bars, new_bars: int):
+        """Assinante do PriceStore: atualiza só a linha/coluna do símbolo"""
+        if interval != '1d' or new_bars == 0:
+            return
+        series = bars.tail(self.window + 1).to_series('Close').pct_change(fill_method=None).iloc[1:]
+        returns = self.returns
+        if symbol in returns.columns:
+            returns = returns.drop(columns=symbol)
+        returns = returns.join(series.rename(symbol), how='outer').tail(self.window)
+        self.returns = returns
+
+        if symbol not in self._pos:
+            n = len(self.symbols)
+            corr = np.full((n + 1, n + 1), np.nan, dtype=np.float32)
+            corr[:n, :n] = self.corr
+            self.corr = corr
+            self._pos[symbol] = n
+            self.symbols.append(symbol)
+
+        i = self._pos[symbol]
+        column = returns[self.symbols].corrwith(returns[symbol]).to_numpy(dtype=np.float32)
+        overlap = returns[self.symbols].notna().mul(returns[symbol].notna(), axis=0).sum().to_numpy()
+        column[overlap < self.min_overlap] = np.nan
+        column[i] = 1.0
+        self.corr[i, :] = column
+        self.corr[:, i] = column
+
+        self.neighbors[symbol] = self._top_k(i)
+        # Só reordena vizinhos de quem pode ter ganho ou perdido este símbolo
+        for other, j in self._pos.items():
+            if other == symbol:
+                continue
+            current = self.neighbors.get(other, [])
+            if (i in current or len(current) < self.k
+                    or self._pair_similarity(j, i) > self._pair_similarity(j, current[-1])):
+                self.neighbors[other] = self._top_k(j)
+
+    def forget(self, symbol: str):
+        """Tira do índice um símbolo removido do PriceStore (linha/coluna e listas de vizinhos)"""
+        i = self._pos.get(symbol)
+        if i is None:
+            return
+        self.returns = self.returns.drop(columns=symbol, errors='ignore')
+        self.corr = np.delete(np.delete(self.corr, i, axis=0), i, axis=1)
+        del self.symbols[i]
+        self._pos = {s: j for j, s in enumerate(self.symbols)}
+        self.neighbors.pop(symbol, None)
+        # Índices acima de i descem uma posição; quem tinha o símbolo como vizinho reordena
+        for other, j in self._pos.items():
+            current = self.neighbors.get(other, [])
+            if i in current:
+                self.neighbors[other] = self._top_k(j)
+            else:
+                self.neighbors[other] = [n - 1 if n > i else n for n in current]
+
+    # ----- consulta (O(K)) -----
+    def _month_change(self, symbol: str) -> Optional[float]:
+        bars = self.store.get(symbol)
+        if bars is None or len(bars) < 2:
+            return None
+        close = bars.close
+        base = close[-MONTH_BARS - 1] if len(close) > MONTH_BARS else close[0]
+        return float((close[-1] / base - 1) * 100) if base else None
+
+    def peers(self, symbol: str) -> List[Dict]:
+        """Pares pré-calculados com desempenho relativo em 1 mês"""
+        symbol = symbol.upper()
+        i = self._pos.get(symbol)
+        if i is None:
+            return []
+        own_change = self._month_change(symbol)
+        result = []
+        for j in self.neighbors.get(symbol, []):
+            peer = self.symbols[j]
+            change = self._month_change(peer)
+            result.append({
+                'symbol': peer,
+                'correlation': round(float(self.corr[i, j]), 4),
+                'sector': self._meta(peer).get('sector'),
+                'change_1m_percent': round(change, 2) if change is not None else None,
+                'relative_performance': round(own_change - change, 2)
+                if own_change is not None and change is not None else None
+            })
+        return result
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import math
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from universes import get_universe
+
+logger = logging.getLogger(__name__)
+
+# Meia-vida do contador de demanda (segundos)
+DEMAND_HALF_LIFE = float(os.getenv('DEMAND_HALF_LIFE', '900'))
+# Quantos símbolos manter sempre quentes
+PREFETCH_TOP_N = int(os.getenv('PREFETCH_TOP_N', '50'))
+# Antecedência em relação à expiração do snapshot (segundos)
+PREFETCH_LEAD = float(os.getenv('PREFETCH_LEAD', '3'))
+# Ritmo máximo de chamadas ao provedor de dados (por segundo)
+UPSTREAM_RATE = float(os.getenv('UPSTREAM_RATE', '2'))
+PREFETCH_UNIVERSES = [u for u in os.getenv('PREFETCH_UNIVERSES', 'ibovespa,demo').split(',') if u]
+POPULARITY_FILE = os.getenv(
+    'POPULARITY_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'popular_symbols.json')
+)
+POPULARITY_SAVE_INTERVAL = float(os.getenv('POPULARITY_SAVE_INTERVAL', '300'))
+
+
+class DemandTracker:
+    """Contador de requisições por símbolo com decaimento exponencial"""
+
+    def __init__(self, half_life: float = DEMAND_HALF_LIFE):
+        self.decay_rate = math.log(2) / half_life
+        self.scores: Dict[str, float] = {}
+        self.updated_at: Dict[str, float] = {}
+
+    def _decayed(self, symbol: str, now: float) -> float:
+        score = self.scores.get(symbol, 0.0)
+        if score:
+            score *= math.exp(-self.decay_rate * (now - self.updated_at[symbol]))
+        return score
+
+    def record(self, symbol: str, weight: float = 1.0, now: Optional[float] = None):
+        now = now or time.time()
+        self.scores[symbol] = self._decayed(symbol, now) + weight
+        self.updated_at[symbol] = now
+
+    def score(self, symbol: str, now: Optional[float] = None) -> float:
+        return self._decayed(symbol, now or time.time())
+
+    def top(self, n: int, now: Optional[float] = None) -> List[str]:
+        """Símbolos mais demandados (maior score atual primeiro)"""
+        now = now or time.time()
+        ranked = sorted(self.scores, key=lambda s: self._decayed(s, now), reverse=True)
+        return ranked[:n]
+
+    def forget(self, symbol: str):
+        self.scores.pop(symbol, None)
+        self.updated_at.pop(symbol, None)
+
+    def prune(self, min_score: float = 0.01, now: Optional[float] = None):
+        """Remove símbolos cuja demanda já decaiu a quase zero"""
+        now = now or time.time()
+        for symbol in [s for s in self.scores if self._decayed(s, now) < min_score]:
+            self.scores.pop(symbol, None)
+            self.updated_at.pop(symbol, None)
+
+
+class RateLimiter:
+    """Espaça chamadas ao provedor em ritmo constante (sem rajadas)"""
+
+    def __init__(self, rate: float = UPSTREAM_RATE):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class Prefetcher:
+    """Aquece o cache na inicialização e renova símbolos populares antes de expirarem"""
+
+    def __init__(self, service, top_n: int = PREFETCH_TOP_N, lead: float = PREFETCH_LEAD,
+                 universes: Optional[List[str]] = None, popularity_file: str = POPULARITY_FILE,
+                 is_rejected: Optional[Callable[[str], bool]] = None):
+        self.service = service
+        # Símbolos recusados pelo cadastro (inválidos/cache negativo) nunca são buscados
+        self.is_rejected = is_rejected or (lambda symbol: False)
+        self.demand = service.demand
+        self.top_n = top_n
+        self.lead = lead
+        self.universes = PREFETCH_UNIVERSES if universes is None else universes
+        self.popularity_file = popularity_file
+        self.warm_symbols: List[str] = []
+        self._last_save = time.time()
+
+    # ----- popularidade persistida -----
+    def load_popularity(self) -> Dict[str, float]:
+        try:
+            with open(self.popularity_file) as f:
+                return json.load(f).get('symbols', {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Erro ao ler popularidade: {e}")
+            return {}
+
+    def _accepted(self, symbols: List[str]) -> List[str]:
+        return [s for s in symbols if not self.is_rejected(s)]
+
+    def save_popularity(self):
+        now = time.time()
+        symbols = {s: round(self.demand.score(s, now), 4) for s in self._accepted(self.demand.top(self.top_n, now))}
+        try:
+            os.makedirs(os.path.dirname(self.popularity_file), exist_ok=True)
+            with open(self.popularity_file, 'w') as f:
+                json.dump({'updated_at': datetime.now().isoformat(), 'symbols': symbols}, f, indent=2)
+        except Exception as e:
+            logger.warning(f"Erro ao salvar popularidade: {e}")
+        self._last_save = now
+
+    # ----- aquecimento -----
+    def warm_up(self):
+        """Registra os top-N populares e os universos configurados para atualização"""
+        popular = {s: score for s, score in self.load_popularity().items() if not self.is_rejected(s)}
+        now = time.time()
+        for symbol, score in popular.items():
+            self.demand.record(symbol, weight=score, now=now)
+
+        candidates = sorted(popular, key=popular.get, reverse=True)
+        for universe in self.universes:
+            candidates.extend(self._accepted(get_universe(universe)))
+
+        self.warm_symbols = list(dict.fromkeys(candidates))[:self.top_n]
+        for symbol in self.warm_symbols:
+            self.service.track(symbol)
+        logger.info(f"Aquecendo {len(self.warm_symbols)} símbolos")
+
+    def watchlist(self) -> List[str]:
+        """Símbolos mantidos sempre quentes: mais demandados + aquecidos"""
+        symbols = self._accepted(self.demand.top(self.top_n) + self.warm_symbols)
+        return list(dict.fromkeys(symbols))[:self.top_n]
+
+    # ----- renovação antecipada -----
+    def expiring_symbols(self, now: Optional[float] = None) -> List[str]:
+        """Símbolos da watchlist que expiram dentro da janela de antecedência"""
+        now = now or time.time()
+        expiring = []
+        for symbol in self.watchlist():
+            self.service.track(symbol)
+            if self.service.is_due(symbol, now, lead=self.lead):
+                expiring.append(symbol)
+        return expiring
+
+    async def run(self, tick: float = 1.0):
+        self.warm_up()
+        try:
+            while True:
+                try:
+                    for symbol in self.expiring_symbols():
+                        asyncio.create_task(self.service.refresh(symbol))
+                    if time.time() - self._last_save >= POPULARITY_SAVE_INTERVAL:
+                        self.demand.prune()
+                        self.save_popularity()
+                except Exception as e:
+                    logger.error(f"Erro no prefetcher: {e}")
+                await asyncio.sleep(tick)
+        finally:
+            self.save_popularity()
@@ -0,0 +1,118 @@
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from series import CompactSeries
+
+logger = logging.getLogger(__name__)
+
+DAILY_INTERVALS = ('1d', '5d', '1wk', '1mo', '3mo')
+
+
+def normalize_index(frame: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """Índice sem fuso: data local para barras diárias, UTC para intraday
+
+    Sem isso, barras diárias de B3 e NYSE (fusos diferentes) não alinham.
+    """
+    index = frame.index
+    if getattr(index, 'tz', None) is None:
+        return frame
+    frame = frame.copy()
+    if interval in DAILY_INTERVALS:
+        frame.index = index.tz_localize(None)
+    else:
+        frame.index = index.tz_convert('UTC').tz_localize(None)
+    return frame
+
+
+class PriceStore:
+    """Barras OHLCV compactas por (símbolo, intervalo), com aviso de barras novas"""
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str], CompactSeries] = {}
+        self._listeners: List[Tuple[Callable, bool]] = []
+        self._removal_listeners: List[Callable] = []
+        # Séries de apoio (câmbio): fora de symbols()/matrix() e dos assinantes de ações
+        self._auxiliary: Set[str] = set()
+
+    def subscribe(self, callback: Callable, auxiliary: bool = False):
+        """callback(symbol, interval, series, new_bars) a cada atualização; auxiliary=True também
+        recebe as séries de apoio"""
+        self._listeners.append((callback, auxiliary))
+
+    def subscribe_removals(self, callback: Callable):
+        """callback(symbol) quando o símbolo sai do store (ex.: despejado por falta de uso)"""
+        self._removal_listeners.append(callback)
+
+    def mark_auxiliary(self, symbols: List[str]):
+        self._auxiliary.update(s.upper() for s in symbols)
+
+    def is_auxiliary(self, symbol: str) -> bool:
+        return symbol.upper() in self._auxiliary
+
+    def get(self, symbol: str, interval: str = '1d') -> Optional[CompactSeries]:
+        return self._series.get((symbol.upper(), interval))
+
+    def get_frame(self, symbol: str, interval: str = '1d') -> Optional[pd.DataFrame]:
+        """Mesma série como DataFrame (conversão na borda da API)"""
+        series = self.get(symbol, interval)
+        return series.to_frame() if series is not None else None
+
+    def symbols(self, interval: str = '1d', auxiliary: bool = False) -> List[str]:
+        return [s for s, i in self._series if i == interval and (auxiliary or s not in self._auxiliary)]
+
+    def remove(self, symbol: str):
+        symbol = symbol.upper()
+        keys = [k for k in self._series if k[0] == symbol]
+        for key in keys:
+            del self._series[key]
+        if not keys:
+            return
+        for callback in self._removal_listeners:
+            try:
+                callback(symbol)
+            except Exception as e:
+                logger.error(f"Erro em assinante de remoção do PriceStore: {e}")
+
+    def nbytes(self) -> int:
+        return sum(series.nbytes for series in self._series.values())
+
+    def update(self, symbol: str, frame: pd.DataFrame, interval: str = '1d') -> int:
+        """Mescla barras recebidas; retorna quantas barras novas foram anexadas"""
+        if frame is None or frame.empty:
+            return 0
+        return self.update_series(symbol, CompactSeries.from_frame(normalize_index(frame, interval)), interval)
+
+    def update_series(self, symbol: str, incoming: CompactSeries, interval: str = '1d') -> int:
+        if len(incoming) == 0:
+            return 0
+        key = (symbol.upper(), interval)
+        current = self._series.get(key)
+        if current is None:
+            merged, new_bars = incoming, len(incoming)
+        else:
+            new_bars = int((incoming.timestamps > current.timestamps[-1]).sum())
+            merged = current.merge(incoming)
+            if new_bars == 0 and merged.close[-1] == current.close[-1] and merged.volume[-1] == current.volume[-1]:
+                return 0
+        self._series[key] = merged
+
+        auxiliary = key[0] in self._auxiliary
+        for callback, wants_auxiliary in self._listeners:
+            if auxiliary and not wants_auxiliary:
+                continue
+            try:
+                callback(key[0], interval, merged, new_bars)
+            except Exception as e:
+                logger.error(f"Erro em assinante do PriceStore: {e}")
+        return new_bars
+
+    def matrix(self, field: str = 'Close', symbols: Optional[List[str]] = None,
+               interval: str = '1d') -> pd.DataFrame:
+        """Matriz alinhada (datas x símbolos) de um campo"""
+        symbols = symbols if symbols is not None else self.symbols(interval)
+        columns = {s: self._series[(s, interval)].to_series(field) for s in symbols if (s, interval) in self._series}
+        if not columns:
+            return pd.DataFrame()
+        return pd.DataFrame(columns).sort_index()
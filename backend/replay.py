@@ -0,0 +1,326 @@
+"""Replay determinístico de tráfego capturado (TRAFFIC_CAPTURE_FILE) contra o app ASGI
+
+Reproduz o cronograma gravado (requisições HTTP, SSE e conexões /ws) de 1x a 50x, usando o
+provedor local de dados, e compara percentis de latência e taxas de erro por rota com a
+captura ou com um replay anterior salvo (--save / --baseline).
+
+Uso: python replay.py captura.ndjson [--speed 10] [--limit N] [--save r.json]
+                      [--baseline r.json] [--threshold 1.25] [--admission]
+Sai com código 1 se alguma rota regrediu.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Amostras mínimas numa rota para acusar regressão de latência
+MIN_SAMPLES = 20
+# Tolerância extra na taxa de erro (pontos percentuais)
+ERROR_RATE_SLACK = 1.0
+# Tempo máximo de uma requisição no replay, além da duração gravada (segundos)
+REQUEST_TIMEOUT = 60
+
+
+def load_capture(path: str) -> Tuple[Dict, List[Dict]]:
+    meta, records = {}, []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get('k') == 'meta':
+                meta = meta or record
+            else:
+                records.append(record)
+    records.sort(key=lambda r: r['t'])
+    return meta, records
+
+
+def prepare_environment(meta: Dict, admission: bool):
+    """Provedor local com o mesmo último dia da captura; cotas por cliente gravado; sem recapturar"""
+    os.environ.setdefault('DATA_PROVIDER', 'local')
+    # Cotas são por segundo de relógio: acelerado, o replay seria barrado por 429 que não houve
+    if not admission:
+        os.environ['ADMISSION_ENABLED'] = 'false'
+    if meta.get('started'):
+        os.environ.setdefault('LOCAL_PROVIDER_END', datetime.fromtimestamp(meta['started']).strftime('%Y-%m-%d'))
+    os.environ['ADMISSION_TRUST_PROXY'] = 'true'
+    os.environ['TRAFFIC_CAPTURE_FILE'] = ''
+
+
+def make_scope(record: Dict) -> Dict:
+    kind = 'http' if record['k'] == 'h' else 'websocket'
+    scope = {
+        'type': kind,
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'scheme': 'http' if kind == 'http' else 'ws',
+        'path': record['p'],
+        'raw_path': record['p'].encode(),
+        'root_path': '',
+        'query_string': record.get('q', '').encode(),
+        # O hash do cliente gravado vira o IP: cotas por cliente se comportam como na captura
+        'headers': [(b'host', b'replay'), (b'x-forwarded-for', record.get('c', 'replay').encode())],
+        'client': (record.get('c', 'replay'), 0),
+        'server': ('replay', 80),
+    }
+    if kind == 'http':
+        scope['method'] = record.get('m', 'GET')
+    else:
+        scope['subprotocols'] = []
+    return scope
+
+
+def route_of(app, record: Dict) -> str:
+    """Template da rota (ex.: /api/tech-analysis/{symbol}) para agrupar as métricas"""
+    from starlette.routing import Match
+
+    scope = make_scope(record)
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return record['p']
+
+
+class LifespanDriver:
+    """Dispara startup/shutdown do app (jobs de fundo) como faria o uvicorn"""
+
+    def __init__(self, app):
+        self.app = app
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.done: Dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+        self.task: Optional[asyncio.Task] = None
+
+    async def _receive(self):
+        return await self.events.get()
+
+    async def _send(self, message):
+        self.done[message['type'].rsplit('.', 1)[0]].set()
+
+    async def startup(self):
+        self.task = asyncio.create_task(self.app({'type': 'lifespan', 'asgi': {'version': '3.0'}},
+                                                 self._receive, self._send))
+        await self.events.put({'type': 'lifespan.startup'})
+        await self.done['lifespan.startup'].wait()
+
+    async def shutdown(self):
+        await self.events.put({'type': 'lifespan.shutdown'})
+        await asyncio.wait_for(self.done['lifespan.shutdown'].wait(), 10)
+
+
+async def replay_http(app, record: Dict, speed: float) -> Dict:
+    disconnect = asyncio.Event()
+    state = {'status': 0, 'requested': False}
+
+    async def receive():
+        if not state['requested']:
+            state['requested'] = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            state['status'] = message['status']
+
+    started = time.perf_counter()
+    hold = record.get('d', 0) / 1000 / speed
+    timer = asyncio.get_running_loop().call_later(hold, disconnect.set) if record.get('sse') else None
+    try:
+        await asyncio.wait_for(app(make_scope(record), receive, send), hold + REQUEST_TIMEOUT)
+    except Exception:
+        state['status'] = state['status'] or -1
+    finally:
+        if timer is not None:
+            timer.cancel()
+    elapsed = (time.perf_counter() - started) * 1000
+    # SSE fica aberto de propósito: a duração da conexão não é latência
+    return {'status': state['status'], 'ms': None if record.get('sse') else elapsed}
+
+
+async def replay_websocket(app, record: Dict, speed: float) -> Dict:
+    incoming: asyncio.Queue = asyncio.Queue()
+    incoming.put_nowait({'type': 'websocket.connect'})
+    state = {'accepted': False, 'first_ms': None, 'messages': 0, 'last_seq': None}
+    started = time.perf_counter()
+
+    async def receive():
+        return await incoming.get()
+
+    async def send(message):
+        if message['type'] == 'websocket.accept':
+            state['accepted'] = True
+        elif message['type'] == 'websocket.send':
+            try:
+                payload = json.loads(message.get('text') or '{}')
+            except ValueError:
+                payload = {}
+            if payload.get('type') == 'ping':
+                # Heartbeat respondido como o cliente real; não conta como mensagem do feed
+                incoming.put_nowait({'type': 'websocket.receive',
+                                     'text': json.dumps({'action': 'pong', 't': payload.get('t')})})
+                return
+            if state['first_ms'] is None:
+                state['first_ms'] = (time.perf_counter() - started) * 1000
+            state['messages'] += 1
+            state['last_seq'] = payload.get('seq', state['last_seq'])
+
+    acks = any(entry[1] == 'ack' for entry in record.get('in', []))
+
+    async def client_script():
+        for entry in record.get('in', []):
+            await asyncio.sleep(max(entry[0] / 1000 / speed - (time.perf_counter() - started), 0))
+            message = {'action': entry[1]}
+            if entry[1] == 'subscribe':
+                if len(entry) > 2:
+                    message['interval_ms'] = entry[2]
+                # A captura não guarda o payload; acks gravados indicam que a sessão usava ack
+                message['ack'] = acks
+            elif entry[1] == 'ack':
+                message['seq'] = state['last_seq']
+            await incoming.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+        await asyncio.sleep(max(record.get('d', 0) / 1000 / speed - (time.perf_counter() - started), 0))
+        await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+
+    script = asyncio.create_task(client_script())
+    try:
+        await asyncio.wait_for(app(make_scope(record), receive, send),
+                               record.get('d', 0) / 1000 / speed + REQUEST_TIMEOUT)
+    except Exception:
+        pass
+    finally:
+        script.cancel()
+    return {'status': 101 if state['accepted'] else -1, 'ms': state['first_ms']}
+
+
+def summarize(samples: List[Tuple[int, Optional[float]]]) -> Dict:
+    """(status, latência) -> contagem, percentis e taxas de erro (5xx/falha) e rejeição (429/503)"""
+    latencies = np.array([ms for _, ms in samples if ms is not None])
+    count = len(samples)
+    errors = sum(1 for status, _ in samples if status <= 0 or (status >= 500 and status != 503))
+    rejected = sum(1 for status, _ in samples if status in (429, 503))
+    summary = {'count': count,
+               'error_rate': round(100 * errors / count, 2) if count else 0.0,
+               'rejected_rate': round(100 * rejected / count, 2) if count else 0.0}
+    for q in (50, 95, 99):
+        summary[f'p{q}'] = round(float(np.percentile(latencies, q)), 2) if len(latencies) else None
+    return summary
+
+
+def recorded_summary(app, records: List[Dict]) -> Dict[str, Dict]:
+    by_route = defaultdict(list)
+    for record in records:
+        if record['k'] == 'h':
+            sample = (record.get('s', 0), None if record.get('sse') else record.get('d'))
+        else:
+            sample = (101 if record.get('accepted') else -1, record.get('f'))
+        by_route[route_of(app, record)].append(sample)
+    return {route: summarize(samples) for route, samples in by_route.items()}
+
+
+async def run_replay(app, records: List[Dict], speed: float) -> Tuple[Dict[str, Dict], Dict]:
+    lifespan = LifespanDriver(app)
+    await lifespan.startup()
+    t0 = records[0]['t']
+    began = time.perf_counter()
+    lags = []
+    tasks = []
+    routes = []
+    for record in records:
+        delay = (record['t'] - t0) / speed - (time.perf_counter() - began)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lags.append(max(-delay, 0))
+        replay = replay_http if record['k'] == 'h' else replay_websocket
+        tasks.append(asyncio.create_task(replay(app, record, speed)))
+        routes.append(route_of(app, record))
+    results = await asyncio.gather(*tasks)
+    wall = time.perf_counter() - began
+    await lifespan.shutdown()
+
+    by_route = defaultdict(list)
+    for route, result in zip(routes, results):
+        by_route[route].append((result['status'], result['ms']))
+    run = {'records': len(records), 'wall_seconds': round(wall, 2),
+           'recorded_seconds': round(records[-1]['t'] - t0, 2),
+           'max_schedule_lag_ms': round(max(lags) * 1000, 2) if lags else 0.0}
+    return {route: summarize(samples) for route, samples in by_route.items()}, run
+
+
+def compare(baseline: Dict[str, Dict], current: Dict[str, Dict], threshold: float) -> List[str]:
+    regressions = []
+    print(f"{'rota':42} {'n':>6}  {'base p50/p95/p99 ms':>24}  {'replay p50/p95/p99 ms':>24}  "
+          f"{'erro% b/r':>12}  {'rejeit.% b/r':>13}")
+    for route in sorted(current):
+        now, base = current[route], baseline.get(route, {})
+
+        def fmt(s):
+            return '/'.join('-' if s.get(k) is None else f"{s[k]:.0f}" for k in ('p50', 'p95', 'p99'))
+
+        flag = ''
+        if base.get('p95') and now.get('p95') and now['count'] >= MIN_SAMPLES \
+                and now['p95'] > base['p95'] * threshold:
+            flag = ' <- latência'
+        if base and now['error_rate'] > base.get('error_rate', 0) + ERROR_RATE_SLACK:
+            flag += ' <- erros'
+        if flag:
+            regressions.append(route)
+        print(f"{route[:42]:42} {now['count']:>6}  {fmt(base):>24}  {fmt(now):>24}  "
+              f"{base.get('error_rate', 0):>5.1f}/{now['error_rate']:<5.1f}  "
+              f"{base.get('rejected_rate', 0):>6.1f}/{now['rejected_rate']:<6.1f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay de tráfego capturado contra o app')
+    parser.add_argument('capture')
+    parser.add_argument('--speed', type=float, default=1.0, help='aceleração do cronograma (1 a 50)')
+    parser.add_argument('--limit', type=int, default=0, help='só os N primeiros registros')
+    parser.add_argument('--save', help='salva o resumo deste replay (JSON) para usar como --baseline')
+    parser.add_argument('--baseline', help='compara com um replay salvo em vez da captura')
+    parser.add_argument('--admission', action='store_true',
+                        help='mantém cotas/descarte de carga acima de 1x (sempre ativos em 1x)')
+    parser.add_argument('--threshold', type=float, default=1.25, help='p95 acima de base*threshold é regressão')
+    args = parser.parse_args()
+    speed = min(max(args.speed, 1.0), 50.0)
+
+    meta, records = load_capture(args.capture)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print('Captura vazia')
+        return 0
+    prepare_environment(meta, admission=args.admission or speed == 1.0)
+    app = importlib.import_module('main').app
+
+    current, run = asyncio.run(run_replay(app, records, speed))
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['routes']
+    else:
+        baseline = recorded_summary(app, records)
+
+    print(f"{run['records']} registros, {run['recorded_seconds']}s gravados em {run['wall_seconds']}s "
+          f"({speed:g}x), atraso máximo do cronograma {run['max_schedule_lag_ms']} ms")
+    regressions = compare(baseline, current, args.threshold)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'run': run, 'speed': speed, 'routes': current}, f, indent=2)
+    if regressions:
+        print(f"Regressões: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis é opcional: sem ele o L2 é local
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL')
+L1_MAX_BYTES = int(os.getenv('RESULT_CACHE_L1_BYTES', str(32 * 2 ** 20)))
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', str(24 * 3600)))
+# Quanto tempo outra réplica espera o resultado de quem está calculando (segundos)
+LOCK_TIMEOUT = float(os.getenv('RESULT_CACHE_LOCK_TIMEOUT', '10'))
+# Incrementar ao mudar o formato dos resultados
+CACHE_VERSION = 2
+
+
+def config_hash(config: Any) -> str:
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def bar_version(timestamp, close, volume) -> str:
+    """Versão da última barra: muda quando chega barra nova ou a barra corrente é revisada"""
+    return hashlib.sha1(f"{timestamp}|{close}|{volume}".encode()).hexdigest()[:12]
+
+
+def make_key(namespace: str, symbol: str, interval: str, bar: str, config: Any) -> str:
+    return f"{namespace}:v{CACHE_VERSION}:{symbol.upper()}:{interval}:{bar}:{config_hash(config)}"
+
+
+class LRUCache:
+    """Cache L1 em processo com despejo por tamanho (bytes serializados)"""
+
+    def __init__(self, max_bytes: int = L1_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: str, value, nbytes: int):
+        if nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+        self._entries[key] = (value, nbytes)
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LocalRedis:
+    """Substituto local do Redis (uma réplica ou testes): get/set com ex, nx e px"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+
+    def _alive(self, key: str):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    async def get(self, key: str):
+        entry = self._alive(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value, ex: Optional[int] = None, px: Optional[int] = None, nx: bool = False):
+        if nx and self._alive(key):
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self._data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+
+class _TierStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def as_dict(self) -> Dict:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else None}
+
+
+class ResultCache:
+    """Cache de resultados em dois níveis: L1 LRU local + L2 Redis compartilhado"""
+
+    def __init__(self, redis=None, l1_max_bytes: int = L1_MAX_BYTES, ttl: int = RESULT_CACHE_TTL):
+        if redis is None:
+            redis = aioredis.from_url(REDIS_URL) if REDIS_URL and aioredis is not None else LocalRedis()
+        self.redis = redis
+        self.l1 = LRUCache(l1_max_bytes)
+        self.ttl = ttl
+        self.stats = {'l1': _TierStats(), 'l2': _TierStats()}
+        self.computed = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def _l2_get(self, key: str):
+        try:
+            raw = await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Erro no cache L2: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def get(self, key: str):
+        value = self.l1.get(key)
+        if value is not None:
+            self.stats['l1'].hits += 1
+            return value
+        self.stats['l1'].misses += 1
+        value = await self._l2_get(key)
+        if value is None:
+            self.stats['l2'].misses += 1
+            return None
+        self.stats['l2'].hits += 1
+        self.l1.set(key, value, len(json.dumps(value, default=float)))
+        return value
+
+    async def set(self, key: str, value):
+        raw = json.dumps(value, default=float)
+        self.l1.set(key, value, len(raw))
+        try:
+            await self.redis.set(key, raw, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Erro no cache L2: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable):
+        """Resultado em cache ou calculado uma única vez (por processo e entre réplicas)"""
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        # Proteção contra stampede no processo: quem chega depois espera o primeiro
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Líder cancelado (ex.: cliente desconectou): um dos seguidores assume o cálculo
+                if not pending.cancelled():
+                    raise
+                return await self.get_or_compute(key, compute)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._compute_once(key, compute)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Marca a exceção como lida caso ninguém mais esteja esperando
+            future.exception()
+            raise
+        finally:
+            # CancelledError não é Exception: sem isso os seguidores esperariam para sempre
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+
+    async def _compute_once(self, key: str, compute: Callable):
+        # Entre réplicas: lock no Redis; quem não pega espera o valor aparecer no L2
+        lock_key = f"lock:{key}"
+        try:
+            locked = await self.redis.set(lock_key, '1', px=int(LOCK_TIMEOUT * 1000), nx=True)
+        except Exception:
+            locked = True
+        if not locked:
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                value = await self._l2_get(key)
+                if value is not None:
+                    self.stats['l2'].hits += 1
+                    self.l1.set(key, value, len(json.dumps(value, default=float)))
+                    return value
+        try:
+            result = compute()
+            if asyncio.iscoroutine(result):
+                result = await result
+            self.computed += 1
+            await self.set(key, result)
+            return result
+        finally:
+            if locked:
+                try:
+                    await self.redis.delete(lock_key)
+                except Exception:
+                    pass
+
+    def metrics(self) -> Dict:
+        return {
+            'l1': dict(self.stats['l1'].as_dict(), entries=len(self.l1), bytes=self.l1.size,
+                       max_bytes=self.l1.max_bytes),
+            'l2': dict(self.stats['l2'].as_dict(), backend=type(self.redis).__name__),
+            'computed': self.computed,
+            'inflight': len(self._inflight)
+        }
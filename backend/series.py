@@ -0,0 +1,104 @@
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Precisão dos preços OHLC: float64 (padrão) ou float32 (metade da memória)
+SERIES_PRICE_DTYPE = np.dtype(os.getenv('SERIES_PRICE_DTYPE', 'float64'))
+
+FIELDS = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
+
+
+def _volume_dtype(volume: np.ndarray) -> np.dtype:
+    return np.dtype(np.uint32) if len(volume) == 0 or volume.max() < 2 ** 32 else np.dtype(np.uint64)
+
+
+class CompactSeries:
+    """Série OHLCV em arrays: timestamps int64 (ns), OHLC float32/64, volume uint32/64
+
+    Fatias por tempo são views (sem cópia); pandas só na borda da API.
+    """
+
+    __slots__ = ('timestamps', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, timestamps: np.ndarray, open: np.ndarray, high: np.ndarray,
+                 low: np.ndarray, close: np.ndarray, volume: np.ndarray):
+        self.timestamps = timestamps
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, price_dtype: Optional[np.dtype] = None) -> 'CompactSeries':
+        """Converte um DataFrame do yfinance; Dividends/Stock Splits são descartados
+
+        Os arrays são copiados para não manter vivo o bloco 2D do DataFrame.
+        """
+        price_dtype = price_dtype or SERIES_PRICE_DTYPE
+        index = frame.index
+        if getattr(index, 'tz', None) is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        volume = np.nan_to_num(frame['Volume'].to_numpy(dtype=np.float64)) if 'Volume' in frame else np.zeros(len(frame))
+        volume = np.clip(volume, 0, None)
+        return cls(
+            index.to_numpy(dtype='datetime64[ns]', copy=True).view(np.int64),
+            frame['Open'].to_numpy(dtype=price_dtype, copy=True),
+            frame['High'].to_numpy(dtype=price_dtype, copy=True),
+            frame['Low'].to_numpy(dtype=price_dtype, copy=True),
+            frame['Close'].to_numpy(dtype=price_dtype, copy=True),
+            volume.astype(_volume_dtype(volume))
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {name: getattr(self, attr) for name, attr in FIELDS.items()},
+            index=self.index()
+        )
+
+    def to_series(self, field: str = 'Close') -> pd.Series:
+        return pd.Series(getattr(self, FIELDS[field]), index=self.index(), name=field)
+
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, item: slice) -> 'CompactSeries':
+        return CompactSeries(*(getattr(self, attr)[item] for attr in self.__slots__))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, attr).nbytes for attr in self.__slots__)
+
+    @property
+    def last_timestamp(self) -> Optional[pd.Timestamp]:
+        return pd.Timestamp(self.timestamps[-1]) if len(self) else None
+
+    def position(self, timestamp, side: str = 'right') -> int:
+        """Busca binária no índice de timestamps"""
+        return int(np.searchsorted(self.timestamps, pd.Timestamp(timestamp).value, side=side))
+
+    def slice(self, start=None, end=None) -> 'CompactSeries':
+        """Barras em [start, end] como views dos arrays originais"""
+        lo = self.position(start, 'left') if start is not None else 0
+        hi = self.position(end, 'right') if end is not None else len(self)
+        return self[lo:hi]
+
+    def tail(self, n: int) -> 'CompactSeries':
+        return self[max(len(self) - n, 0):]
+
+    def merge(self, other: 'CompactSeries') -> 'CompactSeries':
+        """Barras de other substituem as nossas a partir do primeiro timestamp dele"""
+        if len(other) == 0:
+            return self
+        keep = self.position(pd.Timestamp(other.timestamps[0]), 'left')
+        merged = []
+        for attr in self.__slots__:
+            ours, theirs = getattr(self, attr)[:keep], getattr(other, attr)
+            dtype = np.promote_types(ours.dtype, theirs.dtype)
+            merged.append(np.concatenate((ours.astype(dtype, copy=False), theirs.astype(dtype, copy=False))))
+        return CompactSeries(*merged)
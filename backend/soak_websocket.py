@@ -0,0 +1,231 @@
+"""Soak test do /ws: milhares de clientes ASGI concorrentes contra o app, no mesmo processo
+
+Abre N conexões (IPs simulados, dentro do limite por IP), mede memória por conexão (RSS),
+latência de broadcast (publish -> mensagem em cada cliente) e verifica o ciclo de vida:
+clientes que param de ler ou de responder aos pings são despejados, e um IP abusivo
+esbarra no limite por IP.
+
+Uso: python soak_websocket.py [--clients 10000] [--dead 0.02] [--rounds 5]
+                              [--interval-ms 100] [--ping-interval 5] [--ping-timeout 3]
+"""
+import argparse
+import asyncio
+import gc
+import importlib
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Espera máxima por um round de broadcast (segundos)
+ROUND_TIMEOUT = 30
+# Conexões abertas em paralelo durante a rampa
+CONNECT_BATCH = 500
+MARKER = 'soak_marker'
+
+
+def prepare_environment(args):
+    os.environ.setdefault('DATA_PROVIDER', 'local')
+    os.environ['TRAFFIC_CAPTURE_FILE'] = ''
+    os.environ['ADMISSION_ENABLED'] = 'false'
+    os.environ['INGEST_FEED'] = ''
+    os.environ['WS_MAX_CONNECTIONS'] = str(args.clients + args.per_ip * 2)
+    os.environ['WS_MAX_PER_IP'] = str(args.per_ip)
+    os.environ['WS_PING_INTERVAL'] = str(args.ping_interval)
+    os.environ['WS_PING_TIMEOUT'] = str(args.ping_timeout)
+    os.environ['WS_SEND_TIMEOUT'] = str(args.send_timeout)
+    os.environ['WS_TRUST_PROXY'] = 'false'
+
+
+class SoakClient:
+    """Conexão /ws em ASGI puro; 'silent' não responde pings, 'stuck' também para de ler"""
+
+    def __init__(self, app, index: int, ip: str, mode: str = 'live', interval_ms: int = 100):
+        self.app = app
+        self.index = index
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.scope = {
+            'type': 'websocket', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'ws',
+            'path': '/ws', 'raw_path': b'/ws', 'root_path': '', 'query_string': b'',
+            'headers': [(b'host', b'soak')], 'client': (ip, 40000 + index % 20000),
+            'server': ('soak', 80), 'subprotocols': [],
+        }
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+        self.accepted = asyncio.Event()
+        self.ready = asyncio.Event()
+        self.closed: Optional[int] = None
+        self.rejected = False
+        self.messages = 0
+        self.pings = 0
+        # round -> instante (perf_counter) em que o marcador chegou
+        self.markers: Dict[int, float] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        kind = message['type']
+        if kind == 'websocket.accept':
+            self.accepted.set()
+            await self.incoming.put({'type': 'websocket.receive', 'text': json.dumps(
+                {'action': 'subscribe', 'interval_ms': self.interval_ms})})
+        elif kind == 'websocket.close':
+            if not self.accepted.is_set():
+                self.rejected = True
+            self.closed = message.get('code', 1000)
+            self.ready.set()
+        elif kind == 'websocket.send':
+            if self.mode == 'stuck' and self.ready.is_set():
+                # Cliente meio-aberto: o envio nunca completa (buffer TCP cheio)
+                await asyncio.Future()
+            text = message.get('text') or ''
+            self.ready.set()
+            if text.startswith('{"type":"ping"'):
+                self.pings += 1
+                if self.mode == 'live':
+                    t = json.loads(text).get('t')
+                    await self.incoming.put({'type': 'websocket.receive',
+                                             'text': json.dumps({'action': 'pong', 't': t})})
+                return
+            self.messages += 1
+            if MARKER in text:
+                marker = json.loads(text)['data'].get(MARKER)
+                if marker is not None:
+                    self.markers.setdefault(marker, time.perf_counter())
+
+    def start(self):
+        self.task = asyncio.create_task(self.app(self.scope, self.receive, self.send))
+
+    async def disconnect(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+
+
+def percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {'count': 0}
+    array = np.array(values)
+    return {'count': len(values), 'p50': round(float(np.percentile(array, 50)), 2),
+            'p95': round(float(np.percentile(array, 95)), 2), 'p99': round(float(np.percentile(array, 99)), 2),
+            'max': round(float(array.max()), 2)}
+
+
+async def run_soak(app, market_feed, args) -> Dict:
+    from diagnostics import rss_bytes
+    from replay import LifespanDriver
+
+    lifespan = LifespanDriver(app)
+    await lifespan.startup()
+    gc.collect()
+    rss_before = rss_bytes()
+
+    # ----- rampa: IPs simulados com até per_ip conexões cada -----
+    dead_every = int(1 / args.dead) if args.dead > 0 else 0
+    clients: List[SoakClient] = []
+    started = time.perf_counter()
+    for batch in range(0, args.clients, CONNECT_BATCH):
+        opened = []
+        for i in range(batch, min(batch + CONNECT_BATCH, args.clients)):
+            slot = i // args.per_ip
+            ip = f"10.{slot // 65536 % 256}.{slot // 256 % 256}.{slot % 256}"
+            mode = 'live'
+            if dead_every and i % dead_every == dead_every - 1:
+                mode = 'stuck' if (i // dead_every) % 2 else 'silent'
+            client = SoakClient(app, i, ip, mode, args.interval_ms)
+            client.start()
+            opened.append(client)
+        await asyncio.wait_for(asyncio.gather(*(c.ready.wait() for c in opened)), ROUND_TIMEOUT)
+        clients.extend(opened)
+    connect_seconds = time.perf_counter() - started
+    gc.collect()
+    rss_connected = rss_bytes()
+    live = [c for c in clients if c.mode == 'live' and c.closed is None]
+
+    # ----- limite por IP: um IP abre per_ip + 5 conexões -----
+    abusive = [SoakClient(app, 10**6 + i, '192.0.2.1', 'live', args.interval_ms) for i in range(args.per_ip + 5)]
+    for client in abusive:
+        client.start()
+    await asyncio.wait_for(asyncio.gather(*(c.ready.wait() for c in abusive)), ROUND_TIMEOUT)
+    per_ip_rejected = sum(c.rejected for c in abusive)
+    for client in abusive:
+        if not client.rejected:
+            await client.disconnect()
+
+    # ----- latência de broadcast: um marcador por round, tempo até cada cliente vivo recebê-lo -----
+    latencies: List[float] = []
+    delivered = []
+    for round_id in range(args.rounds):
+        published = time.perf_counter()
+        market_feed.publish({MARKER: round_id})
+        deadline = published + ROUND_TIMEOUT
+        while time.perf_counter() < deadline:
+            if all(round_id in c.markers for c in live):
+                break
+            await asyncio.sleep(0.01)
+        got = [c.markers[round_id] - published for c in live if round_id in c.markers]
+        latencies.extend(ms * 1000 for ms in got)
+        delivered.append(len(got) / max(len(live), 1))
+        await asyncio.sleep(args.interval_ms / 1000 * 2)
+
+    # ----- despejo: espera o prazo do heartbeat e do envio travado -----
+    wait = args.ping_interval + args.ping_timeout + args.send_timeout + 2
+    await asyncio.sleep(wait)
+    metrics = market_feed.metrics(limit=0)
+    dead = [c for c in clients if c.mode != 'live']
+    evicted_dead = sum(c.closed is not None for c in dead)
+    live_alive = sum(c.closed is None for c in live)
+
+    for client in clients:
+        await client.disconnect()
+    await asyncio.wait([c.task for c in clients + abusive], timeout=ROUND_TIMEOUT)
+    await lifespan.shutdown()
+
+    return {
+        'clients': args.clients,
+        'connect_seconds': round(connect_seconds, 2),
+        'connections_per_second': round(args.clients / connect_seconds),
+        'rss_mb_before': round(rss_before / 2 ** 20, 1),
+        'rss_mb_connected': round(rss_connected / 2 ** 20, 1),
+        'kb_per_connection': round((rss_connected - rss_before) / args.clients / 1024, 1),
+        'broadcast_latency_ms': percentiles(latencies),
+        'delivered_min_fraction': round(min(delivered), 4) if delivered else None,
+        'dead_clients': len(dead),
+        'dead_evicted': evicted_dead,
+        'live_still_connected': f"{live_alive}/{len(live)}",
+        'per_ip_rejected': f"{per_ip_rejected}/{len(abusive)} (limite {args.per_ip})",
+        'server_evictions': metrics['totals']['evicted'],
+        'server_rejections': metrics['totals']['rejected'],
+        'pings_sent': metrics['totals']['pings_sent'],
+        'rtt_ms_p50': metrics['rtt_ms_p50'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak test de conexões /ws')
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--dead', type=float, default=0.02, help='fração de clientes que param de responder')
+    parser.add_argument('--rounds', type=int, default=5, help='broadcasts medidos')
+    parser.add_argument('--interval-ms', type=int, default=100, help='cadência pedida pelos clientes')
+    parser.add_argument('--per-ip', type=int, default=50)
+    parser.add_argument('--ping-interval', type=float, default=5)
+    parser.add_argument('--ping-timeout', type=float, default=3)
+    parser.add_argument('--send-timeout', type=float, default=3)
+    args = parser.parse_args()
+
+    prepare_environment(args)
+    main_module = importlib.import_module('main')
+    result = asyncio.run(run_soak(main_module.app, main_module.market_feed, args))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    # Falha se algum cliente morto sobreviveu ou se algum vivo caiu
+    ok = result['dead_evicted'] == result['dead_clients'] and result['live_still_connected'].split('/')[0] == \
+        result['live_still_connected'].split('/')[1]
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
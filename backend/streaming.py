@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+# Eventos guardados por símbolo para retomada via Last-Event-ID
+STREAM_HISTORY = int(os.getenv('STREAM_HISTORY', '256'))
+STREAM_KEEPALIVE = float(os.getenv('STREAM_KEEPALIVE', '15'))
+# Produtores sem ouvintes são descartados após esse tempo
+STREAM_IDLE_TTL = float(os.getenv('STREAM_IDLE_TTL', '300'))
+LISTENER_QUEUE_SIZE = 64
+
+# Campos do snapshot enviados no stream (updated_at muda sempre e fica de fora)
+STREAM_FIELDS = ('price', 'change', 'change_percent', 'volume', 'last_bar', 'indicators', 'signals')
+
+# Prefixo dos ids: ids de outra execução do servidor nunca casam
+_EPOCH = format(int(time.time()), 'x')
+
+
+def stream_payload(snapshot: Dict) -> Dict:
+    if not snapshot.get('success'):
+        return {'error': snapshot.get('error')}
+    return {field: snapshot.get(field) for field in STREAM_FIELDS}
+
+
+def diff_payload(old: Dict, new: Dict) -> Dict:
+    """Só os campos alterados; dicts aninhados viram diffs parciais"""
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = {k: v for k, v in value.items() if previous.get(k) != v}
+            if nested:
+                delta[key] = nested
+        elif previous != value:
+            delta[key] = value
+    return delta
+
+
+class _Listener:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LISTENER_QUEUE_SIZE)
+        self.lagged = False
+
+
+class SymbolStream:
+    """Produtor único por símbolo, compartilhado por todos os ouvintes"""
+
+    def __init__(self, symbol: str, history: int = STREAM_HISTORY):
+        self.symbol = symbol
+        self.seq = 0
+        self.state: Optional[Dict] = None
+        self.events: deque = deque(maxlen=history)
+        self.listeners: List[_Listener] = []
+        self.idle_since = time.time()
+
+    @property
+    def last_event_id(self) -> str:
+        return f"{_EPOCH}:{self.seq}"
+
+    def snapshot_event(self) -> Tuple[str, str, Dict]:
+        return self.last_event_id, 'snapshot', dict(self.state, symbol=self.symbol)
+
+    def publish(self, snapshot: Dict):
+        payload = stream_payload(snapshot)
+        if self.state is None:
+            event_type, data = 'snapshot', dict(payload, symbol=self.symbol)
+        else:
+            data = diff_payload(self.state, payload)
+            if not data:
+                return
+            event_type = 'delta'
+        self.state = payload
+        self.seq += 1
+        event = (self.last_event_id, event_type, data)
+        self.events.append(event)
+        for listener in self.listeners:
+            try:
+                listener.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Ouvinte lento: recebe um snapshot completo quando alcançar
+                listener.lagged = True
+
+    def events_since(self, last_event_id: Optional[str]) -> Optional[List[Tuple[str, str, Dict]]]:
+        """Eventos após last_event_id, ou None se não for possível retomar"""
+        if not last_event_id or self.state is None:
+            return None
+        epoch, _, seq = last_event_id.partition(':')
+        if epoch != _EPOCH or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq == self.seq:
+            return []
+        oldest = self.seq - len(self.events) + 1
+        if seq < oldest - 1 or seq > self.seq:
+            return None
+        return list(self.events)[seq - oldest + 1:]
+
+
+class StreamHub:
+    """Streams de análise técnica alimentados pelo snapshot service"""
+
+    def __init__(self, service):
+        self.service = service
+        self.streams: Dict[str, SymbolStream] = {}
+        service.subscribe(self.on_snapshot)
+
+    def on_snapshot(self, symbol: str, snapshot: Dict):
+        stream = self.streams.get(symbol)
+        if stream is not None:
+            stream.publish(snapshot)
+
+    def _cleanup(self):
+        now = time.time()
+        for symbol in [s for s, st in self.streams.items()
+                       if not st.listeners and now - st.idle_since > STREAM_IDLE_TTL]:
+            del self.streams[symbol]
+
+    def connections(self) -> List[Dict]:
+        """Ouvintes por símbolo com a profundidade de fila de cada um"""
+        return [{'symbol': symbol, 'seq': stream.seq, 'history': len(stream.events),
+                 'listeners': [{'queued': listener.queue.qsize(), 'lagged': listener.lagged}
+                               for listener in stream.listeners]}
+                for symbol, stream in self.streams.items()]
+
+    def _get_stream(self, symbol: str) -> SymbolStream:
+        self._cleanup()
+        stream = self.streams.get(symbol)
+        if stream is None:
+            stream = self.streams[symbol] = SymbolStream(symbol)
+            snapshot = self.service.get(symbol)
+            if snapshot is not None:
+                stream.publish(snapshot)
+        return stream
+
+    async def listen(self, symbol: str, last_event_id: Optional[str] = None) -> AsyncIterator[Tuple]:
+        """Snapshot completo (ou eventos perdidos) e depois só deltas; None = keep-alive"""
+        symbol = symbol.upper()
+        self.service.touch(symbol)
+        stream = self._get_stream(symbol)
+        listener = _Listener()
+        stream.listeners.append(listener)
+        try:
+            missed = stream.events_since(last_event_id)
+            if missed is not None:
+                for event in missed:
+                    yield event
+            elif stream.state is not None:
+                yield stream.snapshot_event()
+
+            while True:
+                if listener.lagged:
+                    listener.lagged = False
+                    while not listener.queue.empty():
+                        listener.queue.get_nowait()
+                    yield stream.snapshot_event()
+                try:
+                    yield await asyncio.wait_for(listener.queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Mantém o símbolo quente enquanto houver ouvintes
+                    self.service.touch(symbol)
+                    yield None
+        finally:
+            stream.listeners.remove(listener)
+            if not stream.listeners:
+                stream.idle_since = time.time()
+
+    def listener_count(self) -> int:
+        return sum(len(st.listeners) for st in self.streams.values())
+
+
+def format_sse(event) -> str:
+    if event is None:
+        return ": keep-alive\n\n"
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def format_ndjson(event) -> str:
+    if event is None:
+        return "\n"
+    event_id, event_type, data = event
+    return json.dumps({'id': event_id, 'event': event_type, 'data': data}, default=str) + "\n"
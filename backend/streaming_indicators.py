@@ -0,0 +1,227 @@
+import copy
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Parâmetros padrão por indicador (mesmos da biblioteca ta)
+DEFAULT_PARAMS = {
+    'sma': (20,),
+    'ema': (20,),
+    'rsi': (14,),
+    'macd': (12, 26, 9),
+    'bb': (20, 2),
+    'stoch': (14, 3),
+}
+# Parâmetros que aceitam fração (posição por indicador); os demais são janelas inteiras
+FLOAT_PARAMS = {'bb': (1,)}
+# Maior janela aceita (barras): acima disso o indicador é quase todo NaN e só custa memória
+INDICATOR_MAX_WINDOW = int(os.getenv('INDICATOR_MAX_WINDOW', '1000'))
+
+
+def parse_indicator_spec(spec: str) -> List[Tuple[str, Tuple]]:
+    """'rsi:14,sma:20,bb:20:2' -> [('rsi', (14,)), ('sma', (20,)), ('bb', (20, 2))]"""
+    parsed = []
+    for item in filter(None, (part.strip().lower() for part in spec.split(','))):
+        name, *params = item.split(':')
+        if name not in DEFAULT_PARAMS:
+            raise ValueError(f"Indicador desconhecido: {name}")
+        defaults = DEFAULT_PARAMS[name]
+        if len(params) > len(defaults):
+            raise ValueError(f"Parâmetros demais para {name}: {item}")
+        fractional = FLOAT_PARAMS.get(name, ())
+        try:
+            values = tuple(float(p) if i in fractional else int(p) for i, p in enumerate(params))
+        except ValueError:
+            raise ValueError(f"Parâmetros inválidos para {name}: {item} (janelas são inteiras)")
+        values = values + defaults[len(values):]
+        if any(not v > 0 for v in values):
+            raise ValueError(f"Parâmetros inválidos para {name}: {item}")
+        if any(v > INDICATOR_MAX_WINDOW for i, v in enumerate(values) if i not in fractional):
+            raise ValueError(f"Janela acima de {INDICATOR_MAX_WINDOW} barras em {name}: {item}")
+        parsed.append((name, values))
+    return list(dict.fromkeys(parsed))
+
+
+class _EMA:
+    """EMA (adjust=False) com estado carregado entre blocos"""
+
+    def __init__(self, alpha: float, min_periods: int):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.last = None
+        self.count = 0
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        if len(values) == 0:
+            return values
+        series = pd.Series(values if self.last is None else np.concatenate(([self.last], values)))
+        ema = series.ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        if self.last is not None:
+            ema = ema[1:]
+        self.last = ema[-1]
+        position = self.count + np.arange(1, len(values) + 1)
+        self.count += len(values)
+        return np.where(position >= self.min_periods, ema, np.nan)
+
+
+class _Window:
+    """Cauda das últimas window-1 amostras para janelas móveis entre blocos"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.tail = np.empty(0)
+
+    def extend(self, values: np.ndarray) -> pd.Series:
+        joined = np.concatenate((self.tail, values))
+        self.tail = joined[-(self.window - 1):] if self.window > 1 else np.empty(0)
+        return pd.Series(joined)
+
+
+class SMAState:
+    def __init__(self, window: int):
+        self.window = window
+        self._buffer = _Window(window)
+
+    def columns(self) -> List[str]:
+        return [f'sma_{self.window}']
+
+    def update(self, close: np.ndarray) -> Dict[str, np.ndarray]:
+        series = self._buffer.extend(close)
+        sma = series.rolling(self.window).mean().to_numpy()[-len(close):]
+        return {f'sma_{self.window}': sma}
+
+
+class EMAState:
+    def __init__(self, span: int):
+        self.span = span
+        self._ema = _EMA(2 / (span + 1), span)
+
+    def columns(self) -> List[str]:
+        return [f'ema_{self.span}']
+
+    def update(self, close: np.ndarray) -> Dict[str, np.ndarray]:
+        return {f'ema_{self.span}': self._ema.update(close)}
+
+
+class RSIState:
+    """RSI de Wilder, igual a ta.momentum.RSIIndicator"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._up = _EMA(1 / window, window)
+        self._down = _EMA(1 / window, window)
+        self._prev = None
+
+    def columns(self) -> List[str]:
+        return [f'rsi_{self.window}']
+
+    def update(self, close: np.ndarray) -> Dict[str, np.ndarray]:
+        if len(close) == 0:
+            return {f'rsi_{self.window}': close}
+        previous = np.concatenate(([close[0] if self._prev is None else self._prev], close[:-1]))
+        self._prev = close[-1]
+        diff = close - previous
+        up = self._up.update(np.where(diff > 0, diff, 0.0))
+        down = self._down.update(np.where(diff < 0, -diff, 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(down == 0, 100.0, 100 - 100 / (1 + up / down))
+        return {f'rsi_{self.window}': np.where(np.isnan(up) | np.isnan(down), np.nan, rsi)}
+
+
+class MACDState:
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast, self.slow, self.signal = fast, slow, signal
+        self._fast = _EMA(2 / (fast + 1), fast)
+        self._slow = _EMA(2 / (slow + 1), slow)
+        self._signal = _EMA(2 / (signal + 1), signal)
+        self._suffix = '' if (fast, slow, signal) == DEFAULT_PARAMS['macd'] else f'_{fast}_{slow}_{signal}'
+
+    def columns(self) -> List[str]:
+        return [f'macd{self._suffix}', f'macd_signal{self._suffix}', f'macd_hist{self._suffix}']
+
+    def update(self, close: np.ndarray) -> Dict[str, np.ndarray]:
+        macd = self._fast.update(close) - self._slow.update(close)
+        valid = ~np.isnan(macd)
+        signal = np.full(len(close), np.nan)
+        signal[valid] = self._signal.update(macd[valid])
+        names = self.columns()
+        return {names[0]: macd, names[1]: signal, names[2]: macd - signal}
+
+
+class BollingerState:
+    def __init__(self, window: int = 20, k: float = 2):
+        self.window, self.k = window, k
+        self._buffer = _Window(window)
+        self._suffix = f'_{window}' if k == DEFAULT_PARAMS['bb'][1] else f'_{window}_{k}'
+
+    def columns(self) -> List[str]:
+        return [f'bb_upper{self._suffix}', f'bb_middle{self._suffix}', f'bb_lower{self._suffix}']
+
+    def update(self, close: np.ndarray) -> Dict[str, np.ndarray]:
+        rolling = self._buffer.extend(close).rolling(self.window)
+        mean = rolling.mean().to_numpy()[-len(close):]
+        std = rolling.std(ddof=0).to_numpy()[-len(close):]
+        names = self.columns()
+        return {names[0]: mean + self.k * std, names[1]: mean, names[2]: mean - self.k * std}
+
+
+class StochasticState:
+    """Estocástico (%K e %D), igual a ta.momentum.StochasticOscillator"""
+
+    inputs = ('High', 'Low', 'Close')
+
+    def __init__(self, window: int = 14, smooth: int = 3):
+        self.window, self.smooth = window, smooth
+        self._high = _Window(window)
+        self._low = _Window(window)
+        self._k = _Window(smooth)
+        self._suffix = f'_{window}' if smooth == DEFAULT_PARAMS['stoch'][1] else f'_{window}_{smooth}'
+
+    def columns(self) -> List[str]:
+        return [f'stoch_k{self._suffix}', f'stoch_d{self._suffix}']
+
+    def update(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> Dict[str, np.ndarray]:
+        highest = self._high.extend(high).rolling(self.window).max().to_numpy()[-len(close):]
+        lowest = self._low.extend(low).rolling(self.window).min().to_numpy()[-len(close):]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = 100 * (close - lowest) / (highest - lowest)
+        d = self._k.extend(k).rolling(self.smooth).mean().to_numpy()[-len(close):]
+        names = self.columns()
+        return {names[0]: k, names[1]: d}
+
+
+STATE_CLASSES = {
+    'sma': SMAState,
+    'ema': EMAState,
+    'rsi': RSIState,
+    'macd': MACDState,
+    'bb': BollingerState,
+    'stoch': StochasticState,
+}
+
+
+class StreamingIndicators:
+    """Indicadores calculados bloco a bloco, com estado de tamanho constante"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.states = [STATE_CLASSES[name](*params) for name, params in parse_indicator_spec(spec)]
+
+    def columns(self) -> List[str]:
+        return [column for state in self.states for column in state.columns()]
+
+    def update(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        arrays = {}
+        values = {}
+        for state in self.states:
+            inputs = getattr(state, 'inputs', ('Close',))
+            for field in inputs:
+                if field not in arrays:
+                    arrays[field] = chunk[field].to_numpy(dtype=np.float64)
+            values.update(state.update(*(arrays[field] for field in inputs)))
+        return pd.DataFrame(values, index=chunk.index, columns=self.columns())
+
+    def copy(self) -> 'StreamingIndicators':
+        return copy.deepcopy(self)
@@ -0,0 +1,119 @@
+import bisect
+import csv
+import os
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+SYMBOLS_FILE = os.getenv(
+    'SYMBOLS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'symbols.csv')
+)
+# strict: só símbolos do índice; lenient: desconhecidos vão ao Yahoo uma vez e, se vazios, são lembrados
+SYMBOL_VALIDATION = os.getenv('SYMBOL_VALIDATION', 'lenient').lower()
+# Por quanto tempo um símbolo sem dados é recusado sem consultar o provedor (segundos)
+NEGATIVE_CACHE_TTL = float(os.getenv('NEGATIVE_CACHE_TTL', '3600'))
+NEGATIVE_CACHE_MAX = int(os.getenv('NEGATIVE_CACHE_MAX', '10000'))
+
+
+def _fold(text: str) -> str:
+    """Minúsculas sem acentos, para buscar 'itau' em 'Itaú'"""
+    normalized = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in normalized if not unicodedata.combining(c)).lower()
+
+
+class SymbolIndex:
+    """Cadastro local de símbolos (B3 e EUA) em arrays ordenados para busca por prefixo"""
+
+    def __init__(self, rows: List[Dict], strict: bool = SYMBOL_VALIDATION == 'strict',
+                 negative_ttl: float = NEGATIVE_CACHE_TTL):
+        rows = sorted({row['symbol'].upper(): row for row in rows}.values(), key=lambda r: r['symbol'].upper())
+        self.rows = [dict(row, symbol=row['symbol'].upper()) for row in rows]
+        self.symbols = [row['symbol'] for row in self.rows]
+        self._known = set(self.symbols)
+        # Prefixos de cada palavra do nome: (palavra, posição da linha)
+        self._words = sorted(
+            (word, i) for i, row in enumerate(self.rows) for word in _fold(row.get('name', '')).split()
+        )
+        self._word_keys = [word for word, _ in self._words]
+        self.strict = strict
+        self.negative_ttl = negative_ttl
+        self._negative: Dict[str, float] = {}
+        self.rejections = 0
+
+    @classmethod
+    def load(cls, path: str = SYMBOLS_FILE, **kwargs) -> 'SymbolIndex':
+        with open(path, newline='', encoding='utf-8') as f:
+            return cls(list(csv.DictReader(f)), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._known
+
+    def _prefix_range(self, keys: List[str], prefix: str) -> range:
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff', lo=start)
+        return range(start, end)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Prefixo do ticker primeiro (exato no topo), depois prefixo de palavras do nome"""
+        query = query.strip()
+        if not query:
+            return []
+        found: List[int] = []
+        for i in self._prefix_range(self.symbols, query.upper()):
+            found.append(i)
+            if len(found) >= limit:
+                break
+        if len(found) < limit:
+            seen = set(found)
+            for position in self._prefix_range(self._word_keys, _fold(query)):
+                i = self._words[position][1]
+                if i not in seen:
+                    seen.add(i)
+                    found.append(i)
+                    if len(found) >= limit:
+                        break
+        return [self.rows[i] for i in found]
+
+    # ----- validação e cache negativo -----
+    def mark_invalid(self, symbol: str, now: Optional[float] = None):
+        """Lembra um símbolo fora do cadastro que não retornou dados"""
+        symbol = symbol.upper()
+        if symbol in self._known:
+            # Falha de rede em símbolo conhecido não deve bloqueá-lo
+            return
+        if len(self._negative) >= NEGATIVE_CACHE_MAX:
+            self._negative.pop(next(iter(self._negative)))
+        self._negative[symbol] = (now or time.time()) + self.negative_ttl
+
+    def validate(self, symbol: str, now: Optional[float] = None) -> Optional[str]:
+        """Mensagem de erro se o símbolo deve ser recusado sem consultar o provedor"""
+        symbol = symbol.upper()
+        if symbol in self._known:
+            return None
+        expires = self._negative.get(symbol)
+        if expires is not None:
+            if expires > (now or time.time()):
+                self.rejections += 1
+                return f'Símbolo {symbol} não encontrado'
+            del self._negative[symbol]
+        if self.strict:
+            self.rejections += 1
+            return f'Símbolo {symbol} não está no cadastro'
+        return None
+
+    def is_rejected(self, symbol: str, now: Optional[float] = None) -> bool:
+        """Mesma decisão de validate, sem contar recusa (filtro do prefetcher)"""
+        symbol = symbol.upper()
+        if symbol in self._known:
+            return False
+        expires = self._negative.get(symbol)
+        if expires is not None and expires > (now or time.time()):
+            return True
+        return self.strict
+
+    def metrics(self) -> Dict:
+        return {'symbols': len(self), 'negative_cache': len(self._negative),
+                'rejections': self.rejections, 'strict': self.strict}
@@ -0,0 +1,167 @@
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from typing import Dict, Optional
+
+# Arquivo NDJSON da captura; vazio = desligado
+TRAFFIC_CAPTURE_FILE = os.getenv('TRAFFIC_CAPTURE_FILE', '')
+# Fração dos clientes capturados (amostragem por cliente, mantém sessões inteiras)
+TRAFFIC_CAPTURE_SAMPLE = float(os.getenv('TRAFFIC_CAPTURE_SAMPLE', '1.0'))
+CAPTURE_VERSION = 1
+# Limite de mensagens do cliente registradas por conexão WebSocket
+CAPTURE_MAX_WS_MESSAGES = 2000
+
+
+def open_capture(path: str = TRAFFIC_CAPTURE_FILE, sample: float = TRAFFIC_CAPTURE_SAMPLE) -> Optional['CaptureWriter']:
+    """Writer da captura, ou None se TRAFFIC_CAPTURE_FILE não está definido"""
+    return CaptureWriter(path, sample) if path else None
+
+
+def client_key(scope, salt: bytes) -> str:
+    """Identificador anônimo do cliente: HMAC do IP (ou X-Forwarded-For) com o sal da captura
+
+    Estável dentro de uma captura; sem o sal, que nunca é gravado, não dá para voltar ao IP.
+    """
+    headers = dict(scope.get('headers') or [])
+    forwarded = headers.get(b'x-forwarded-for', b'').decode('latin-1').split(',')[0].strip()
+    client = scope.get('client')
+    address = forwarded or (client[0] if client else 'unknown')
+    return hmac.new(salt, address.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+class CaptureWriter:
+    """Grava registros NDJSON compactos numa thread, sem bloquear o event loop"""
+
+    def __init__(self, path: str, sample: float):
+        self.path = path
+        self.sample = sample
+        self.started = time.time()
+        # Sal aleatório por captura: só a impressão digital vai para o meta
+        self.salt = secrets.token_bytes(32)
+        self.records = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='traffic-capture', daemon=True)
+        self._thread.start()
+        self.write({'k': 'meta', 'v': CAPTURE_VERSION, 'started': self.started, 'sample': sample,
+                    'client_hash': 'hmac-sha256',
+                    'salt_id': hashlib.sha256(self.salt).hexdigest()[:12]})
+
+    def sampled(self, client: str) -> bool:
+        return int(client, 16) % 10000 < self.sample * 10000
+
+    def write(self, record: Dict):
+        self.records += 1
+        self._queue.put(json.dumps(record, separators=(',', ':')))
+
+    def _run(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    return
+                f.write(line + '\n')
+                # Esvazia o que já chegou antes de descarregar no disco
+                while not self._queue.empty():
+                    line = self._queue.get()
+                    if line is None:
+                        return
+                    f.write(line + '\n')
+                f.flush()
+
+    def metrics(self) -> Dict:
+        return {'file': self.path, 'sample': self.sample, 'records': self.records}
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class TrafficCaptureMiddleware:
+    """Middleware ASGI: registra método, rota, status, bytes e tempos de cada requisição (sem payloads)
+
+    HTTP: {"k":"h","t":início,"m","p","q","s":status,"d":ms,"b":bytes,"c":cliente,"sse"?}
+    WebSocket: {"k":"w","t","p","q","d":ms,"f":ms até a 1ª mensagem,"c",
+                "in":[[ms, ação, interval_ms?], ...],"out":mensagens,"b":bytes}
+    """
+
+    def __init__(self, app, writer: Optional[CaptureWriter]):
+        self.app = app
+        self.writer = writer
+
+    async def __call__(self, scope, receive, send):
+        if self.writer is None or scope['type'] not in ('http', 'websocket'):
+            return await self.app(scope, receive, send)
+        client = client_key(scope, self.writer.salt)
+        if not self.writer.sampled(client):
+            return await self.app(scope, receive, send)
+        if scope['type'] == 'http':
+            return await self._http(scope, receive, send, client)
+        return await self._websocket(scope, receive, send, client)
+
+    async def _http(self, scope, receive, send, client: str):
+        record = {'k': 'h', 't': round(time.time(), 4), 'm': scope['method'], 'p': scope['path'],
+                  'q': scope.get('query_string', b'').decode('latin-1'), 's': 0, 'b': 0, 'c': client}
+        started = time.perf_counter()
+
+        async def capture_send(message):
+            if message['type'] == 'http.response.start':
+                record['s'] = message['status']
+                # Server-sent events: o replay desconecta após a mesma duração
+                if (b'content-type', b'text/event-stream') in [
+                    (k.lower(), v.split(b';')[0]) for k, v in message.get('headers', [])
+                ]:
+                    record['sse'] = True
+            elif message['type'] == 'http.response.body':
+                record['b'] += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        finally:
+            record['d'] = round((time.perf_counter() - started) * 1000, 2)
+            self.writer.write(record)
+
+    async def _websocket(self, scope, receive, send, client: str):
+        record = {'k': 'w', 't': round(time.time(), 4), 'p': scope['path'],
+                  'q': scope.get('query_string', b'').decode('latin-1'), 'c': client,
+                  'in': [], 'out': 0, 'b': 0, 'accepted': False}
+        started = time.perf_counter()
+
+        async def capture_receive():
+            message = await receive()
+            if message['type'] == 'websocket.receive' and len(record['in']) < CAPTURE_MAX_WS_MESSAGES:
+                # Só a ação de controle (subscribe/ack/resync), nunca o conteúdo
+                try:
+                    control = json.loads(message.get('text') or '{}')
+                except ValueError:
+                    control = None
+                if not isinstance(control, dict):
+                    control = {}
+                # Pongs não são gravados: o replay responde aos pings por conta própria
+                if control.get('action') != 'pong':
+                    entry = [round((time.perf_counter() - started) * 1000, 1), control.get('action')]
+                    if 'interval_ms' in control:
+                        entry.append(control['interval_ms'])
+                    record['in'].append(entry)
+            return message
+
+        async def capture_send(message):
+            if message['type'] == 'websocket.accept':
+                record['accepted'] = True
+            elif message['type'] == 'websocket.send':
+                if not record['out']:
+                    record['f'] = round((time.perf_counter() - started) * 1000, 2)
+                record['out'] += 1
+                record['b'] += len(message.get('text') or message.get('bytes') or '')
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            record['d'] = round((time.perf_counter() - started) * 1000, 2)
+            self.writer.write(record)
@@ -0,0 +1,28 @@
+# Universos de símbolos configurados
+
+# Principais componentes do Ibovespa
+IBOVESPA = [
+    'PETR4.SA', 'PETR3.SA', 'VALE3.SA', 'ITUB4.SA', 'BBDC4.SA', 'BBAS3.SA',
+    'ABEV3.SA', 'B3SA3.SA', 'WEGE3.SA', 'ITSA4.SA', 'BPAC11.SA', 'ELET3.SA',
+    'SUZB3.SA', 'RENT3.SA', 'EQTL3.SA', 'RADL3.SA', 'PRIO3.SA', 'GGBR4.SA',
+    'JBSS3.SA', 'RDOR3.SA', 'HAPV3.SA', 'VBBR3.SA', 'CSAN3.SA', 'LREN3.SA',
+    'RAIL3.SA', 'SBSP3.SA', 'TOTS3.SA', 'UGPA3.SA', 'VIVT3.SA', 'CMIG4.SA',
+    'BBSE3.SA', 'KLBN11.SA', 'EMBR3.SA', 'HYPE3.SA', 'CPLE6.SA', 'ENEV3.SA',
+    'TIMS3.SA', 'MGLU3.SA', 'CSNA3.SA', 'USIM5.SA'
+]
+
+# Preços base usados pelos dados simulados de main_simple
+BASE_PRICES = {
+    'PETR4.SA': 35.50, 'VALE3.SA': 68.20, 'ITSA4.SA': 10.15,
+    'AAPL': 185.00, 'TSLA': 245.50, 'MSFT': 410.75
+}
+
+UNIVERSES = {
+    'ibovespa': IBOVESPA,
+    'demo': list(BASE_PRICES)
+}
+
+
+def get_universe(name: str) -> list:
+    """Retorna os símbolos de um universo (lista vazia se não existir)"""
+    return UNIVERSES.get(name.lower(), [])
@@ -0,0 +1,412 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from streaming import diff_payload
+
+logger = logging.getLogger(__name__)
+
+# Cadência padrão por cliente e limites aceitos em {"action": "subscribe", "interval_ms": ...}
+WS_DEFAULT_INTERVAL_MS = int(os.getenv('WS_DEFAULT_INTERVAL_MS', '3000'))
+WS_MIN_INTERVAL_MS = int(os.getenv('WS_MIN_INTERVAL_MS', '100'))
+WS_MAX_INTERVAL_MS = int(os.getenv('WS_MAX_INTERVAL_MS', '60000'))
+# Frequência com que o estado do mercado é recalculado (uma vez para todos os clientes)
+WS_MARKET_INTERVAL = float(os.getenv('WS_MARKET_INTERVAL', '3'))
+# Modo ack: mensagens sem confirmação antes de pausar o envio para o cliente
+WS_MAX_UNACKED = int(os.getenv('WS_MAX_UNACKED', '16'))
+WS_PER_MESSAGE_DEFLATE = os.getenv('WS_PER_MESSAGE_DEFLATE', 'true').lower() in ('1', 'true', 'yes')
+# Heartbeat de aplicação: {"type": "ping"} a cada N s; sem nenhuma mensagem do cliente até
+# WS_PING_TIMEOUT depois do ping, a conexão (ex.: meio-aberta em rede móvel) é derrubada. 0 desliga
+WS_PING_INTERVAL = float(os.getenv('WS_PING_INTERVAL', '20'))
+WS_PING_TIMEOUT = float(os.getenv('WS_PING_TIMEOUT', '10'))
+# Sem subscribe/ack/resync por esse tempo (pongs não contam) o cliente é despejado; 0 desliga
+WS_IDLE_TIMEOUT = float(os.getenv('WS_IDLE_TIMEOUT', '3600'))
+# Limites de conexões: total do processo e por IP
+WS_MAX_CONNECTIONS = int(os.getenv('WS_MAX_CONNECTIONS', '10000'))
+WS_MAX_PER_IP = int(os.getenv('WS_MAX_PER_IP', '50'))
+WS_TRUST_PROXY = os.getenv('WS_TRUST_PROXY', os.getenv('ADMISSION_TRUST_PROXY', 'false')).lower() in ('1', 'true', 'yes')
+# Orçamento de memória por conexão: estados guardados à espera de ack (estimados pelo tamanho serializado)
+WS_CLIENT_MAX_BYTES = int(os.getenv('WS_CLIENT_MAX_BYTES', str(2 * 2 ** 20)))
+# Mensagens do cliente acima disso derrubam a conexão
+WS_MAX_MESSAGE_BYTES = int(os.getenv('WS_MAX_MESSAGE_BYTES', '4096'))
+# Envio travado (cliente não lê, buffer TCP cheio) por mais que isso derruba a conexão
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '10'))
+
+# Motivo de desconexão -> código de fechamento enviado ao cliente
+CLOSE_CODES = {
+    'capacity': 1013,
+    'per_ip': 1008,
+    'message_size': 1009,
+    'heartbeat': 4000,
+    'idle': 4001,
+    'budget': 4002,
+    'send_timeout': 4003,
+}
+
+
+def encode(message: Dict) -> str:
+    return json.dumps(message, separators=(',', ':'), default=str)
+
+
+class ConnectionEvicted(Exception):
+    """Conexão encerrada pelo servidor (heartbeat, ociosidade, orçamento...)"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def client_ip(websocket: WebSocket, trust_proxy: bool = WS_TRUST_PROXY) -> str:
+    if trust_proxy:
+        forwarded = websocket.headers.get('x-forwarded-for')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return websocket.client.host if websocket.client else 'unknown'
+
+
+class WSClient:
+    """Estado de uma conexão: cadência, base dos deltas e métricas"""
+
+    def __init__(self, websocket: WebSocket, client_id: int, ip: str = 'unknown'):
+        self.websocket = websocket
+        self.id = client_id
+        self.ip = ip
+        self.peer = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+        self.interval = WS_DEFAULT_INTERVAL_MS / 1000
+        self.ack_mode = False
+        self.seq = 0
+        self.sent_version = 0
+        self.base_seq: Optional[int] = None
+        self.base_state: Optional[Dict] = None
+        # seq -> estado enviado ainda sem ack
+        self.unacked: OrderedDict = OrderedDict()
+        self.connected_at = time.time()
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.full_bytes = 0
+        self.snapshots = 0
+        self.deltas = 0
+        self.coalesced = 0
+        self.messages_received = 0
+        self.resync = False
+        self._control = asyncio.Event()
+        # Ciclo de vida (relógio monotônico): qualquer mensagem prova que a conexão está viva
+        now = time.monotonic()
+        self.last_received = now
+        self.last_active = now
+        self.next_ping = now + WS_PING_INTERVAL if WS_PING_INTERVAL > 0 else float('inf')
+        self.ping_sent_at: Optional[float] = None
+        self.pings_sent = 0
+        self.pongs = 0
+        self.rtt_ms: Optional[float] = None
+        self.retained_bytes = 0
+
+    def handle(self, message: Dict):
+        """Mensagens do cliente: subscribe (cadência/ack), ack, resync e pong"""
+        self.messages_received += 1
+        now = time.monotonic()
+        self.last_received = now
+        self.ping_sent_at = None
+        action = message.get('action')
+        if action == 'pong':
+            self.pongs += 1
+            if isinstance(message.get('t'), (int, float)):
+                self.rtt_ms = round(time.time() * 1000 - message['t'], 1)
+            return
+        self.last_active = now
+        if action == 'subscribe':
+            if 'interval_ms' in message:
+                interval_ms = min(max(int(message['interval_ms']), WS_MIN_INTERVAL_MS), WS_MAX_INTERVAL_MS)
+                self.interval = interval_ms / 1000
+            if 'ack' in message:
+                self.ack_mode = bool(message['ack'])
+                self.unacked.clear()
+        elif action == 'ack':
+            seq = message.get('seq')
+            if seq in self.unacked:
+                self.base_seq, self.base_state = seq, self.unacked[seq]
+                while self.unacked and next(iter(self.unacked)) <= seq:
+                    self.unacked.popitem(last=False)
+        elif action == 'resync':
+            self.base_seq, self.base_state = None, None
+            self.unacked.clear()
+            self.resync = True
+        self._control.set()
+
+    def ping(self, now: float) -> Dict:
+        if self.ping_sent_at is None:
+            self.ping_sent_at = now
+        self.next_ping = now + WS_PING_INTERVAL
+        self.pings_sent += 1
+        return {'type': 'ping', 't': round(time.time() * 1000)}
+
+    def deadline(self) -> float:
+        """Próximo instante em que o laço de envio precisa acordar (ping ou prazo de despejo)"""
+        deadline = self.next_ping
+        if self.ping_sent_at is not None:
+            deadline = min(deadline, self.ping_sent_at + WS_PING_TIMEOUT)
+        if WS_IDLE_TIMEOUT > 0:
+            deadline = min(deadline, self.last_active + WS_IDLE_TIMEOUT)
+        return deadline
+
+    def expired(self, now: float) -> Optional[str]:
+        if self.ping_sent_at is not None and now - self.ping_sent_at > WS_PING_TIMEOUT:
+            return 'heartbeat'
+        if WS_IDLE_TIMEOUT > 0 and now - self.last_active > WS_IDLE_TIMEOUT:
+            return 'idle'
+        return None
+
+    async def wait_control(self, timeout: float):
+        """Dorme até o timeout ou até o cliente mudar a assinatura"""
+        self._control.clear()
+        try:
+            await asyncio.wait_for(self._control.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def build_message(self, state: Dict) -> Optional[Dict]:
+        """Snapshot se não há base, senão só os campos alterados (None se nada mudou)"""
+        if self.base_state is None:
+            self.seq += 1
+            message = {'type': 'snapshot', 'seq': self.seq, 'data': state}
+            self.snapshots += 1
+        else:
+            delta = diff_payload(self.base_state, state)
+            if not delta:
+                return None
+            self.seq += 1
+            message = {'type': 'delta', 'seq': self.seq, 'base': self.base_seq, 'data': delta}
+            self.deltas += 1
+        if self.ack_mode:
+            self.unacked[self.seq] = state
+        else:
+            # Sem ack, a base é o último estado enviado (TCP garante a entrega em ordem)
+            self.base_seq, self.base_state = self.seq, state
+        return message
+
+    def metrics(self) -> Dict:
+        return {
+            'id': self.id,
+            'peer': self.peer,
+            'interval_ms': int(self.interval * 1000),
+            'ack_mode': self.ack_mode,
+            'unacked': len(self.unacked),
+            'messages_sent': self.messages_sent,
+            'snapshots': self.snapshots,
+            'deltas': self.deltas,
+            'coalesced_updates': self.coalesced,
+            'bytes_sent': self.bytes_sent,
+            'bytes_full_equivalent': self.full_bytes,
+            'messages_received': self.messages_received,
+            'pings_sent': self.pings_sent,
+            'pongs': self.pongs,
+            'rtt_ms': self.rtt_ms,
+            'retained_bytes': self.retained_bytes,
+            'idle_seconds': round(time.monotonic() - self.last_active, 1),
+            'silent_seconds': round(time.monotonic() - self.last_received, 1),
+            'connected_seconds': round(time.time() - self.connected_at, 1)
+        }
+
+
+class MarketFeed:
+    """Estado do mercado calculado uma vez e distribuído em deltas na cadência de cada cliente"""
+
+    def __init__(self, build_state: Callable[[], Dict], interval: float = WS_MARKET_INTERVAL):
+        self.build_state = build_state
+        self.interval = interval
+        self.state: Dict = {}
+        self.version = 0
+        self.clients: Set[WSClient] = set()
+        self._changed: Optional[asyncio.Event] = None
+        self._full_size = (0, 0)
+        self._next_id = 0
+        # Conexões por IP (inclui as ainda no handshake)
+        self.per_ip: Dict[str, int] = defaultdict(int)
+        self.open_connections = 0
+        self.totals = {'connections': 0, 'messages_sent': 0, 'bytes_sent': 0, 'bytes_full_equivalent': 0,
+                       'pings_sent': 0, 'rejected': {'capacity': 0, 'per_ip': 0},
+                       'evicted': {reason: 0 for reason in ('heartbeat', 'idle', 'budget', 'send_timeout',
+                                                            'message_size')}}
+
+    def publish(self, updates: Dict):
+        """Mescla campos alterados e acorda os clientes (rajadas são coalescidas no envio)"""
+        self.state = dict(self.state, **updates)
+        self.version += 1
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def wait_change(self, version: int, timeout: Optional[float] = None):
+        if self.version != version:
+            return
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def full_size(self) -> int:
+        """Tamanho do estado completo (calculado uma vez por versão)"""
+        if self._full_size[0] != self.version:
+            self._full_size = (self.version, len(encode(self.state)))
+        return self._full_size[1]
+
+    async def run(self):
+        """Recalcula o estado periodicamente, só enquanto houver clientes"""
+        while True:
+            try:
+                if self.clients:
+                    self.publish(self.build_state())
+            except Exception as e:
+                logger.error(f"Erro ao montar estado do mercado: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _send(self, client: WSClient, message: Dict) -> str:
+        raw = encode(message)
+        try:
+            await asyncio.wait_for(client.websocket.send_text(raw), WS_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ConnectionEvicted('send_timeout')
+        return raw
+
+    async def _send_loop(self, client: WSClient):
+        last_sent = float('-inf')
+        while True:
+            now = time.monotonic()
+            reason = client.expired(now)
+            if reason:
+                raise ConnectionEvicted(reason)
+            if now >= client.next_ping:
+                await self._send(client, client.ping(now))
+                self.totals['pings_sent'] += 1
+                continue
+            if not client.resync:
+                await self.wait_change(client.sent_version, client.deadline() - now)
+                if client.sent_version == self.version:
+                    continue
+            # Recalculado a cada volta: uma nova cadência vale imediatamente
+            delay = last_sent + client.interval - time.monotonic()
+            if delay > 0:
+                await client.wait_control(min(delay, max(client.deadline() - time.monotonic(), 0)))
+                continue
+            if client.ack_mode and len(client.unacked) >= WS_MAX_UNACKED:
+                # Cliente lento: espera acks em vez de acumular mensagens
+                await client.wait_control(min(client.interval, max(client.deadline() - time.monotonic(), 0)))
+                continue
+            if client.sent_version == self.version and not client.resync:
+                continue
+            client.resync = False
+            client.coalesced += max(self.version - client.sent_version - 1, 0)
+            client.sent_version = self.version
+            message = client.build_message(self.state)
+            if message is None:
+                continue
+            # Estados guardados à espera de ack (cada um do tamanho do estado completo, no pior caso)
+            client.retained_bytes = len(client.unacked) * self.full_size()
+            if client.retained_bytes > WS_CLIENT_MAX_BYTES:
+                raise ConnectionEvicted('budget')
+            raw = await self._send(client, message)
+            client.messages_sent += 1
+            client.bytes_sent += len(raw)
+            client.full_bytes += self.full_size()
+            self.totals['messages_sent'] += 1
+            self.totals['bytes_sent'] += len(raw)
+            self.totals['bytes_full_equivalent'] += self.full_size()
+            last_sent = time.monotonic()
+
+    async def _receive_loop(self, client: WSClient):
+        while True:
+            raw = await client.websocket.receive_text()
+            if len(raw) > WS_MAX_MESSAGE_BYTES:
+                raise ConnectionEvicted('message_size')
+            try:
+                client.handle(json.loads(raw))
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.debug(f"Mensagem inválida do cliente {client.id}: {e}")
+
+    def _admit(self, ip: str) -> Optional[str]:
+        """Reserva a vaga da conexão, ou o motivo da recusa"""
+        if self.open_connections >= WS_MAX_CONNECTIONS:
+            return 'capacity'
+        if self.per_ip[ip] >= WS_MAX_PER_IP:
+            return 'per_ip'
+        self.open_connections += 1
+        self.per_ip[ip] += 1
+        return None
+
+    def _release(self, ip: str):
+        self.open_connections -= 1
+        self.per_ip[ip] -= 1
+        if self.per_ip[ip] <= 0:
+            del self.per_ip[ip]
+
+    async def _close(self, websocket: WebSocket, reason: str):
+        try:
+            await asyncio.wait_for(websocket.close(code=CLOSE_CODES[reason], reason=reason), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def serve(self, websocket: WebSocket):
+        """Admite (limites global e por IP), aceita e atende a conexão até o cliente desconectar"""
+        ip = client_ip(websocket)
+        rejected = self._admit(ip)
+        if rejected:
+            self.totals['rejected'][rejected] += 1
+            # Antes do accept: o cliente recebe 403 no handshake
+            await websocket.close(code=CLOSE_CODES[rejected])
+            return
+        try:
+            await websocket.accept()
+            self._next_id += 1
+            client = WSClient(websocket, self._next_id, ip)
+            self.clients.add(client)
+            self.totals['connections'] += 1
+            if not self.state:
+                self.publish(self.build_state())
+            tasks = [asyncio.create_task(self._send_loop(client)), asyncio.create_task(self._receive_loop(client))]
+            try:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    error = task.exception()
+                    if isinstance(error, ConnectionEvicted):
+                        self.totals['evicted'][error.reason] += 1
+                        logger.info(f"WebSocket {client.id} ({ip}) encerrado: {error.reason}")
+                        await self._close(websocket, error.reason)
+                    elif error is not None and not isinstance(error, WebSocketDisconnect):
+                        logger.warning(f"WebSocket {client.id}: {error}")
+            finally:
+                for task in tasks:
+                    task.cancel()
+                # Recolhe as tarefas canceladas: um despejo que chegue depois do cancelamento não fica órfão
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self.clients.discard(client)
+        finally:
+            self._release(ip)
+
+    def metrics(self, limit: Optional[int] = None) -> Dict:
+        totals = dict(self.totals)
+        full = totals['bytes_full_equivalent']
+        totals['bandwidth_saved_percent'] = round((1 - totals['bytes_sent'] / full) * 100, 2) if full else None
+        clients = sorted(self.clients, key=lambda c: c.id)
+        rtts = sorted(c.rtt_ms for c in clients if c.rtt_ms is not None)
+        return {
+            'clients': len(self.clients),
+            'version': self.version,
+            'totals': totals,
+            'limits': {'max_connections': WS_MAX_CONNECTIONS, 'max_per_ip': WS_MAX_PER_IP,
+                       'ping_interval': WS_PING_INTERVAL, 'ping_timeout': WS_PING_TIMEOUT,
+                       'idle_timeout': WS_IDLE_TIMEOUT, 'client_max_bytes': WS_CLIENT_MAX_BYTES},
+            'rtt_ms_p50': rtts[len(rtts) // 2] if rtts else None,
+            'retained_bytes': sum(c.retained_bytes for c in clients),
+            'top_ips': sorted(self.per_ip.items(), key=lambda item: -item[1])[:10],
+            'per_client': [client.metrics() for client in clients[:limit]]
+        }
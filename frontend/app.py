@@ -1,10 +1,15 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import requests
+import plotly.graph_objects as go
 from datetime import datetime
 
+from config import BACKEND_URL
+
 # Importar a página de análise técnica simplificada
 from tech_analysis_simple import show_technical_analysis
+from live_market_page import show_live_market
 
 # Configuração da página
 st.set_page_config(
@@ -37,28 +42,63 @@ def show_home():
     with col3:
         st.metric("⏰ Atualizado", "Agora")
 
+@st.cache_data(ttl=30)
+def fetch_market_breadth(universe):
+    """Busca amplitude de mercado no backend (compartilhada entre sessões)"""
+    response = requests.get(f"{BACKEND_URL}/api/market-breadth", params={"universe": universe}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
 def show_dashboard():
     st.title("📊 Dashboard Interativo")
     st.markdown("Visualização de dados de mercado")
     
-    # Dados simulados do dashboard
+    universe = st.selectbox("Universo:", ["ibovespa", "demo"])
+    
+    try:
+        breadth = fetch_market_breadth(universe)
+    except Exception as e:
+        st.error(f"🔌 Erro ao buscar dados de mercado: {e}")
+        return
+    
+    if not breadth.get('symbols'):
+        st.info("⏳ Dados de mercado sendo carregados, tente novamente em instantes")
+        return
+    
+    # Amplitude
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📈 Altas / 📉 Baixas", f"{breadth['advancers']} / {breadth['decliners']}")
+    with col2:
+        st.metric("Acima da SMA 20", f"{breadth['pct_above_sma_20'] or 0:.0f}%")
+    with col3:
+        st.metric("Acima da SMA 50", f"{breadth['pct_above_sma_50'] or 0:.0f}%")
+    with col4:
+        st.metric("Máximas / Mínimas 52s", f"{breadth['new_highs']} / {breadth['new_lows']}")
+    
     col1, col2 = st.columns(2)
     
     with col1:
-        st.subheader("📈 Performance")
-        data = pd.DataFrame({
-            'Mês': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai'],
-            'IBOV': [100, 105, 102, 110, 108]
-        })
-        st.line_chart(data.set_index('Mês'))
+        st.subheader("📈 Performance (índice equal-weight)")
+        curve = pd.DataFrame(breadth['index_curve'])
+        if not curve.empty:
+            st.line_chart(curve.set_index('date'))
     
     with col2:
         st.subheader("🎯 Setores")
-        setores = pd.DataFrame({
-            'Setor': ['Financeiro', 'Energia', 'Tecnologia', 'Varejo'],
-            'Performance': [12, 8, 15, 5]
-        })
-        st.bar_chart(setores.set_index('Setor'))
+        sectors = pd.DataFrame(breadth['sectors']).set_index('sector')
+        horizons = ['return_1d', 'return_1w', 'return_1m']
+        fig = go.Figure(go.Heatmap(
+            z=sectors[horizons].values,
+            x=['1 dia', '1 semana', '1 mês'],
+            y=sectors.index,
+            colorscale='RdYlGn',
+            zmid=0,
+            text=sectors[horizons].round(2).values,
+            texttemplate="%{text}%"
+        ))
+        fig.update_layout(height=400, margin=dict(l=0, r=0, t=20, b=0))
+        st.plotly_chart(fig, use_container_width=True)
 
 # Menu de navegação
 def main():
@@ -66,7 +106,7 @@ def main():
     
     page = st.sidebar.selectbox(
         "Escolha uma página:",
-        ["🏠 Página Inicial", "📊 Dashboard", "🔍 Análise Técnica"]
+        ["🏠 Página Inicial", "📊 Dashboard", "🔍 Análise Técnica", "⚡ Mercado Ao Vivo"]
     )
     
     st.sidebar.markdown("---")
@@ -81,6 +121,8 @@ def main():
         show_dashboard()
     elif page == "🔍 Análise Técnica":
         show_technical_analysis()
+    elif page == "⚡ Mercado Ao Vivo":
+        show_live_market()
 
 if __name__ == "__main__":
     main()
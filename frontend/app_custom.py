@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 import time
 import json
 
+from live_market_page import show_live_market
+
 st.set_page_config(
     page_title="Market Intelligence Pro",
     page_icon="📊",
@@ -68,3 +70,5 @@ st.sidebar.markdown("Analista de Dados & Desenvolvedor")
 st.sidebar.markdown("📧 seu.email@provedor.com")
 st.sidebar.markdown("🔗 [Seu LinkedIn](https://linkedin.com/in/seu-perfil)")
 
+if page == "⚡ Mercado Ao Vivo":
+    show_live_market()
@@ -0,0 +1,42 @@
+import requests
+import streamlit as st
+
+from config import TECH_ANALYSIS_URL
+
+
+class ChartPending(Exception):
+    """Backend ainda sem as barras do símbolo (tentar de novo em instantes)"""
+
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def fetch_chart(symbol, chart, last_bar, interval="1d"):
+    """Figure JSON montado pelo backend; last_bar na chave faz cada barra nova buscar um só figure,
+    compartilhado por todas as sessões"""
+    response = requests.get(f"{TECH_ANALYSIS_URL}/api/charts/{symbol}",
+                            params={"chart": chart, "interval": interval}, timeout=10)
+    # 404 em backends sem /api/charts (ex.: main_simple)
+    response.raise_for_status()
+    payload = response.json()
+    if not payload.get('success'):
+        # Não guarda erros/pendências no cache: a próxima execução tenta de novo
+        if payload.get('pending'):
+            raise ChartPending(payload['error'])
+        raise RuntimeError(payload.get('error', 'Gráfico indisponível'))
+    return payload['figure']
+
+
+def show_chart(symbol, chart, last_bar, fallback):
+    """Exibe o gráfico em cache; fallback() desenha a versão local quando o backend não o serve"""
+    if last_bar is None:
+        # Resposta sem last_bar: backend antigo, sem /api/charts
+        fallback()
+        return
+    try:
+        figure = fetch_chart(symbol, chart, last_bar)
+    except ChartPending as e:
+        st.info(f"⏳ {e}")
+        return
+    except Exception:
+        fallback()
+        return
+    st.plotly_chart(figure, use_container_width=True)
@@ -11,3 +11,6 @@ def get_backend_url():
         return "http://localhost:8000"
 
 BACKEND_URL = get_backend_url()
+
+# Backend das páginas de análise técnica: análise e gráficos sempre do mesmo servidor
+TECH_ANALYSIS_URL = os.getenv('TECH_ANALYSIS_URL', "https://dashboard-mercado-tempo-real-production.up.railway.app")
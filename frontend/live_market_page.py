@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from websockets.sync.client import connect
+
+from config import BACKEND_URL
+
+WS_URL = BACKEND_URL.replace("http", "ws", 1) + "/ws"
+# Mensagens guardadas por símbolo
+BUFFER_SIZE = 300
+# Intervalo mínimo entre re-renderizações dos fragmentos (segundos)
+REFRESH_SECONDS = 2
+MARKET_KEY = "__market__"
+
+
+def apply_delta(state, delta):
+    """Aplica um delta do servidor (dicts aninhados chegam como diffs parciais)"""
+    merged = dict(state)
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = dict(merged[key], **value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class LiveMarketFeed:
+    """Cliente WebSocket único por processo do Streamlit, compartilhado entre sessões"""
+
+    def __init__(self, url: str, buffer_size: int = BUFFER_SIZE):
+        self.url = url
+        self.buffers = defaultdict(lambda: deque(maxlen=buffer_size))
+        self.latest = {}
+        self.connected = False
+        self.last_error = None
+        self.messages = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="live-market-feed", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                with connect(self.url, open_timeout=10) as ws:
+                    self.connected, self.last_error, backoff = True, None, 1
+                    # Cadência igual à das re-renderizações; deltas confirmados com ack
+                    ws.send(json.dumps({"action": "subscribe", "interval_ms": REFRESH_SECONDS * 1000, "ack": True}))
+                    states = {}
+                    for raw in ws:
+                        message = json.loads(raw)
+                        if message.get("type") == "ping":
+                            # Heartbeat do servidor: sem resposta a conexão é derrubada
+                            ws.send(json.dumps({"action": "pong", "t": message.get("t")}))
+                            continue
+                        if message.get("type") == "snapshot":
+                            state = message["data"]
+                        elif message.get("base") in states:
+                            state = apply_delta(states[message["base"]], message["data"])
+                        else:
+                            ws.send(json.dumps({"action": "resync"}))
+                            continue
+                        states = {seq: s for seq, s in states.items() if seq >= message.get("base", 0)}
+                        states[message["seq"]] = state
+                        ws.send(json.dumps({"action": "ack", "seq": message["seq"]}))
+                        self._handle(state)
+            except Exception as e:
+                self.last_error = str(e)
+            self.connected = False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _handle(self, message):
+        timestamp = message.get("timestamp")
+        with self._lock:
+            self.latest = message
+            self.messages += 1
+            self.buffers[MARKET_KEY].append({
+                "timestamp": timestamp,
+                "market_pulse": message.get("market_pulse"),
+                "opportunity_score": message.get("opportunity_score")
+            })
+            for performer in message.get("top_performers", []):
+                self.buffers[performer["symbol"]].append({
+                    "timestamp": timestamp,
+                    "price": performer.get("price"),
+                    "change": performer.get("change")
+                })
+
+    def symbols(self):
+        with self._lock:
+            return sorted(s for s in self.buffers if s != MARKET_KEY)
+
+    def history(self, symbol):
+        with self._lock:
+            return list(self.buffers.get(symbol, ()))
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.latest)
+
+
+@st.cache_resource
+def get_live_feed():
+    return LiveMarketFeed(WS_URL)
+
+
+def show_live_market():
+    """Página de mercado ao vivo: só métricas e gráfico são re-renderizados"""
+    st.header("⚡ Mercado Ao Vivo")
+    st.markdown("Atualizações em tempo real via WebSocket")
+
+    feed = get_live_feed()
+    symbols = feed.symbols()
+    symbol = st.selectbox("Símbolo:", symbols) if symbols else None
+
+    live_metrics(feed)
+    if symbol:
+        live_chart(feed, symbol)
+    else:
+        st.info("⏳ Aguardando dados do servidor...")
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_metrics(feed):
+    latest = feed.snapshot()
+    if not feed.connected:
+        st.warning(f"🔌 Reconectando ao servidor... {feed.last_error or ''}")
+    if not latest:
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("💓 Pulso do Mercado", f"{latest.get('market_pulse', 0):.2f}")
+    with col2:
+        st.metric("🎯 Oportunidade", f"{latest.get('opportunity_score', 0):.0f}")
+    with col3:
+        st.metric("⚠️ Risco", latest.get("risk_level", "-"))
+
+    for performer in latest.get("top_performers", []):
+        st.write(f"📈 **{performer['symbol']}**: {performer['change']:+.2f}%")
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_chart(feed, symbol):
+    history = pd.DataFrame(feed.history(symbol))
+    if history.empty:
+        return
+
+    fig = go.Figure(go.Scatter(
+        x=pd.to_datetime(history["timestamp"]),
+        y=history["price"],
+        mode="lines",
+        name=symbol,
+        line=dict(color="#2E86AB", width=3)
+    ))
+    fig.update_layout(title=f"{symbol} - Ao Vivo", xaxis_title="Hora", yaxis_title="Preço", height=400)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+if __name__ == "__main__":
+    show_live_market()
@@ -0,0 +1,31 @@
+import requests
+import streamlit as st
+
+from config import BACKEND_URL
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def search_symbols(query):
+    """Sugestões de símbolos do cadastro local do backend"""
+    try:
+        response = requests.get(f"{BACKEND_URL}/api/symbols/search", params={"q": query, "limit": 10}, timeout=3)
+        return response.json().get('results', [])
+    except Exception:
+        return []
+
+
+def symbol_picker(default, placeholder, key):
+    """Campo de busca com autocomplete; retorna o símbolo escolhido"""
+    query = st.text_input("**🔍 Digite o símbolo ou nome da empresa:**", default,
+                          placeholder=placeholder, key=f"{key}_query").strip()
+    if not query:
+        return ""
+
+    results = search_symbols(query)
+    options = [row['symbol'] for row in results]
+    labels = {row['symbol']: f"{row['symbol']} — {row['name']}" for row in results}
+    # Mantém o texto digitado como opção para símbolos fora do cadastro
+    if query.upper() not in options:
+        options.append(query.upper())
+    return st.selectbox("Sugestões", options, format_func=lambda s: labels.get(s, s),
+                        key=f"{key}_choice", label_visibility="collapsed")
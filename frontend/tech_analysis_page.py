@@ -3,7 +3,11 @@ import requests
 import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from chart_cache import show_chart
+from config import TECH_ANALYSIS_URL
+from symbol_search import symbol_picker
 
 def show_technical_analysis():
     """Página completa de Análise Técnica"""
@@ -15,11 +19,7 @@ def show_technical_analysis():
     col1, col2, col3 = st.columns([3, 1, 1])
     
     with col1:
-        symbol = st.text_input(
-            "**🔍 Digite o símbolo da ação:**", 
-            "AAPL",
-            placeholder="Ex: AAPL, TSLA, MSFT, PETR4.SA"
-        ).upper()
+        symbol = symbol_picker("AAPL", "Ex: AAPL, TSLA, MSFT, PETR4.SA", key="tech_symbol")
     
     with col2:
         analyze_btn = st.button("🚀 Analisar", use_container_width=True)
@@ -30,21 +30,20 @@ def show_technical_analysis():
     
     if analyze_btn and symbol:
         analyze_stock(symbol)
-    elif symbol and len(symbol) > 1:
-        # Analisa automaticamente após digitar
-        analyze_stock(symbol)
 
 def analyze_stock(symbol):
     """Faz a análise da ação"""
     with st.spinner(f"📈 Analisando {symbol}..."):
         try:
-            response = requests.get(f"https://dashboard-mercado-tempo-real-production.up.railway.app/api/tech-analysis/{symbol}")
+            response = requests.get(f"{TECH_ANALYSIS_URL}/api/tech-analysis/{symbol}")
             
             if response.status_code == 200:
                 data = response.json()
                 
                 if data.get('success'):
                     display_analysis_results(data)
+                elif data.get('pending'):
+                    st.info(f"⏳ {data['error']}")
                 else:
                     st.error(f"❌ Erro: {data.get('error', 'Erro desconhecido')}")
             else:
@@ -60,6 +59,8 @@ def display_analysis_results(data):
     symbol = data['symbol']
     indicators = data['indicators']
     signals = data['signals']
+    # Versão da última barra: chave do cache dos gráficos
+    last_bar = data.get('last_bar')
     
     # ===== CABEÇALHO COM MÉTRICAS =====
     st.subheader(f"📈 {symbol} - Análise Técnica")
@@ -100,17 +101,17 @@ def display_analysis_results(data):
         macd = indicators['macd']
         st.metric("🔄 MACD", f"{macd:.4f}")
     
-    # ===== GRÁFICOS SIMULADOS =====
+    # ===== GRÁFICOS =====
     st.subheader("📊 Visualização dos Indicadores")
     
     # Abas para diferentes visualizações
     tab1, tab2, tab3 = st.tabs(["📈 Preço & Tendência", "🎯 Momentum", "📋 Resumo"])
     
     with tab1:
-        display_price_chart(symbol, indicators)
+        display_price_chart(symbol, indicators, last_bar)
     
     with tab2:
-        display_momentum_indicators(indicators)
+        display_momentum_indicators(symbol, indicators, last_bar)
     
     with tab3:
         display_summary(symbol, indicators, signals)
@@ -125,6 +126,9 @@ def display_analysis_results(data):
         for signal_name, signal_value in signals.items():
             if signal_name != 'overall_signal':
                 display_signal(signal_name, signal_value)
+        if data.get('patterns'):
+            names = ", ".join(PATTERN_NAMES.get(p, p.replace('_', ' ').title()) for p in data['patterns'])
+            st.write(f"🕯️ **Padrões na última barra:** {names}")
     
     with col2:
         st.write("**📈 Valores dos Indicadores:**")
@@ -134,8 +138,12 @@ def display_analysis_results(data):
     st.subheader("💡 Interpretação e Recomendação")
     display_interpretation(signals, indicators)
 
-def display_price_chart(symbol, indicators):
-    """Gráfico de preço simulado"""
+def display_price_chart(symbol, indicators, last_bar):
+    """Preço e médias móveis (figure montado e cacheado no backend)"""
+    show_chart(symbol, "price", last_bar, lambda: display_simulated_price_chart(symbol, indicators))
+
+def display_simulated_price_chart(symbol, indicators):
+    """Gráfico de preço simulado (backend sem /api/charts)"""
     # Gerar dados simulados
     dates = pd.date_range(end=datetime.now(), periods=50, freq='D')
     base_price = indicators['current_price']
@@ -183,51 +191,52 @@ def display_price_chart(symbol, indicators):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def display_momentum_indicators(indicators):
+def display_momentum_indicators(symbol, indicators, last_bar):
     """Gráficos de momentum"""
-    col1, col2 = st.columns(2)
+    show_chart(symbol, "momentum", last_bar, lambda: display_rsi_gauge(indicators))
     
-    with col1:
-        # Gráfico RSI
-        rsi_value = indicators['rsi']
-        fig_rsi = go.Figure()
-        
-        fig_rsi.add_trace(go.Indicator(
-            mode="gauge+number",
-            value=rsi_value,
-            title={'text': "RSI (14)"},
-            gauge={
-                'axis': {'range': [0, 100]},
-                'bar': {'color': "darkblue"},
-                'steps': [
-                    {'range': [0, 30], 'color': "lightgreen"},
-                    {'range': [30, 70], 'color': "lightyellow"},
-                    {'range': [70, 100], 'color': "lightcoral"}
-                ],
-                'threshold': {
-                    'line': {'color': "red", 'width': 4},
-                    'thickness': 0.75,
-                    'value': rsi_value
-                }
-            }
-        ))
-        
-        fig_rsi.update_layout(height=300)
-        st.plotly_chart(fig_rsi, use_container_width=True)
+    # Leitura do MACD na última barra
+    macd = indicators['macd']
+    macd_signal = indicators['macd_signal']
     
-    with col2:
-        # Gráfico MACD
-        macd = indicators['macd']
-        macd_signal = indicators['macd_signal']
-        
-        st.write("**🔄 MACD:**")
+    col1, col2 = st.columns(2)
+    with col1:
         st.metric("MACD Line", f"{macd:.4f}")
+    with col2:
         st.metric("Signal Line", f"{macd_signal:.4f}")
-        
-        if macd > macd_signal:
-            st.success("📈 MACD acima da linha de sinal - **Momentum positivo**")
-        else:
-            st.warning("📉 MACD abaixo da linha de sinal - **Momentum negativo**")
+    
+    if macd > macd_signal:
+        st.success("📈 MACD acima da linha de sinal - **Momentum positivo**")
+    else:
+        st.warning("📉 MACD abaixo da linha de sinal - **Momentum negativo**")
+
+def display_rsi_gauge(indicators):
+    """Medidor do RSI atual (backend sem /api/charts)"""
+    rsi_value = indicators['rsi']
+    fig_rsi = go.Figure()
+    
+    fig_rsi.add_trace(go.Indicator(
+        mode="gauge+number",
+        value=rsi_value,
+        title={'text': "RSI (14)"},
+        gauge={
+            'axis': {'range': [0, 100]},
+            'bar': {'color': "darkblue"},
+            'steps': [
+                {'range': [0, 30], 'color': "lightgreen"},
+                {'range': [30, 70], 'color': "lightyellow"},
+                {'range': [70, 100], 'color': "lightcoral"}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': rsi_value
+            }
+        }
+    ))
+    
+    fig_rsi.update_layout(height=300)
+    st.plotly_chart(fig_rsi, use_container_width=True)
 
 def display_summary(symbol, indicators, signals):
     """Resumo da análise"""
@@ -258,12 +267,26 @@ def display_summary(symbol, indicators, signals):
     df = pd.DataFrame(summary_data)
     st.dataframe(df, use_container_width=True, hide_index=True)
 
+# Nomes dos padrões de candlestick devolvidos pelo backend
+PATTERN_NAMES = {
+    'doji': 'Doji',
+    'hammer': 'Martelo',
+    'shooting_star': 'Estrela Cadente',
+    'bullish_engulfing': 'Engolfo de Alta',
+    'bearish_engulfing': 'Engolfo de Baixa',
+    'morning_star': 'Estrela da Manhã',
+    'evening_star': 'Estrela da Tarde',
+    'three_white_soldiers': 'Três Soldados Brancos',
+    'three_black_crows': 'Três Corvos Negros'
+}
+
 def display_signal(signal_name, signal_value):
     """Exibe um sinal individual"""
     signal_display = {
         'rsi_signal': '📊 RSI',
         'macd_signal': '🔄 MACD', 
-        'trend_signal': '📈 Tendência'
+        'trend_signal': '📈 Tendência',
+        'pattern_signal': '🕯️ Candlestick'
     }
     
     icon = "✅" if signal_value == "COMPRA" else "❌" if signal_value == "VENDA" else "➖"
@@ -3,7 +3,11 @@ import requests
 import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from chart_cache import show_chart
+from config import TECH_ANALYSIS_URL
+from symbol_search import symbol_picker
 
 def show_technical_analysis():
     """Página simplificada de Análise Técnica compatível com backend atual"""
@@ -15,31 +19,27 @@ def show_technical_analysis():
     col1, col2 = st.columns([3, 1])
     
     with col1:
-        symbol = st.text_input(
-            "**🔍 Digite o símbolo da ação:**", 
-            "PETR4.SA",
-            placeholder="Ex: PETR4.SA, VALE3.SA, AAPL, TSLA"
-        ).upper()
+        symbol = symbol_picker("PETR4.SA", "Ex: PETR4.SA, VALE3.SA, AAPL, TSLA", key="tech_symbol")
     
     with col2:
         analyze_btn = st.button("🚀 Analisar", use_container_width=True)
     
     if analyze_btn and symbol:
         analyze_stock(symbol)
-    elif symbol and len(symbol) > 1:
-        analyze_stock(symbol)
 
 def analyze_stock(symbol):
     """Faz a análise da ação"""
     with st.spinner(f"📈 Analisando {symbol}..."):
         try:
-            response = requests.get(f"https://dashboard-mercado-tempo-real-production.up.railway.app/api/tech-analysis/{symbol}")
+            response = requests.get(f"{TECH_ANALYSIS_URL}/api/tech-analysis/{symbol}")
             
             if response.status_code == 200:
                 data = response.json()
                 
                 if data.get('success'):
                     display_analysis_results(data)
+                elif data.get('pending'):
+                    st.info(f"⏳ {data['error']}")
                 else:
                     st.error(f"❌ {data.get('error', 'Erro desconhecido')}")
             else:
@@ -50,12 +50,17 @@ def analyze_stock(symbol):
         except Exception as e:
             st.error(f"💥 Erro: {e}")
 
+def currency_symbol(currency):
+    """R$ para ativos em BRL, $ para USD (moeda informada pelo backend)"""
+    return "$" if currency == "USD" else "R$"
+
 def display_analysis_results(data):
     """Exibe os resultados da análise"""
     symbol = data['symbol']
     indicators = data['indicators']
     signals = data['signals']
     is_simulated = data.get('simulated', False)
+    money = currency_symbol(data.get('currency'))
     
     # Aviso se são dados simulados
     if is_simulated:
@@ -68,7 +73,7 @@ def display_analysis_results(data):
     
     with col1:
         price = indicators['current_price']
-        st.metric("💵 Preço Atual", f"R$ {price}")
+        st.metric("💵 Preço Atual", f"{money} {price}")
     
     with col2:
         signal = signals['overall_signal']
@@ -76,11 +81,12 @@ def display_analysis_results(data):
         st.metric("🎯 Sinal", signal, delta_color="off")
     
     with col3:
-        rsi = indicators['rsi']
+        # 'rsi' no formato original (main e main_simple); 'rsi_14' quando um spec é pedido
+        rsi = indicators.get('rsi', indicators.get('rsi_14'))
         st.metric("📊 RSI", f"{rsi}")
     
-    # Gráfico de preço simulado
-    display_price_chart(symbol, indicators)
+    # Gráfico de preço (cache por barra)
+    display_price_chart(symbol, data.get('last_bar'), indicators, money)
     
     # Sinais detalhados
     st.subheader("🔍 Sinais de Trading")
@@ -89,9 +95,9 @@ def display_analysis_results(data):
     
     with col1:
         st.write("**Indicadores:**")
-        st.write(f"• **Preço:** R$ {indicators['current_price']}")
-        st.write(f"• **SMA 20:** R$ {indicators['sma_20']}")
-        st.write(f"• **RSI:** {indicators['rsi']}")
+        st.write(f"• **Preço:** {money} {indicators['current_price']}")
+        st.write(f"• **SMA 20:** {money} {indicators['sma_20']}")
+        st.write(f"• **RSI:** {rsi}")
     
     with col2:
         st.write("**Sinais:**")
@@ -99,8 +105,12 @@ def display_analysis_results(data):
             icon = "✅" if signal_value == "COMPRA" else "❌" if signal_value == "VENDA" else "➖"
             st.write(f"{icon} {signal_name.replace('_', ' ').title()}: {signal_value}")
 
-def display_price_chart(symbol, indicators):
-    """Gráfico de preço simulado"""
+def display_price_chart(symbol, last_bar, indicators, money="R$"):
+    """Preço e médias móveis (figure montado e cacheado no backend)"""
+    show_chart(symbol, "price", last_bar, lambda: display_simulated_price_chart(symbol, indicators, money))
+
+def display_simulated_price_chart(symbol, indicators, money="R$"):
+    """Gráfico de preço simulado (backend sem /api/charts)"""
     # Gerar dados simulados para o gráfico
     dates = pd.date_range(end=datetime.now(), periods=30, freq='D')
     base_price = indicators['current_price']
@@ -133,7 +143,7 @@ def display_price_chart(symbol, indicators):
     fig.update_layout(
         title=f"{symbol} - Preço e Tendência",
         xaxis_title="Data",
-        yaxis_title="Preço (R$)",
+        yaxis_title=f"Preço ({money})",
         height=400,
         showlegend=True
     )